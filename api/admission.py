@@ -0,0 +1,336 @@
+"""Controle d'admission des captures (memoire Chromium et latence observee)."""
+
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Dict, Optional
+
+from api.config import settings, logger
+from api.metrics import CaptureTimings, observe_phase
+from api.monitoring import system_monitor
+
+
+class AdmissionClosed(RuntimeError):
+    """Le service draine: aucune nouvelle capture n'est admise."""
+
+
+class LatencyLimit:
+    """
+    Limite de concurrence adaptative pilotee par la latence des captures.
+
+    - gradient: limite * (latence de reference / latence recente) + marge.
+    - aimd: +1 par "fenetre" de captures tant que la latence reste sous
+      la tolerance, x ADAPTIVE_BACKOFF sinon.
+
+    La reference est le minimum des ADAPTIVE_BASELINE_WINDOW dernieres
+    captures terminees avec au plus min_limit captures en cours: une charge
+    soutenue ne la fait pas monter (sinon la limite resterait au maximum en
+    saturation). Sans telle capture pendant ADAPTIVE_BASELINE_WINDOW
+    captures, la limite redescend a min_limit le temps de remesurer la
+    reference.
+
+    Un timeout compte toujours comme une surcharge (diminution).
+    """
+
+    def __init__(self, min_limit: int, max_limit: int):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.limit = float(max(min_limit, max_limit // 2))
+        self.short_latency: Optional[float] = None
+        self.baseline_latency: Optional[float] = None
+        # Latences des captures a faible concurrence (fenetre glissante)
+        self.baseline_samples: deque = deque(maxlen=settings.ADAPTIVE_BASELINE_WINDOW)
+        self.since_baseline_sample = 0
+
+    def current(self) -> int:
+        """Limite entiere courante."""
+        return max(self.min_limit, min(self.max_limit, int(self.limit)))
+
+    def update(self, latency: float, inflight: int, overloaded: bool = False):
+        """
+        Integre une capture terminee.
+
+        Args:
+            latency: Duree de la capture hors delai demande (secondes)
+            inflight: Captures en cours au moment de la fin (celle-ci incluse)
+            overloaded: La capture a echoue par timeout
+        """
+        if overloaded:
+            self._set(self.limit * settings.ADAPTIVE_BACKOFF)
+            return
+
+        latency = max(latency, 0.001)
+        if self.baseline_latency is None:
+            self.short_latency = self.baseline_latency = latency
+            return
+
+        self.short_latency = 0.5 * latency + 0.5 * self.short_latency
+        if inflight <= self.min_limit:
+            self.baseline_samples.append(latency)
+            self.baseline_latency = min(self.baseline_samples)
+            self.since_baseline_sample = 0
+        else:
+            self.since_baseline_sample += 1
+            if self.since_baseline_sample >= settings.ADAPTIVE_BASELINE_WINDOW:
+                # Reference perimee: redescendre au minimum pour la remesurer
+                logger.debug(f"[ADMISSION] Reference de latence a remesurer, limite {self.limit:.1f} -> {self.min_limit}")
+                self.since_baseline_sample = 0
+                self._set(self.min_limit)
+                return
+
+        tolerance = settings.ADAPTIVE_LATENCY_TOLERANCE
+        app_limited = inflight < self.limit / 2
+
+        if settings.ADAPTIVE_LIMIT_ALGORITHM == "aimd":
+            if latency > tolerance * self.baseline_latency:
+                self._set(self.limit * settings.ADAPTIVE_BACKOFF)
+            elif not app_limited:
+                self._set(self.limit + 1 / self.limit)
+            return
+
+        gradient = max(0.5, min(1.0, tolerance * self.baseline_latency / self.short_latency))
+        if app_limited and gradient >= 1.0:
+            # Pas assez de charge pour juger d'une augmentation
+            return
+
+        new_limit = self.limit * gradient + 1
+        self._set(0.8 * self.limit + 0.2 * new_limit)
+
+    def _set(self, limit: float):
+        self.limit = max(float(self.min_limit), min(float(self.max_limit), limit))
+
+
+class AdmissionController:
+    """
+    Limite le nombre de captures concurrentes.
+
+    MAX_CONCURRENT_BROWSERS reste la limite dure. Si MEMORY_ADMISSION_ENABLED,
+    une capture n'est admise que si la memoire projetee du navigateur
+    (RSS mesuree + cout appris d'une capture) reste sous MAX_MEMORY_MB.
+    Si ADAPTIVE_LIMIT_ENABLED, la limite s'ajuste aussi selon la latence.
+    """
+
+    def __init__(self):
+        self.active = 0
+        self.waiting = 0
+        # Captures d'analyse (sans rendu): budget de concurrence separe
+        self.analysis_active = 0
+        self.analysis_waiting = 0
+        self.max_concurrency = settings.MAX_CONCURRENT_BROWSERS
+        self.capture_cost_mb = float(settings.ADMISSION_INITIAL_COST_MB)
+        self.baseline_rss_mb = 0.0
+        self.last_rss_mb = 0.0
+        self.latency_limit = LatencyLimit(
+            min_limit=max(1, min(settings.ADAPTIVE_MIN_LIMIT, self.max_concurrency)),
+            max_limit=self.max_concurrency
+        )
+        self.started = False
+        self.draining = False
+        self._condition = asyncio.Condition()
+
+    def effective_limit(self) -> int:
+        """Concurrence effective courante (toujours >= 1)."""
+        limit = self.max_concurrency
+
+        if settings.ADAPTIVE_LIMIT_ENABLED:
+            limit = min(limit, self.latency_limit.current())
+
+        if settings.MEMORY_ADMISSION_ENABLED:
+            headroom = settings.MAX_MEMORY_MB - self.baseline_rss_mb
+            limit = min(limit, int(headroom // self.capture_cost_mb))
+
+        return max(1, limit)
+
+    def projected_memory_mb(self) -> float:
+        """Memoire navigateur projetee si une capture de plus est admise."""
+        # Les captures qui demarrent n'ont pas encore atteint leur pic:
+        # on prend le max entre la mesure et l'estimation
+        estimated = self.baseline_rss_mb + self.active * self.capture_cost_mb
+        return max(self.last_rss_mb, estimated) + self.capture_cost_mb
+
+    def _can_admit(self) -> bool:
+        """Verifie si une nouvelle capture peut demarrer."""
+        if self.draining or self.active >= self.effective_limit():
+            return False
+
+        if not settings.MEMORY_ADMISSION_ENABLED or self.active == 0:
+            # Toujours admettre une capture seule pour eviter un blocage
+            return True
+
+        return self.projected_memory_mb() <= settings.MAX_MEMORY_MB
+
+    @asynccontextmanager
+    async def slot(self, excluded_seconds: float = 0, timings: Optional[CaptureTimings] = None):
+        """
+        Attend une place libre puis la garde pendant toute la capture.
+
+        Args:
+            excluded_seconds: Attente volontaire (delai demande) a exclure
+                de la latence mesuree
+            timings: Chronologie de la requete (attente d'admission)
+
+        Raises:
+            AdmissionClosed: Drain demarre avant l'admission
+        """
+        queued_at = time.perf_counter()
+        async with self._condition:
+            self.waiting += 1
+            try:
+                await self._condition.wait_for(lambda: self.draining or self._can_admit())
+            finally:
+                self.waiting -= 1
+            if self.draining:
+                raise AdmissionClosed("Service en cours d'arret, capture non admise")
+            self.active += 1
+        observe_phase("admission_wait", queued_at, time.perf_counter(), timings)
+
+        started = time.monotonic()
+        succeeded = False
+        overloaded = False
+        try:
+            yield
+            succeeded = True
+        except (asyncio.TimeoutError, TimeoutError):
+            overloaded = True
+            raise
+        except Exception as e:
+            # Les erreurs Playwright de timeout ne derivent pas de TimeoutError
+            overloaded = "timeout" in str(e).lower()
+            raise
+        finally:
+            latency = time.monotonic() - started - excluded_seconds
+            async with self._condition:
+                if settings.ADAPTIVE_LIMIT_ENABLED and (succeeded or overloaded):
+                    self.latency_limit.update(latency, self.active, overloaded)
+                self.active -= 1
+                self._condition.notify_all()
+
+    @asynccontextmanager
+    async def analysis_slot(self, timings: Optional[CaptureTimings] = None):
+        """
+        Place d'une capture d'analyse (reseau + DOM, sans screenshot).
+
+        Budget propre (ANALYSIS_MAX_CONCURRENT), independant de la limite
+        des captures completes: une analyse ne rend ni n'encode d'image.
+
+        Raises:
+            AdmissionClosed: Drain demarre avant l'admission
+        """
+        queued_at = time.perf_counter()
+        async with self._condition:
+            self.analysis_waiting += 1
+            try:
+                await self._condition.wait_for(
+                    lambda: self.draining or self.analysis_active < settings.ANALYSIS_MAX_CONCURRENT
+                )
+            finally:
+                self.analysis_waiting -= 1
+            if self.draining:
+                raise AdmissionClosed("Service en cours d'arret, capture non admise")
+            self.analysis_active += 1
+        observe_phase("admission_wait", queued_at, time.perf_counter(), timings)
+
+        try:
+            yield
+        finally:
+            async with self._condition:
+                self.analysis_active -= 1
+                self._condition.notify_all()
+
+    async def drain(self, timeout: float) -> bool:
+        """
+        Arrete d'admettre et attend la fin des captures en cours.
+
+        Les captures en attente d'admission echouent (AdmissionClosed).
+
+        Args:
+            timeout: Attente maximale (secondes)
+
+        Returns:
+            True si toutes les captures se sont terminees a temps
+        """
+        async with self._condition:
+            self.draining = True
+            self._condition.notify_all()
+            try:
+                await asyncio.wait_for(
+                    self._condition.wait_for(lambda: self.active == 0 and self.analysis_active == 0),
+                    timeout=timeout
+                )
+                return True
+            except asyncio.TimeoutError:
+                return False
+
+    async def undrain(self):
+        """Annule un drain: les captures sont de nouveau admises."""
+        async with self._condition:
+            self.draining = False
+            self._condition.notify_all()
+
+    def _learn(self, rss_mb: float):
+        """Met a jour la base et le cout par capture depuis une mesure RSS."""
+        self.last_rss_mb = rss_mb
+
+        if self.active == 0 and self.analysis_active == 0:
+            # Navigateur au repos: reference pour le cout des captures
+            self.baseline_rss_mb = rss_mb
+            return
+        if self.analysis_active or self.active == 0:
+            # RSS melangee avec des analyses: cout par capture non mesurable
+            return
+
+        per_capture = (rss_mb - self.baseline_rss_mb) / self.active
+        alpha = settings.ADMISSION_LEARNING_RATE
+        cost = alpha * per_capture + (1 - alpha) * self.capture_cost_mb
+        self.capture_cost_mb = max(float(settings.ADMISSION_MIN_COST_MB), cost)
+
+    async def _on_sample(self, sample: Dict):
+        """Integre la RSS Chromium d'un echantillon du monitoring systeme."""
+        async with self._condition:
+            self._learn(sample["browser_rss_mb"])
+            # La memoire a pu baisser: reveiller les captures en attente
+            self._condition.notify_all()
+
+    def start(self):
+        """Abonne l'admission memoire (si activee) aux echantillons systeme."""
+        if not settings.MEMORY_ADMISSION_ENABLED or self.started:
+            return
+        system_monitor.subscribe(self._on_sample)
+        system_monitor.start()
+        self.started = True
+        logger.info(f"[+] Admission memoire demarree (budget: {settings.MAX_MEMORY_MB}MB)")
+
+    async def stop(self):
+        """Desabonne l'admission memoire."""
+        if self.started:
+            system_monitor.unsubscribe(self._on_sample)
+            self.started = False
+            logger.info("[+] Admission memoire arretee")
+
+    def get_stats(self) -> Dict:
+        """Retourne l'etat de l'admission."""
+        return {
+            "memory_admission_enabled": settings.MEMORY_ADMISSION_ENABLED,
+            "draining": self.draining,
+            "active_captures": self.active,
+            "waiting_captures": self.waiting,
+            "analysis_active": self.analysis_active,
+            "analysis_waiting": self.analysis_waiting,
+            "analysis_max_concurrency": settings.ANALYSIS_MAX_CONCURRENT,
+            "effective_concurrency": self.effective_limit(),
+            "max_concurrency": self.max_concurrency,
+            "adaptive_limit_enabled": settings.ADAPTIVE_LIMIT_ENABLED,
+            "adaptive_algorithm": settings.ADAPTIVE_LIMIT_ALGORITHM,
+            "latency_limit": round(self.latency_limit.limit, 2),
+            "latency_recent_s": round(self.latency_limit.short_latency or 0, 3),
+            "latency_baseline_s": round(self.latency_limit.baseline_latency or 0, 3),
+            "browser_rss_mb": round(self.last_rss_mb, 1),
+            "baseline_rss_mb": round(self.baseline_rss_mb, 1),
+            "capture_cost_mb": round(self.capture_cost_mb, 1),
+            "memory_budget_mb": settings.MAX_MEMORY_MB,
+        }
+
+
+# Instance globale
+admission_controller = AdmissionController()
@@ -1,10 +1,13 @@
 """Pool de navigateurs Playwright optimise pour 4GB RAM."""
 
 import asyncio
-from typing import Optional
+from typing import Dict, Optional, Set
+from urllib.parse import urlsplit
 from playwright.async_api import async_playwright, Browser, BrowserContext, Playwright
 
 from api.config import settings, logger
+from api.metrics import PREWARM_TOTAL, CONTEXT_RECYCLE_TOTAL
+from api.subresource_cache import subresource_cache, CACHEABLE_TYPES
 
 
 class BrowserPool:
@@ -18,7 +21,10 @@ class BrowserPool:
         self.browser: Optional[Browser] = None
         self.contexts: list[BrowserContext] = []
         self.prewarm_contexts: list[BrowserContext] = []  # Contexts pre-chauds
-        self.semaphore = asyncio.Semaphore(settings.MAX_CONCURRENT_BROWSERS)
+        self.idle_contexts: list[BrowserContext] = []  # Contexts recycles, reinitialises
+        self._uses: Dict[BrowserContext, int] = {}
+        self._origins: Dict[BrowserContext, Set[str]] = {}  # A effacer au recyclage
+        self._subresource_stats: Dict[BrowserContext, Dict[str, int]] = {}  # Par capture
         self._lock = asyncio.Lock()
         self._prewarm_lock = asyncio.Lock()
 
@@ -112,11 +118,25 @@ class BrowserPool:
 
         context.set_default_timeout(60000)
 
-        # Bloquer fonts et media
-        await context.route("**/*", lambda route: (
-            route.abort() if route.request.resource_type in ["font", "media"]
-            else route.continue_()
-        ))
+        origins = self._origins.setdefault(context, set())
+
+        async def handle_route(route):
+            # Origines visitees: leur stockage est efface au recyclage
+            if settings.CONTEXT_RECYCLE_ENABLED:
+                parts = urlsplit(route.request.url)
+                if parts.scheme in ("http", "https"):
+                    origins.add(f"{parts.scheme}://{parts.netloc.rsplit('@', 1)[-1]}")
+
+            # Bloquer fonts et media
+            if route.request.resource_type in ["font", "media"]:
+                await route.abort()
+            elif subresource_cache and route.request.method == "GET" \
+                    and route.request.resource_type in CACHEABLE_TYPES:
+                await subresource_cache.handle(route, self.subresource_stats(context))
+            else:
+                await route.continue_()
+
+        await context.route("**/*", handle_route)
 
         return context
 
@@ -128,6 +148,7 @@ class BrowserPool:
     ) -> BrowserContext:
         """
         Obtient un contexte de navigation isole.
+        Si recyclage active, reutilise un context reinitialise.
         Si pre-warm active, utilise un context pre-chaud et en recree un.
         Sinon, cree un nouveau context a la demande.
 
@@ -145,8 +166,17 @@ class BrowserPool:
 
             context = None
 
+            # Reutiliser un context recycle (deja reinitialise)
+            if settings.CONTEXT_RECYCLE_ENABLED and self.idle_contexts:
+                async with self._lock:
+                    if self.idle_contexts:
+                        context = self.idle_contexts.pop()
+                if context:
+                    CONTEXT_RECYCLE_TOTAL.inc("reused")
+                    logger.debug(f"[RECYCLE] Context reutilise ({self._uses.get(context, 0)} captures)")
+
             # Essayer d'utiliser un context pre-chaud
-            if settings.PREWARM_ENABLED and self.prewarm_contexts:
+            if not context and settings.PREWARM_ENABLED and self.prewarm_contexts:
                 async with self._prewarm_lock:
                     if self.prewarm_contexts:
                         context = self.prewarm_contexts.pop(0)
@@ -155,6 +185,9 @@ class BrowserPool:
                 # Recreer un context pre-chaud en arriere-plan (non-bloquant)
                 asyncio.create_task(self._refill_prewarm())
 
+            if settings.PREWARM_ENABLED:
+                PREWARM_TOTAL.inc("hit" if context else "miss")
+
             # Sinon creer un nouveau context
             if not context:
                 context = await self._create_context(width, height, user_agent)
@@ -162,6 +195,7 @@ class BrowserPool:
 
             async with self._lock:
                 self.contexts.append(context)
+            self._subresource_stats.pop(context, None)
 
             logger.debug(f"Contextes actifs: {len(self.contexts)}/{settings.MAX_CONCURRENT_BROWSERS}")
             return context
@@ -181,18 +215,105 @@ class BrowserPool:
         except Exception as e:
             logger.warning(f"[!] Erreur refill prewarm: {e}")
 
-    async def release_context(self, context: BrowserContext):
+    def subresource_stats(self, context: BrowserContext) -> Dict[str, int]:
+        """Compteurs du cache de sous-ressources pour la capture en cours du contexte."""
+        return self._subresource_stats.setdefault(
+            context, {"hits": 0, "misses": 0, "stored": 0, "bytes_saved": 0}
+        )
+
+    async def _reset_context(self, context: BrowserContext) -> bool:
+        """
+        Reinitialise un contexte pour une nouvelle capture, puis verifie
+        l'isolation (aucun cookie, service worker ni stockage restant).
+
+        Returns:
+            True si le contexte est propre
+        """
+        # Fermer toutes les pages (popups comprises)
+        for page in list(context.pages):
+            await page.close()
+
+        origins = self._origins.get(context, set())
+        page = await context.new_page()
+        try:
+            cdp = await context.new_cdp_session(page)
+            for origin in origins:
+                # localStorage, IndexedDB, Cache Storage, service workers, cookies...
+                await cdp.send("Storage.clearDataForOrigin", {"origin": origin, "storageTypes": "all"})
+            await cdp.send("Network.clearBrowserCache")
+            await context.clear_cookies()
+            await context.clear_permissions()
+
+            # Verification de l'isolation
+            if await context.cookies():
+                logger.warning("[RECYCLE] Cookies restants apres reinitialisation")
+                return False
+            if context.service_workers:
+                logger.warning("[RECYCLE] Service workers restants apres reinitialisation")
+                return False
+            for origin in origins:
+                usage = await cdp.send("Storage.getUsageAndQuota", {"origin": origin})
+                if usage.get("usage", 0) > 0:
+                    logger.warning(f"[RECYCLE] Stockage restant pour {origin}: {usage['usage']} octets")
+                    return False
+
+            await cdp.detach()
+            origins.clear()
+            return True
+        finally:
+            await page.close()
+
+    async def _recycle(self, context: BrowserContext) -> bool:
+        """Remet un contexte en reserve apres reinitialisation (False: a fermer)."""
+        uses = self._uses.get(context, 0) + 1
+        self._uses[context] = uses
+
+        if uses >= settings.CONTEXT_RECYCLE_MAX_USES or not self.browser \
+                or len(self.idle_contexts) >= settings.MAX_CONCURRENT_BROWSERS:
+            CONTEXT_RECYCLE_TOTAL.inc("retired")
+            return False
+
+        try:
+            clean = await asyncio.wait_for(
+                self._reset_context(context), timeout=settings.CONTEXT_RECYCLE_RESET_TIMEOUT
+            )
+        except Exception as e:
+            logger.warning(f"[RECYCLE] Echec reinitialisation du contexte: {e}")
+            clean = False
+
+        if not clean:
+            CONTEXT_RECYCLE_TOTAL.inc("reset_failed")
+            return False
+
+        async with self._lock:
+            if context in self.contexts:
+                self.contexts.remove(context)
+            self.idle_contexts.append(context)
+        CONTEXT_RECYCLE_TOTAL.inc("recycled")
+        logger.debug(f"[RECYCLE] Context remis en reserve ({uses}/{settings.CONTEXT_RECYCLE_MAX_USES} captures)")
+        return True
+
+    async def release_context(self, context: BrowserContext, reusable: bool = True):
         """
         Libere un contexte de navigation.
 
         Args:
             context: Contexte a liberer
+            reusable: Le contexte peut etre recycle (capture terminee
+                normalement); sinon il est toujours ferme
         """
+        if reusable and settings.CONTEXT_RECYCLE_ENABLED and await self._recycle(context):
+            return
+
         try:
             await context.close()
         except Exception as e:
             logger.warning(f"Erreur fermeture contexte: {e}")
 
+        self._uses.pop(context, None)
+        self._origins.pop(context, None)
+        self._subresource_stats.pop(context, None)
+
         # TOUJOURS retirer le contexte de la liste, meme si close() a echoue
         try:
             async with self._lock:
@@ -202,6 +323,13 @@ class BrowserPool:
         except Exception as e:
             logger.error(f"Erreur critique lors du retrait du contexte: {e}")
 
+    async def close_idle_contexts(self):
+        """Ferme les contextes recycles en reserve."""
+        async with self._lock:
+            idle, self.idle_contexts = self.idle_contexts, []
+        for context in idle:
+            await self.release_context(context, reusable=False)
+
     async def cleanup(self):
         """Nettoie toutes les ressources du pool."""
         try:
@@ -216,6 +344,9 @@ class BrowserPool:
 
             self.contexts.clear()
 
+            # Fermer les contextes recycles en reserve
+            await self.close_idle_contexts()
+
             # Fermer tous les contextes pre-chauds
             for context in self.prewarm_contexts.copy():
                 try:
@@ -246,6 +377,9 @@ class BrowserPool:
             "active_contexts": len(self.contexts),
             "prewarm_contexts": len(self.prewarm_contexts) if settings.PREWARM_ENABLED else 0,
             "prewarm_enabled": settings.PREWARM_ENABLED,
+            "idle_contexts": len(self.idle_contexts),
+            "context_recycle_enabled": settings.CONTEXT_RECYCLE_ENABLED,
+            "subresource_cache": subresource_cache.get_stats() if subresource_cache else None,
             "max_contexts": settings.MAX_CONCURRENT_BROWSERS,
             "browser_running": self.browser is not None,
         }
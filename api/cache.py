@@ -4,6 +4,7 @@ import hashlib
 import json
 from typing import Optional, Dict
 from api.config import settings, logger
+from api.metrics import CACHE_REQUESTS_TOTAL, CaptureTimings, track_phase
 
 # Import conditionnel de Redis
 redis_client = None
@@ -44,9 +45,15 @@ def _generate_cache_key(url: str, options: Dict) -> str:
     key_data = {
         "url": url,
         "device": options.get("device", "desktop"),
+        "devices": options.get("devices"),
         "full_page": options.get("full_page", False),
+        "full_page_mode": options.get("full_page_mode", "single"),
         "delay": options.get("delay", 0),
+        "filmstrip": options.get("filmstrip"),
         "grab_html": options.get("grab_html", False),
+        "readiness": options.get("readiness", "fixed"),
+        "include": options.get("include"),
+        "mode": options.get("mode", "full"),
     }
 
     key_string = json.dumps(key_data, sort_keys=True)
@@ -55,13 +62,14 @@ def _generate_cache_key(url: str, options: Dict) -> str:
     return cache_key
 
 
-async def get_cached_capture(url: str, options: Dict) -> Optional[Dict]:
+async def get_cached_capture(url: str, options: Dict, timings: Optional[CaptureTimings] = None) -> Optional[Dict]:
     """
     Recupere une capture depuis le cache Redis.
 
     Args:
         url: URL a chercher
         options: Options de capture
+        timings: Chronologie de la requete (optionnel)
 
     Returns:
         Dict avec capture ou None si pas en cache
@@ -71,23 +79,28 @@ async def get_cached_capture(url: str, options: Dict) -> Optional[Dict]:
 
     try:
         cache_key = _generate_cache_key(url, options)
-        cached_data = redis_client.get(cache_key)
+        with track_phase("cache_get", timings):
+            cached_data = redis_client.get(cache_key)
 
         if cached_data:
+            CACHE_REQUESTS_TOTAL.inc("hit")
             logger.info(f"[CACHE HIT] {url}")
             # Deserialize
             result = json.loads(cached_data)
             return result
         else:
+            CACHE_REQUESTS_TOTAL.inc("miss")
             logger.debug(f"[CACHE MISS] {url}")
             return None
 
     except Exception as e:
+        CACHE_REQUESTS_TOTAL.inc("error")
         logger.warning(f"[!] Erreur lecture cache: {e}")
         return None
 
 
-async def set_cached_capture(url: str, options: Dict, capture_data: Dict) -> bool:
+async def set_cached_capture(url: str, options: Dict, capture_data: Dict,
+                             timings: Optional[CaptureTimings] = None) -> bool:
     """
     Stocke une capture dans le cache Redis.
 
@@ -98,6 +111,7 @@ async def set_cached_capture(url: str, options: Dict, capture_data: Dict) -> boo
         url: URL capturee
         options: Options de capture
         capture_data: Donnees a cacher
+        timings: Chronologie de la requete (optionnel)
 
     Returns:
         True si stocke avec succes, False sinon
@@ -109,7 +123,8 @@ async def set_cached_capture(url: str, options: Dict, capture_data: Dict) -> boo
         # REGLES DE CACHE INTELLIGENT (si activees)
         if settings.REDIS_SMART_CACHE:
             # Regle 1 : Ne pas cacher si delay=0 (page possiblement incomplete)
-            if options.get("delay", 0) == 0:
+            # sauf en mode smart ou la capture attend la stabilite de la page
+            if options.get("delay", 0) == 0 and options.get("readiness", "fixed") != "smart":
                 logger.debug(f"[CACHE SKIP] {url} - delay=0 (page possiblement incomplete)")
                 return False
 
@@ -120,7 +135,8 @@ async def set_cached_capture(url: str, options: Dict, capture_data: Dict) -> boo
                 return False
 
             # Regle 3 : Verifier que la capture a suffisamment de contenu
-            network_logs = capture_data.get("network_logs", [])
+            # (sans log reseau demande, impossible de juger: pas de cache)
+            network_logs = capture_data.get("network_logs") or []
             if len(network_logs) < 5:  # Trop peu de requetes = page incomplete
                 logger.debug(f"[CACHE SKIP] {url} - trop peu de requetes reseau ({len(network_logs)})")
                 return False
@@ -128,15 +144,16 @@ async def set_cached_capture(url: str, options: Dict, capture_data: Dict) -> boo
         # Si toutes les conditions OK  cache
         cache_key = _generate_cache_key(url, options)
 
-        # Serialize en JSON
-        serialized = json.dumps(capture_data)
+        with track_phase("cache_set", timings):
+            # Serialize en JSON
+            serialized = json.dumps(capture_data)
 
-        # Stocker avec TTL
-        redis_client.setex(
-            cache_key,
-            settings.REDIS_CACHE_TTL,
-            serialized
-        )
+            # Stocker avec TTL
+            redis_client.setex(
+                cache_key,
+                settings.REDIS_CACHE_TTL,
+                serialized
+            )
 
         logger.info(f"[CACHE SET] {url} (TTL: {settings.REDIS_CACHE_TTL}s)")
         return True
@@ -1,13 +1,40 @@
 """Capture de screenshots, reseau et DOM avec Playwright."""
 
 import base64
+import json
 import re
+import time
 import asyncio
-from typing import Dict, List, Optional
+from typing import AsyncIterator, Dict, List, Optional, Tuple
 from playwright.async_api import Page, BrowserContext, Response
 
 from api.config import settings, logger
 from api.browser import browser_pool
+from api.subresource_cache import subresource_cache
+from api.admission import admission_controller
+from api.session import session_manager
+from api.readiness import ReadinessWaiter
+from api.tiles import capture_tiles, stitch_tiles
+from api.filmstrip import record_filmstrip
+from api.similarity import screenshot_fingerprint
+from api.metrics import CaptureTimings, track_phase, timed, CAPTURES_TOTAL
+
+# Etapes optionnelles d'une capture (parametre include)
+CAPTURE_STAGES = ("screenshot", "dom", "network", "html")
+DEFAULT_STAGES = ("screenshot", "dom", "network")
+
+# Ressources bloquees en mode analyse (utiles au rendu seulement)
+ANALYSIS_BLOCKED_TYPES = ("image", "media", "font")
+
+# Parties produites par capture_stream, dans l'ordre, et leurs champs
+STREAM_PARTS = {
+    "network": ("network_logs", "final_url"),
+    "dom": ("dom_elements",),
+    "screenshot": ("screenshot", "screenshot_format", "screenshot_tiles", "screenshot_hash", "screenshot_viewports",
+                   "filmstrip"),
+    "html": ("html_source",),
+    "config": ("capture_config",),
+}
 
 
 class NetworkCapture:
@@ -51,6 +78,205 @@ class NetworkCapture:
         return self.logs
 
 
+# Script d'extraction en une seule passe (TreeWalker), parametre par les limites
+DOM_EXTRACTION_SCRIPT = """
+(opts) => {
+    const started = performance.now();
+    const deadline = started + opts.budget_ms;
+
+    const CLICKABLE = 'button, input[type="submit"], input[type="button"], a[href], [role="button"], [onclick], div[class*="button"], div[class*="btn"], span[role="button"], [class*="accept"], [class*="reject"], [class*="refuse"], [class*="decline"], [id*="accept"], [id*="reject"], [id*="refuse"], [id*="decline"], div[onclick]';
+    const POPUP = '[class*="modal"], [class*="popup"], [class*="overlay"], [class*="cookie"], [class*="consent"], [class*="gdpr"], [id*="cookie"], [id*="consent"]';
+    const POPUP_BUTTON = 'button, [role="button"], div[onclick]';
+
+    // Visibilite memorisee: getComputedStyle une seule fois par element
+    const visibility = new Map();
+    const isVisible = (el) => {
+        let visible = visibility.get(el);
+        if (visible !== undefined) return visible;
+        // Dimensions d'abord (display:none => 0), style calcule ensuite
+        visible = el.offsetWidth > 0 && el.offsetHeight > 0;
+        if (visible) {
+            const style = window.getComputedStyle(el);
+            visible = style.display !== 'none' &&
+                      style.visibility !== 'hidden' &&
+                      style.opacity !== '0';
+        }
+        visibility.set(el, visible);
+        return visible;
+    };
+
+    const className = (el) => typeof el.className === 'string' ? el.className : (el.getAttribute('class') || '');
+
+    // FNV-1a 32 bits: empreinte du contenu complet des scripts tronques
+    const fnv1a = (text) => {
+        let hash = 0x811c9dc5;
+        for (let i = 0; i < text.length; i++) {
+            hash ^= text.charCodeAt(i);
+            hash = Math.imul(hash, 0x01000193);
+        }
+        return (hash >>> 0).toString(16).padStart(8, '0');
+    };
+
+    const describeClickable = (el, visible) => {
+        // Obtenir le texte visible directement de l'element (sans enfants profonds)
+        let directText = '';
+        for (const node of el.childNodes) {
+            if (node.nodeType === Node.TEXT_NODE) {
+                directText += node.textContent;
+            }
+        }
+        directText = directText.trim();
+
+        // Generer un selecteur CSS unique
+        const classes = className(el);
+        let selector = el.tagName.toLowerCase();
+        if (el.id) {
+            selector = `#${el.id}`;
+        } else if (classes) {
+            const first = classes.trim().split(/\\s+/).slice(0, 2).join('.');
+            if (first) selector = `${selector}.${first}`;
+        }
+
+        return {
+            tag: el.tagName.toLowerCase(),
+            text: (directText || el.textContent?.trim() || '').substring(0, 200),
+            id: el.id || '',
+            classes: classes,
+            href: el.href || '',
+            type: el.type || '',
+            role: el.getAttribute('role') || '',
+            visible: visible,
+            aria_label: el.getAttribute('aria-label') || '',
+            onclick: el.hasAttribute('onclick'),
+            selector: selector
+        };
+    };
+
+    const clickable = [];
+    const hidden = [];
+    const forms = [];
+    const scripts = [];
+    const popups = [];
+    const truncated = { clickable: false, hidden: false, forms: false, scripts: false, popups: false };
+    let redirect = null;
+    let visited = 0;
+    let budgetExceeded = false;
+
+    const walker = document.createTreeWalker(document.documentElement || document, NodeFilter.SHOW_ELEMENT);
+    let el = walker.currentNode.nodeType === Node.ELEMENT_NODE ? walker.currentNode : walker.nextNode();
+
+    while (el) {
+        visited++;
+        // Verifier le budget tous les 256 noeuds (performance.now a un cout)
+        if ((visited & 255) === 0 && performance.now() > deadline) {
+            budgetExceeded = true;
+            break;
+        }
+
+        const tag = el.tagName;
+
+        if (tag === 'SCRIPT') {
+            if (scripts.length < opts.max_scripts) {
+                const inline = !el.src;
+                const content = inline ? (el.textContent || '') : '';
+                const entry = {
+                    src: el.src || '',
+                    inline: inline,
+                    type: el.type || 'text/javascript',
+                    content: content.substring(0, opts.max_script_chars)
+                };
+                if (inline) {
+                    entry.content_length = content.length;
+                    entry.content_truncated = content.length > opts.max_script_chars;
+                    entry.content_hash = fnv1a(content);
+                }
+                scripts.push(entry);
+            } else {
+                truncated.scripts = true;
+            }
+        } else if (tag === 'FORM') {
+            if (forms.length < opts.max_forms) {
+                forms.push({
+                    action: el.action || '',
+                    method: (el.method || 'GET').toUpperCase(),
+                    id: el.id || '',
+                    inputs: [...el.querySelectorAll('input, textarea, select')]
+                        .slice(0, opts.max_form_inputs)
+                        .map(inp => ({
+                            name: inp.name || '',
+                            type: inp.type || inp.tagName.toLowerCase(),
+                            required: inp.required || false
+                        }))
+                });
+            } else {
+                truncated.forms = true;
+            }
+        } else if (tag === 'META' && redirect === null &&
+                   (el.getAttribute('http-equiv') || '').toLowerCase() === 'refresh') {
+            // Redirections meta
+            redirect = el.getAttribute('content');
+        }
+
+        // Elements cliquables (visibles et caches separes)
+        if (el.matches(CLICKABLE)) {
+            if (isVisible(el)) {
+                if (clickable.length < opts.max_clickable) {
+                    clickable.push(describeClickable(el, true));
+                } else {
+                    truncated.clickable = true;
+                }
+            } else if (hidden.length < opts.max_hidden) {
+                hidden.push(describeClickable(el, false));
+            } else {
+                truncated.hidden = true;
+            }
+        }
+
+        // Popups potentiels - inclure cookies, modals, overlays
+        if (el.matches(POPUP) && isVisible(el)) {
+            if (popups.length < opts.max_popups) {
+                // Chercher les boutons dans le popup
+                const buttons = [...el.querySelectorAll(POPUP_BUTTON)]
+                    .filter(btn => isVisible(btn))
+                    .map(btn => btn.textContent?.trim() || '')
+                    .filter(text => text.length > 0);
+
+                popups.push({
+                    id: el.id || '',
+                    classes: className(el),
+                    visible: true,
+                    text: el.textContent?.trim().substring(0, 300) || '',
+                    buttons: buttons
+                });
+            } else {
+                truncated.popups = true;
+            }
+        }
+
+        el = walker.nextNode();
+    }
+
+    return {
+        clickable_elements: clickable,
+        hidden_elements: hidden,
+        forms: forms,
+        scripts: scripts,
+        popups: popups,
+        redirect: redirect,
+        title: document.title,
+        url: window.location.href,
+        extraction: {
+            extraction_ms: Math.round(performance.now() - started),
+            nodes_visited: visited,
+            budget_ms: opts.budget_ms,
+            budget_exceeded: budgetExceeded,
+            truncated: truncated
+        }
+    };
+}
+"""
+
+
 class DOMExtractor:
     """Extrait les elements interactifs du DOM."""
 
@@ -59,138 +285,38 @@ class DOMExtractor:
         """
         Extrait les elements interactifs (boutons, forms, scripts, etc.).
 
+        Un seul parcours du DOM (TreeWalker) avec visibilite memorisee,
+        limites par section et budget de temps (DOM_EXTRACTION_*).
+
         Args:
             page: Page Playwright
 
         Returns:
-            Dict avec clickable_elements, forms, scripts, popups
+            Dict avec clickable_elements, hidden_elements, forms, scripts,
+            popups et les statistiques d'extraction
         """
+        options = {
+            "budget_ms": settings.DOM_EXTRACTION_BUDGET_MS,
+            "max_clickable": settings.DOM_MAX_CLICKABLE,
+            "max_hidden": settings.DOM_MAX_HIDDEN,
+            "max_forms": settings.DOM_MAX_FORMS,
+            "max_form_inputs": settings.DOM_MAX_FORM_INPUTS,
+            "max_scripts": settings.DOM_MAX_SCRIPTS,
+            "max_script_chars": settings.DOM_MAX_SCRIPT_CHARS,
+            "max_popups": settings.DOM_MAX_POPUPS,
+        }
+
         try:
-            elements = await page.evaluate("""
-                () => {
-                    // Fonction pour verifier si un element est visible
-                    const isVisible = (el) => {
-                        if (!el) return false;
-                        const style = window.getComputedStyle(el);
-                        return style.display !== 'none' &&
-                               style.visibility !== 'hidden' &&
-                               style.opacity !== '0' &&
-                               el.offsetWidth > 0 &&
-                               el.offsetHeight > 0;
-                    };
-
-                    // Elements cliquables - inclure TOUS les boutons, liens, inputs, divs cliquables
-                    const clickable = [
-                        ...document.querySelectorAll('button, input[type="submit"], input[type="button"], a[href], [role="button"], [onclick], div[class*="button"], div[class*="btn"], span[role="button"], [class*="accept"], [class*="reject"], [class*="refuse"], [class*="decline"], [id*="accept"], [id*="reject"], [id*="refuse"], [id*="decline"], div[onclick]')
-                    ]
-                        .filter(el => isVisible(el))
-                        .slice(0, 300)  // Augmente pour capturer plus d'elements
-                        .map(el => {
-                            // Obtenir le texte visible directement de l'element (sans enfants profonds)
-                            let directText = '';
-                            for (let node of el.childNodes) {
-                                if (node.nodeType === Node.TEXT_NODE) {
-                                    directText += node.textContent;
-                                }
-                            }
-                            directText = directText.trim();
-
-                            // Generer un selecteur CSS unique
-                            let selector = el.tagName.toLowerCase();
-                            if (el.id) {
-                                selector = `#${el.id}`;
-                            } else if (el.className) {
-                                const classes = el.className.trim().split(/\s+/).slice(0, 2).join('.');
-                                if (classes) selector = `${selector}.${classes}`;
-                            }
-
-                            return {
-                                tag: el.tagName.toLowerCase(),
-                                text: (directText || el.textContent?.trim() || '').substring(0, 200),
-                                id: el.id || '',
-                                classes: el.className || '',
-                                href: el.href || '',
-                                type: el.type || '',
-                                role: el.getAttribute('role') || '',
-                                visible: isVisible(el),
-                                aria_label: el.getAttribute('aria-label') || '',
-                                onclick: el.hasAttribute('onclick'),
-                                selector: selector
-                            };
-                        });
-
-                    // Separer les elements visibles et caches
-                    const visibleElements = clickable.filter(el => el.visible);
-                    const hiddenElements = clickable.filter(el => !el.visible);
-
-                    // Formulaires
-                    const forms = [...document.querySelectorAll('form')]
-                        .slice(0, 20)
-                        .map(form => ({
-                            action: form.action || '',
-                            method: form.method.toUpperCase() || 'GET',
-                            id: form.id || '',
-                            inputs: [...form.querySelectorAll('input, textarea, select')]
-                                .slice(0, 50)
-                                .map(inp => ({
-                                    name: inp.name || '',
-                                    type: inp.type || inp.tagName.toLowerCase(),
-                                    required: inp.required || false
-                                }))
-                        }));
-
-                    // Scripts
-                    const scripts = [...document.querySelectorAll('script')]
-                        .slice(0, 50)
-                        .map(script => ({
-                            src: script.src || '',
-                            inline: !script.src,
-                            type: script.type || 'text/javascript',
-                            content: !script.src ? script.textContent : ''
-                        }));
-
-                    // Popups potentiels - inclure cookies, modals, overlays
-                    const popups = [
-                        ...document.querySelectorAll('[class*="modal"], [class*="popup"], [class*="overlay"], [class*="cookie"], [class*="consent"], [class*="gdpr"], [id*="cookie"], [id*="consent"]')
-                    ]
-                        .filter(el => isVisible(el))
-                        .slice(0, 30)
-                        .map(popup => {
-                            // Chercher les boutons dans le popup
-                            const buttons = [...popup.querySelectorAll('button, [role="button"], div[onclick]')]
-                                .filter(btn => isVisible(btn))
-                                .map(btn => btn.textContent?.trim() || '')
-                                .filter(text => text.length > 0);
-
-                            return {
-                                id: popup.id || '',
-                                classes: popup.className || '',
-                                visible: isVisible(popup),
-                                text: popup.textContent?.trim().substring(0, 300) || '',
-                                buttons: buttons
-                            };
-                        });
-
-                    // Redirections meta
-                    const metaRefresh = document.querySelector('meta[http-equiv="refresh"]');
-                    const redirect = metaRefresh ? metaRefresh.getAttribute('content') : null;
-
-                    return {
-                        clickable_elements: visibleElements,
-                        hidden_elements: hiddenElements,
-                        forms: forms,
-                        scripts: scripts,
-                        popups: popups,
-                        redirect: redirect,
-                        title: document.title,
-                        url: window.location.href
-                    };
-                }
-            """)
+            elements = await page.evaluate(DOM_EXTRACTION_SCRIPT, options)
 
-            logger.debug(f"[+] DOM extrait: {len(elements['clickable_elements'])} elements cliquables, "
+            stats = elements["extraction"]
+            logger.debug(f"[+] DOM extrait en {stats['extraction_ms']}ms ({stats['nodes_visited']} noeuds): "
+                        f"{len(elements['clickable_elements'])} elements cliquables, "
                         f"{len(elements['forms'])} forms, {len(elements['scripts'])} scripts")
 
+            if stats["budget_exceeded"]:
+                logger.warning(f"Extraction DOM interrompue (budget {stats['budget_ms']}ms depasse)")
+
             return elements
 
         except Exception as e:
@@ -204,10 +330,120 @@ class DOMExtractor:
             }
 
 
+def build_hide_script(hide_selectors: str) -> str:
+    """
+    Construit un init script qui masque les selecteurs via une feuille de style.
+
+    Une regle par selecteur: un selecteur invalide n'annule pas les autres.
+    La feuille est adoptee par le document (pas besoin que <head> existe) et
+    s'applique donc aussi aux elements inseres apres le chargement.
+
+    Args:
+        hide_selectors: Selecteurs CSS separes par virgule (deja valides)
+
+    Returns:
+        Code JavaScript a passer a add_init_script
+    """
+    rules = [
+        f"{selector.strip()} {{ display: none !important; }}"
+        for selector in hide_selectors.split(',')
+        if selector.strip()
+    ]
+    # json.dumps: les regles sont passees comme litteral JS, sans interpolation
+    rules_js = json.dumps(rules)
+
+    return f"""
+        (() => {{
+            const sheet = new CSSStyleSheet();
+            for (const rule of {rules_js}) {{
+                try {{ sheet.insertRule(rule, sheet.cssRules.length); }} catch (e) {{}}
+            }}
+            document.adoptedStyleSheets = [...document.adoptedStyleSheets, sheet];
+        }})();
+    """
+
+
+async def capture_viewports(
+    page: Page,
+    viewports: List[Dict],
+    full_page: bool,
+    waiter: Optional[ReadinessWaiter] = None,
+    primary_hash: Optional[Dict] = None
+) -> List[Dict]:
+    """
+    Screenshots des viewports suivants sur la page deja chargee.
+
+    La page est au viewport du premier device (screenshot principal deja
+    pris): on redimensionne, on laisse la mise en page se stabiliser, puis
+    on capture. Aucune nouvelle navigation. Le viewport initial est restaure
+    ensuite: les etapes suivantes (HTML) voient la page du premier device.
+
+    Returns:
+        Un element par viewport (le premier sans image: c'est le screenshot principal)
+    """
+    results = [{
+        **viewports[0],
+        "page_height": await page.evaluate("document.documentElement.scrollHeight"),
+        "screenshot_hash": primary_hash,
+    }]
+    original_size = page.viewport_size
+
+    try:
+        for viewport in viewports[1:]:
+            await page.set_viewport_size({"width": viewport["width"], "height": viewport["height"]})
+            # Media queries et reflow: attente de stabilite (smart) ou courte pause
+            if waiter:
+                await waiter.wait(settings.READINESS_POST_ACTION_MAX_MS)
+            else:
+                await page.wait_for_timeout(300)
+
+            png = await page.screenshot(full_page=full_page, type="png")
+            results.append({
+                **viewport,
+                "page_height": await page.evaluate("document.documentElement.scrollHeight"),
+                "screenshot_hash": await asyncio.to_thread(screenshot_fingerprint, png),
+                "screenshot": base64.b64encode(png).decode(),
+            })
+    finally:
+        if original_size:
+            try:
+                await page.set_viewport_size(original_size)
+            except Exception as e:
+                # Page fermee (annulation): rien a restaurer
+                logger.debug(f"Restauration du viewport impossible: {e}")
+
+    return results
+
+
+async def block_rendering_resources(route):
+    """Route de page du mode analyse: bloque ce qui ne sert qu'au rendu."""
+    if route.request.resource_type in ANALYSIS_BLOCKED_TYPES:
+        await route.abort()
+    else:
+        await route.fallback()
+
+
 class Capturer:
     """Gere toutes les captures (screenshot, reseau, DOM)."""
 
-    async def capture_all(
+    async def capture_all(self, url: str, **options) -> Dict:
+        """
+        Capture complete: screenshot + reseau + DOM.
+
+        Args:
+            url: URL a capturer
+            **options: Options de capture (voir capture_stream)
+
+        Returns:
+            Dict avec screenshot, network_logs, dom_elements, html (optionnel).
+            Les etapes non executees valent None.
+        """
+        result = {}
+        async for part, data in self.capture_stream(url, **options):
+            result.update(data)
+        return result
+
+    async def capture_stream(
         self,
         url: str,
         full_page: bool = False,
@@ -216,10 +452,21 @@ class Capturer:
         delay: int = 0,
         click_selector: Optional[str] = None,
         hide_selectors: Optional[str] = None,
-        grab_html: bool = False
-    ) -> Dict:
+        grab_html: bool = False,
+        readiness: str = "fixed",
+        include: Optional[List[str]] = None,
+        full_page_mode: str = "single",
+        timings: Optional[CaptureTimings] = None,
+        session_id: Optional[str] = None,
+        mode: str = "full",
+        viewports: Optional[List[Dict]] = None,
+        filmstrip: Optional[List[float]] = None
+    ) -> AsyncIterator[Tuple[str, Dict]]:
         """
-        Capture complete: screenshot + reseau + DOM.
+        Capture par etapes: chaque partie est produite des qu'elle est prete.
+
+        Ordre des parties: network (logs + URL finale), dom, screenshot,
+        html, config. Screenshot, DOM et HTML sont lances en parallele.
 
         Args:
             url: URL a capturer
@@ -230,48 +477,127 @@ class Capturer:
             click_selector: Selecteur CSS d'element a cliquer
             hide_selectors: Selecteurs CSS d'elements a masquer (separes par virgule)
             grab_html: Capturer le HTML source
-
-        Returns:
-            Dict avec screenshot, network_logs, dom_elements, html (optionnel)
+            readiness: "fixed" (delais fixes) ou "smart" (attente de stabilite,
+                delay sert alors de plafond)
+            include: Etapes a executer parmi CAPTURE_STAGES (defaut:
+                screenshot, dom, network; html si grab_html)
+            full_page_mode: "single" (une image Chromium), "tiles" (tranches
+                de viewport) ou "stitched" (tranches assemblees hors process)
+            timings: Chronologie de la requete a completer (optionnel)
+            session_id: Session qui detient le contexte et la page pendant la
+                capture (son arret ou son expiration les ferme)
+            mode: "full" ou "analysis" (reseau + DOM seulement: images, media
+                et fonts bloques, pas de screenshot, viewport reduit, budget
+                de concurrence ANALYSIS_MAX_CONCURRENT)
+            viewports: Devices a capturer apres un seul chargement
+                ({device, width, height}); le premier doit correspondre a
+                width/height, les suivants sont obtenus par redimensionnement
+            filmstrip: Offsets croissants (secondes depuis la navigation) de
+                screenshots intermediaires; le screenshot final est pris
+                apres le dernier
+
+        Yields:
+            Tuples (nom de partie, champs du resultat)
         """
         context: Optional[BrowserContext] = None
         page: Optional[Page] = None
-
-        # Acquerir le semaphore pour toute la duree de la capture
+        tasks: Dict[str, asyncio.Task] = {}
+        smart = readiness == "smart"
+
+        stages = set(include) if include is not None else set(DEFAULT_STAGES)
+        if grab_html:
+            stages.add("html")
+
+        analysis = mode == "analysis"
+        if analysis:
+            # Rien n'est rendu: ni screenshot, ni attente de peinture
+            stages.discard("screenshot")
+            stages = stages or {"dom", "network"}
+            full_page = False
+            width = settings.ANALYSIS_WIDTH or width
+            height = settings.ANALYSIS_HEIGHT or height
+
+        tiled = full_page and full_page_mode != "single"
+        if "screenshot" not in stages:
+            filmstrip = None
+        outcome = "cancelled"
+
+        # Acquerir une place d'admission pour toute la duree de la capture
         # Ceci limite vraiment le nombre de captures concurrentes
-        async with browser_pool.semaphore:
+        # (le delai fixe n'est pas une latence subie en mode smart)
+        if analysis:
+            admission = admission_controller.analysis_slot(timings=timings)
+        else:
+            # Attente volontaire: delai fixe et/ou dernier offset du filmstrip
+            waited = max(0 if smart else delay, filmstrip[-1] if filmstrip else 0)
+            admission = admission_controller.slot(excluded_seconds=waited, timings=timings)
+
+        async with admission:
             try:
-                logger.debug(f"Semaphore acquis pour {url}")
+                logger.debug(f"Admission obtenue pour {url}")
 
                 # Obtenir un contexte du pool
-                context = await browser_pool.get_context(width=width, height=height)
+                with track_phase("context_acquire", timings):
+                    context = await browser_pool.get_context(width=width, height=height)
+                session_manager.attach(session_id, context=context)
                 logger.debug(f"Contexte obtenu pour {url}")
 
                 # Creer page avec capture reseau
                 logger.debug(f"Creation page pour {url}")
                 try:
                     # Timeout explicite pour new_page() car il peut bloquer indefiniment
-                    page = await asyncio.wait_for(context.new_page(), timeout=30.0)
+                    with track_phase("new_page", timings):
+                        page = await asyncio.wait_for(context.new_page(), timeout=30.0)
+                    session_manager.attach(session_id, page=page)
+                    # Context recycle ou pre-chaud: viewport d'une autre taille
+                    if page.viewport_size != {"width": width, "height": height}:
+                        await page.set_viewport_size({"width": width, "height": height})
                     logger.debug(f"Page creee pour {url}")
                 except asyncio.TimeoutError:
                     logger.error(f"Timeout lors de la creation de page pour {url}")
                     raise RuntimeError(f"Timeout lors de la creation de la page apres 30s")
-                network = NetworkCapture()
 
-                # Attacher listeners reseau
-                page.on("request", network.log_request)
-                page.on("response", network.log_response)
+                with track_phase("setup", timings):
+                    if analysis:
+                        # Avant les routes du contexte: les requetes non bloquees
+                        # y retombent (cache des sous-ressources inclus)
+                        await page.route("**/*", block_rendering_resources)
+
+                    # Attacher listeners reseau (seulement si demande)
+                    network = None
+                    if "network" in stages:
+                        network = NetworkCapture()
+                        page.on("request", network.log_request)
+                        page.on("response", network.log_response)
+
+                    # Observateur de stabilite (doit etre installe avant la navigation)
+                    waiter = None
+                    readiness_result = None
+                    if smart:
+                        waiter = ReadinessWaiter(page)
+                        await waiter.attach()
+
+                    # Masquer elements: une seule feuille de style injectee avant la navigation
+                    if hide_selectors:
+                        await page.add_init_script(script=build_hide_script(hide_selectors))
+                        logger.debug(f"[+] Masque: {hide_selectors}")
 
                 logger.info(f"Chargement de {url}...")
 
                 # Naviguer vers l'URL
                 navigation_error = None
-                try:
-                    await page.goto(
-                        url,
-                        timeout=settings.PAGE_LOAD_TIMEOUT * 1000,
-                        wait_until="domcontentloaded"  # Plus rapide que "networkidle"
+                if filmstrip:
+                    # Frames prises pendant la navigation elle-meme
+                    tasks["filmstrip"] = asyncio.create_task(
+                        timed("filmstrip", record_filmstrip(page, filmstrip, time.monotonic()), timings)
                     )
+                try:
+                    with track_phase("goto", timings):
+                        await page.goto(
+                            url,
+                            timeout=settings.PAGE_LOAD_TIMEOUT * 1000,
+                            wait_until="domcontentloaded"  # Plus rapide que "networkidle"
+                        )
                 except Exception as e:
                     error_msg = str(e)
                     # Erreurs critiques qui empechent toute navigation
@@ -283,90 +609,177 @@ class Capturer:
                     navigation_error = error_msg
                     # Continuer pour les timeouts/erreurs mineures si la page a partiellement charge
 
-                # Delai optionnel
-                if delay > 0:
-                    logger.debug(f"Attente de {delay}s...")
-                    await page.wait_for_timeout(delay * 1000)
-
-                # Clic sur element
-                if click_selector:
-                    try:
-                        await page.click(click_selector, timeout=2000)
-                        await page.wait_for_timeout(500)  # Laisser le DOM se mettre a jour
-                        logger.debug(f"[+] Clique sur: {click_selector}")
-                    except Exception as e:
-                        logger.warning(f"Impossible de cliquer sur '{click_selector}': {e}")
-
-                # Masquer elements
-                if hide_selectors:
-                    for selector in hide_selectors.split(','):
-                        selector = selector.strip()
+                with track_phase("delay", timings):
+                    if smart:
+                        # Attente de stabilite, delay sert de plafond
+                        max_wait_ms = delay * 1000 if delay > 0 else settings.READINESS_MAX_WAIT_MS
+                        readiness_result = {"mode": "smart", **await waiter.wait(max_wait_ms)}
+                    elif delay > 0:
+                        # Delai optionnel
+                        logger.debug(f"Attente de {delay}s...")
+                        await page.wait_for_timeout(delay * 1000)
+                    if "filmstrip" in tasks:
+                        await tasks["filmstrip"]
+
+                with track_phase("click_hide", timings):
+                    # Clic sur element
+                    if click_selector:
                         try:
-                            await page.evaluate(f"""
-                                document.querySelectorAll('{selector}').forEach(
-                                    el => el.style.display = 'none'
+                            await page.click(click_selector, timeout=2000)
+                            # Laisser le DOM se mettre a jour
+                            if smart:
+                                readiness_result["after_click"] = await waiter.wait(
+                                    settings.READINESS_POST_ACTION_MAX_MS
                                 )
-                            """)
-                            logger.debug(f"[+] Masque: {selector}")
+                            else:
+                                await page.wait_for_timeout(500)
+                            logger.debug(f"[+] Clique sur: {click_selector}")
                         except Exception as e:
-                            logger.warning(f"Impossible de masquer '{selector}': {e}")
+                            logger.warning(f"Impossible de cliquer sur '{click_selector}': {e}")
 
-                # Attendre un peu pour que les changements s'appliquent
-                await page.wait_for_timeout(300)
+                    # Attendre un peu pour que les changements s'appliquent
+                    # (inutile en mode smart: la page est deja stable)
+                    if not smart and "screenshot" in stages:
+                        await page.wait_for_timeout(300)
 
                 # PARALLELISATION: Capture screenshot + Extraction DOM + HTML en parallele
-                logger.debug("Capture parallele (screenshot + DOM + HTML)...")
-
-                tasks = [
-                    page.screenshot(full_page=full_page, type="png"),  # Screenshot
-                    DOMExtractor.extract_elements(page),  # DOM extraction
-                ]
-
-                # HTML source (optionnel)
-                if grab_html:
-                    tasks.append(page.content())
-
-                # Executer en parallele
-                results = await asyncio.gather(*tasks)
-
-                # Extraire resultats
-                screenshot = results[0]
-                screenshot_b64 = base64.b64encode(screenshot).decode()
-                dom_elements = results[1]
-                html_source = results[2] if grab_html else None
-
-                # Construire resultat
-                result = {
-                    "screenshot": screenshot_b64,
-                    "screenshot_format": "png",
-                    "network_logs": network.get_logs(),
-                    "dom_elements": dom_elements,
+                logger.debug(f"Capture parallele ({', '.join(sorted(stages))})...")
+
+                if "screenshot" in stages:
+                    if tiled:
+                        # Full-page par tuiles: memoire du renderer bornee au viewport
+                        screenshot_coro = capture_tiles(page, width, height)
+                    else:
+                        screenshot_coro = page.screenshot(full_page=full_page, type="png")
+                    tasks["screenshot"] = asyncio.create_task(timed("screenshot", screenshot_coro, timings))
+                if "dom" in stages:
+                    tasks["dom"] = asyncio.create_task(timed("dom_extraction", DOMExtractor.extract_elements(page), timings))
+                if "html" in stages:
+                    tasks["html"] = asyncio.create_task(timed("html", page.content(), timings))
+
+                # Partie 1: reseau (liste vivante, completee jusqu'a la fin en mode agrege)
+                yield "network", {
+                    "network_logs": network.get_logs() if network else None,
                     "final_url": page.url,  # URL finale (apres redirections)
-                    "capture_config": {
-                        "full_page": full_page,
-                        "width": width,
-                        "height": height,
-                        "delay": delay
-                    }
                 }
 
-                if html_source:
-                    result["html_source"] = html_source
+                # Partie 2: DOM
+                yield "dom", {"dom_elements": await tasks["dom"] if "dom" in tasks else None}
+
+                # Partie 3: screenshot
+                screenshot = await tasks["screenshot"] if "screenshot" in tasks else None
+                screenshot_tiles = None
+                tiles_info = None
+
+                if tiled and screenshot is not None:
+                    captured = screenshot
+                    screenshot = None
+                    tiles_info = {
+                        "count": len(captured["tiles"]),
+                        "page_height": captured["page_height"],
+                        "captured_height": captured["captured_height"],
+                        "truncated": captured["truncated"],
+                    }
 
-                logger.info(f"[+] Capture reussie de {url} ({len(network.get_logs())} requetes reseau)")
+                    if full_page_mode == "stitched":
+                        with track_phase("stitch", timings):
+                            screenshot = await stitch_tiles(captured["tiles"], width, captured["captured_height"])
+
+                    # Tuiles retournees si demandees (ou si l'assemblage est impossible)
+                    if screenshot is None:
+                        with track_phase("encode", timings):
+                            screenshot_tiles = [
+                                {
+                                    "y": tile["y"],
+                                    "height": tile["height"],
+                                    "screenshot": base64.b64encode(tile["png"]).decode()
+                                }
+                                for tile in captured["tiles"]
+                            ]
 
-                return result
+                with track_phase("encode", timings):
+                    screenshot_part = {
+                        "screenshot": base64.b64encode(screenshot).decode() if screenshot is not None else None,
+                        "screenshot_format": "png",
+                    }
+                    if screenshot is not None:
+                        # Empreinte perceptuelle (decodage PNG hors event loop)
+                        fingerprint = await asyncio.to_thread(screenshot_fingerprint, screenshot)
+                        if fingerprint:
+                            screenshot_part["screenshot_hash"] = fingerprint
+                if screenshot_tiles:
+                    screenshot_part["screenshot_tiles"] = screenshot_tiles
+                if "filmstrip" in tasks:
+                    screenshot_part["filmstrip"] = await tasks["filmstrip"]
+                # Liberer les octets bruts avant de produire la partie suivante
+                screenshot = None
+                # Autres devices: meme page, DOM et reseau partages (DOM deja extrait)
+                if viewports and len(viewports) > 1 and screenshot_part["screenshot"] is not None:
+                    with track_phase("viewports", timings):
+                        screenshot_part["screenshot_viewports"] = await capture_viewports(
+                            page, viewports, full_page, waiter, screenshot_part.get("screenshot_hash")
+                        )
+                yield "screenshot", screenshot_part
+                screenshot_part = None
+
+                # Partie 4: HTML source (optionnel)
+                if "html" in tasks:
+                    yield "html", {"html_source": await tasks["html"]}
+
+                # Partie 5: configuration effective
+                capture_config = {
+                    "full_page": full_page,
+                    "width": width,
+                    "height": height,
+                    "delay": delay,
+                    "readiness": readiness_result or {"mode": "fixed"},
+                    "include": sorted(stages),
+                    "full_page_mode": full_page_mode if full_page else None,
+                    "mode": mode
+                }
+                if filmstrip:
+                    frames = tasks["filmstrip"].result()
+                    capture_config["filmstrip"] = {
+                        "offsets": filmstrip,
+                        "frames": len(frames),
+                        "deduplicated": sum(len(frame.get("unchanged_ms", [])) for frame in frames),
+                    }
+                if viewports and "screenshot" in stages:
+                    capture_config["viewports"] = [
+                        {key: viewport[key] for key in ("device", "width", "height")} for viewport in viewports
+                    ]
+                if tiles_info:
+                    capture_config["tiles"] = tiles_info
+                if subresource_cache:
+                    capture_config["subresource_cache"] = dict(browser_pool.subresource_stats(context))
+
+                request_count = len(network.get_logs()) if network else 0
+                logger.info(f"[+] Capture reussie de {url} ({request_count} requetes reseau)")
+
+                outcome = "success"
+                yield "config", {"capture_config": capture_config}
 
             except Exception as e:
+                outcome = "timeout" if "timeout" in str(e).lower() else "error"
                 logger.error(f"[-] Erreur capture de {url}: {e}")
                 raise
 
             finally:
-                # Cleanup
+                CAPTURES_TOTAL.inc(outcome)
+
+                # Annuler les etapes en cours (client deconnecte, erreur)
+                for task in tasks.values():
+                    if not task.done():
+                        task.cancel()
+                await asyncio.gather(*tasks.values(), return_exceptions=True)
+
+                # Cleanup (la session ne detient plus les ressources)
+                session_manager.detach(session_id)
                 if page:
                     await page.close()
                 if context:
-                    await browser_pool.release_context(context)
+                    # Recyclable seulement apres une capture terminee normalement
+                    await browser_pool.release_context(context, reusable=outcome == "success")
 
 
 # Instance globale
@@ -21,6 +21,8 @@ class Settings(BaseSettings):
 
     # Securite
     SECRET_KEY: str = os.getenv("SECRET_KEY", "change-this-in-production")
+    # Jeton des endpoints d'admin (/drain, /undrain); vide = clients locaux uniquement
+    ADMIN_TOKEN: str = os.getenv("ADMIN_TOKEN", "")
     ALLOW_LOCAL_URLS: bool = os.getenv("ALLOW_LOCAL_URLS", "False").lower() == "true"
     MAX_SELECTOR_LENGTH: int = 200
 
@@ -33,13 +35,78 @@ class Settings(BaseSettings):
     MAX_CONCURRENT_SESSIONS: int = int(os.getenv("MAX_CONCURRENT_SESSIONS", "10"))
     MAX_MEMORY_MB: int = int(os.getenv("MAX_MEMORY_MB", "3500"))  # Alerte a 3.5GB
 
+    # Admission memoire: admet les captures selon la RSS mesuree de Chromium
+    # (MAX_MEMORY_MB devient alors le budget memoire du navigateur)
+    MEMORY_ADMISSION_ENABLED: bool = os.getenv("MEMORY_ADMISSION_ENABLED", "False").lower() == "true"
+    ADMISSION_SAMPLE_INTERVAL: float = float(os.getenv("ADMISSION_SAMPLE_INTERVAL", "1.0"))  # Defaut de MONITOR_SAMPLE_INTERVAL
+    ADMISSION_INITIAL_COST_MB: int = int(os.getenv("ADMISSION_INITIAL_COST_MB", "250"))  # ~250MB par navigateur
+    ADMISSION_MIN_COST_MB: int = int(os.getenv("ADMISSION_MIN_COST_MB", "50"))
+    ADMISSION_LEARNING_RATE: float = float(os.getenv("ADMISSION_LEARNING_RATE", "0.2"))  # EWMA
+
+    # Mode analyse (reseau + DOM sans screenshot, images bloquees): budget de
+    # concurrence propre (defaut: 3x MAX_CONCURRENT_BROWSERS) et viewport
+    # reduit (0 = dimensions demandees)
+    ANALYSIS_MAX_CONCURRENT: int = int(os.getenv("ANALYSIS_MAX_CONCURRENT", str(3 * int(os.getenv("MAX_CONCURRENT_BROWSERS", "4")))))
+    ANALYSIS_WIDTH: int = int(os.getenv("ANALYSIS_WIDTH", "800"))
+    ANALYSIS_HEIGHT: int = int(os.getenv("ANALYSIS_HEIGHT", "600"))
+
+    # Limite adaptative sur la latence (bornes: ADAPTIVE_MIN_LIMIT..MAX_CONCURRENT_BROWSERS)
+    ADAPTIVE_LIMIT_ENABLED: bool = os.getenv("ADAPTIVE_LIMIT_ENABLED", "False").lower() == "true"
+    ADAPTIVE_LIMIT_ALGORITHM: str = os.getenv("ADAPTIVE_LIMIT_ALGORITHM", "gradient")  # gradient | aimd
+    ADAPTIVE_MIN_LIMIT: int = int(os.getenv("ADAPTIVE_MIN_LIMIT", "1"))
+    ADAPTIVE_LATENCY_TOLERANCE: float = float(os.getenv("ADAPTIVE_LATENCY_TOLERANCE", "1.3"))
+    ADAPTIVE_BASELINE_WINDOW: int = int(os.getenv("ADAPTIVE_BASELINE_WINDOW", "200"))  # captures
+    ADAPTIVE_BACKOFF: float = float(os.getenv("ADAPTIVE_BACKOFF", "0.9"))
+
     # Timeouts (en secondes)
     BROWSER_TIMEOUT: int = int(os.getenv("BROWSER_TIMEOUT", "20"))
     PAGE_LOAD_TIMEOUT: int = int(os.getenv("PAGE_LOAD_TIMEOUT", "10"))
     SESSION_TIMEOUT: int = int(os.getenv("SESSION_TIMEOUT", "300"))  # 5min
 
+    # Detection de stabilite (readiness="smart")
+    READINESS_MAX_WAIT_MS: int = int(os.getenv("READINESS_MAX_WAIT_MS", "10000"))  # Plafond si delay=0
+    READINESS_POST_ACTION_MAX_MS: int = int(os.getenv("READINESS_POST_ACTION_MAX_MS", "2000"))  # Apres clic
+    READINESS_QUIET_WINDOW_MS: int = int(os.getenv("READINESS_QUIET_WINDOW_MS", "500"))
+    READINESS_MAX_INFLIGHT: int = int(os.getenv("READINESS_MAX_INFLIGHT", "2"))
+    READINESS_POLL_INTERVAL_MS: int = int(os.getenv("READINESS_POLL_INTERVAL_MS", "100"))
+
+    # Full-page par tuiles (full_page_mode=tiles|stitched)
+    FULLPAGE_MAX_HEIGHT: int = int(os.getenv("FULLPAGE_MAX_HEIGHT", "20000"))  # Hauteur max capturee (px)
+    FULLPAGE_STITCH_WORKERS: int = int(os.getenv("FULLPAGE_STITCH_WORKERS", "1"))  # Process d'assemblage
+
+    # Index de similarite des screenshots (pHash, necessite numpy + Pillow)
+    SIMILARITY_ENABLED: bool = os.getenv("SIMILARITY_ENABLED", "False").lower() == "true"
+    SIMILARITY_MAX_ENTRIES: int = int(os.getenv("SIMILARITY_MAX_ENTRIES", "50000"))
+    SIMILARITY_DEFAULT_RADIUS: int = int(os.getenv("SIMILARITY_DEFAULT_RADIUS", "10"))  # bits sur 64
+    SIMILARITY_DUPLICATE_RADIUS: int = int(os.getenv("SIMILARITY_DUPLICATE_RADIUS", "4"))
+
+    # Filmstrip (screenshots a offsets pendant un chargement): une frame a moins
+    # de FILMSTRIP_DEDUP_RADIUS bits (pHash) de la precedente est dedupliquee
+    FILMSTRIP_DEDUP_RADIUS: int = int(os.getenv("FILMSTRIP_DEDUP_RADIUS", os.getenv("SIMILARITY_DUPLICATE_RADIUS", "4")))
+    FILMSTRIP_FRAME_TIMEOUT: int = int(os.getenv("FILMSTRIP_FRAME_TIMEOUT", "5"))  # secondes par frame
+
+    # Extraction DOM (limites par section et budget de temps)
+    DOM_EXTRACTION_BUDGET_MS: int = int(os.getenv("DOM_EXTRACTION_BUDGET_MS", "1500"))
+    DOM_MAX_CLICKABLE: int = int(os.getenv("DOM_MAX_CLICKABLE", "300"))
+    DOM_MAX_HIDDEN: int = int(os.getenv("DOM_MAX_HIDDEN", "100"))
+    DOM_MAX_FORMS: int = int(os.getenv("DOM_MAX_FORMS", "20"))
+    DOM_MAX_FORM_INPUTS: int = int(os.getenv("DOM_MAX_FORM_INPUTS", "50"))
+    DOM_MAX_SCRIPTS: int = int(os.getenv("DOM_MAX_SCRIPTS", "50"))
+    DOM_MAX_SCRIPT_CHARS: int = int(os.getenv("DOM_MAX_SCRIPT_CHARS", "5000"))  # Contenu inline tronque
+    DOM_MAX_POPUPS: int = int(os.getenv("DOM_MAX_POPUPS", "30"))
+
+    # Drain (arret sans perte): attente max des captures en cours, et
+    # readiness fausse au-dela de READINESS_MAX_WAITING captures en attente
+    DRAIN_TIMEOUT: float = float(os.getenv("DRAIN_TIMEOUT", "30"))
+    READINESS_MAX_WAITING: int = int(os.getenv("READINESS_MAX_WAITING", os.getenv("MAX_CONCURRENT_BROWSERS", "4")))
+
+    # Monitoring systeme (echantillons partages par health, stats et admission)
+    MONITOR_SAMPLE_INTERVAL: float = float(os.getenv("MONITOR_SAMPLE_INTERVAL", os.getenv("ADMISSION_SAMPLE_INTERVAL", "1.0")))
+    MONITOR_HISTORY_SIZE: int = int(os.getenv("MONITOR_HISTORY_SIZE", "300"))  # 5min a 1s
+    MONITOR_CACHE_STATS_INTERVAL: float = float(os.getenv("MONITOR_CACHE_STATS_INTERVAL", "30"))  # Redis INFO + SCAN
+
     # Cleanup
-    CLEANUP_INTERVAL: int = int(os.getenv("CLEANUP_INTERVAL", "30"))  # 30s
+    CLEANUP_INTERVAL: int = int(os.getenv("CLEANUP_INTERVAL", "30"))  # Controle memoire (expiration a l'echeance)
 
     # Redis Cache (Optional)
     REDIS_ENABLED: bool = os.getenv("REDIS_ENABLED", "False").lower() == "true"
@@ -53,10 +120,41 @@ class Settings(BaseSettings):
     # Si false: cache toutes les captures (risque de servir du contenu incomplet)
     # Si true: skip delay=0, domaines dynamiques, pages avec peu de requetes
 
+    # Etat partage entre replicas (rate limits, sessions actives): local ou redis
+    # Redis utilise REDIS_HOST/REDIS_PORT/REDIS_DB, repli local si indisponible
+    SHARED_STATE_BACKEND: str = os.getenv("SHARED_STATE_BACKEND", "local")
+
+    # File de captures distribuee: les noeuds API publient, chaque noeud tire
+    # les jobs quand il a de la capacite (redis: streams partages, local: process)
+    WORK_QUEUE_ENABLED: bool = os.getenv("WORK_QUEUE_ENABLED", "False").lower() == "true"
+    WORK_QUEUE_BACKEND: str = os.getenv("WORK_QUEUE_BACKEND", "redis")  # redis | local
+    WORK_QUEUE_CONSUMERS: int = int(os.getenv("WORK_QUEUE_CONSUMERS", os.getenv("MAX_CONCURRENT_BROWSERS", "4")))  # 0 = noeud API seul
+    WORK_QUEUE_VISIBILITY_TIMEOUT: int = int(os.getenv("WORK_QUEUE_VISIBILITY_TIMEOUT", "60"))  # Job repris si le noeud ne donne plus signe de vie
+    WORK_QUEUE_MAX_ATTEMPTS: int = int(os.getenv("WORK_QUEUE_MAX_ATTEMPTS", "3"))
+    WORK_QUEUE_RESULT_TIMEOUT: int = int(os.getenv("WORK_QUEUE_RESULT_TIMEOUT", "180"))  # Attente max du resultat
+
     # Pre-warm contexts (Performance)
     PREWARM_ENABLED: bool = os.getenv("PREWARM_ENABLED", "False").lower() == "true"
     PREWARM_COUNT: int = int(os.getenv("PREWARM_COUNT", "2"))  # Nombre de contexts chauds
 
+    # Recyclage des contextes: reutilises apres reinitialisation (cookies, stockage,
+    # permissions, service workers, cache) au lieu d'etre recrees a chaque capture
+    CONTEXT_RECYCLE_ENABLED: bool = os.getenv("CONTEXT_RECYCLE_ENABLED", "False").lower() == "true"
+    CONTEXT_RECYCLE_MAX_USES: int = int(os.getenv("CONTEXT_RECYCLE_MAX_USES", "20"))  # Puis fermeture
+    CONTEXT_RECYCLE_RESET_TIMEOUT: float = float(os.getenv("CONTEXT_RECYCLE_RESET_TIMEOUT", "5"))
+
+    # Cache disque partage des sous-ressources statiques publiques (scripts, CSS,
+    # images) entre contextes, selon Cache-Control
+    SUBRESOURCE_CACHE_ENABLED: bool = os.getenv("SUBRESOURCE_CACHE_ENABLED", "False").lower() == "true"
+    SUBRESOURCE_CACHE_DIR: str = os.getenv("SUBRESOURCE_CACHE_DIR", "/tmp/shoturl-subresources")
+    SUBRESOURCE_CACHE_MAX_MB: int = int(os.getenv("SUBRESOURCE_CACHE_MAX_MB", "512"))
+    SUBRESOURCE_CACHE_MAX_ENTRY_MB: int = int(os.getenv("SUBRESOURCE_CACHE_MAX_ENTRY_MB", "5"))
+
+    # Workers navigateur separes (sockets Unix separes par virgule, vide = pool local)
+    # Permet plusieurs workers uvicorn sans multiplier les instances Chromium
+    BROWSER_WORKER_SOCKETS: str = os.getenv("BROWSER_WORKER_SOCKETS", "")
+    BROWSER_WORKER_CONNECT_TIMEOUT: float = float(os.getenv("BROWSER_WORKER_CONNECT_TIMEOUT", "5"))
+
     # Dimensions
     MIN_WIDTH: int = 200
     MIN_HEIGHT: int = 200
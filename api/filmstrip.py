@@ -0,0 +1,85 @@
+"""Filmstrip: screenshots horodates pendant un seul chargement de page."""
+
+import asyncio
+import base64
+import hashlib
+import time
+from typing import Dict, List
+from playwright.async_api import Page
+
+from api.config import settings, logger
+from api.similarity import HASHING_AVAILABLE, compute_phash, hamming
+
+
+def _frame_signature(png: bytes) -> Dict:
+    """Empreinte d'une frame pour la deduplication (a appeler hors event loop)."""
+    signature = {"sha256": hashlib.sha256(png).hexdigest(), "phash": None}
+    if HASHING_AVAILABLE:
+        try:
+            signature["phash"] = compute_phash(png)
+        except Exception as e:
+            logger.debug(f"Empreinte de frame impossible: {e}")
+    return signature
+
+
+def _unchanged(previous: Dict, current: Dict) -> bool:
+    """Deux frames sont identiques (octets) ou perceptuellement proches."""
+    if previous["sha256"] == current["sha256"]:
+        return True
+    if previous["phash"] is None or current["phash"] is None:
+        return False
+    return hamming(previous["phash"], current["phash"]) <= settings.FILMSTRIP_DEDUP_RADIUS
+
+
+async def record_filmstrip(page: Page, offsets: List[float], started_at: float) -> List[Dict]:
+    """
+    Prend un screenshot du viewport a chaque offset pendant le chargement.
+
+    Une frame sans changement visuel (meme URL, pHash a moins de
+    FILMSTRIP_DEDUP_RADIUS bits, ou octets identiques sans numpy/Pillow)
+    n'est pas renvoyee: son horodatage s'ajoute a unchanged_ms de la
+    derniere frame conservee.
+
+    Args:
+        page: Page Playwright (navigation en cours ou terminee)
+        offsets: Offsets croissants en secondes depuis started_at
+        started_at: Debut de la navigation (time.monotonic())
+
+    Returns:
+        Frames conservees: {offset_ms, url, phash, screenshot, unchanged_ms},
+        ou {offset_ms, url, error} si le screenshot a echoue
+    """
+    frames = []
+    last_frame = None
+    last_signature = None
+
+    for offset in offsets:
+        await asyncio.sleep(max(0.0, started_at + offset - time.monotonic()))
+        # Horodatage reel: un screenshot lent decale les suivants
+        offset_ms = round((time.monotonic() - started_at) * 1000)
+        url = page.url
+
+        try:
+            png = await page.screenshot(type="png", timeout=settings.FILMSTRIP_FRAME_TIMEOUT * 1000)
+        except Exception as e:
+            # Redirection ou rendu bloque: frame manquante, la capture continue
+            logger.debug(f"Frame filmstrip a {offset_ms}ms impossible: {e}")
+            frames.append({"offset_ms": offset_ms, "url": url, "error": str(e).splitlines()[0]})
+            continue
+
+        signature = await asyncio.to_thread(_frame_signature, png)
+        if last_frame and last_frame["url"] == url and _unchanged(last_signature, signature):
+            last_frame["unchanged_ms"].append(offset_ms)
+            continue
+
+        last_frame = {
+            "offset_ms": offset_ms,
+            "url": url,
+            "phash": f"{signature['phash']:016x}" if signature["phash"] is not None else None,
+            "screenshot": base64.b64encode(png).decode(),
+            "unchanged_ms": [],
+        }
+        last_signature = signature
+        frames.append(last_frame)
+
+    return frames
@@ -7,7 +7,7 @@ from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse, JSONResponse, HTMLResponse
+from fastapi.responses import FileResponse, JSONResponse, HTMLResponse, PlainTextResponse
 from fastapi.openapi.docs import get_swagger_ui_html, get_redoc_html
 import uvicorn
 from slowapi import Limiter, _rate_limit_exceeded_handler
@@ -15,15 +15,24 @@ from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
 
 from api.config import settings, logger
-from api.routes import router
+from api.routes import router, drain_captures, inflight_captures
 from api.browser import browser_pool
+from api.capture import capturer
 from api.session import session_manager
+from api.admission import admission_controller
+from api.tiles import shutdown_stitch_pool
+from api.worker import remote_capturer
+from api.work_queue import work_queue_node
+from api.monitoring import system_monitor
+from api.shared_state import limiter_options
+from api.metrics import Gauge, REQUESTS_BLOCKED_TOTAL, render_metrics
 
 # Rate limiter initialization
 limiter = Limiter(
     key_func=get_remote_address,
     default_limits=["200/hour", "30/minute"],
-    headers_enabled=True
+    headers_enabled=True,
+    **limiter_options()
 )
 
 
@@ -32,7 +41,7 @@ async def lifespan(app: FastAPI):
     """
     Gere le cycle de vie de l'application.
     Startup: Initialise le pool de navigateurs et demarre le cleanup.
-    Shutdown: Nettoie toutes les ressources.
+    Shutdown: Draine les captures en cours puis nettoie toutes les ressources.
     """
     # ========== STARTUP ==========
     logger.info(f"[START] Demarrage de ShotURL v{settings.VERSION}")
@@ -40,8 +49,26 @@ async def lifespan(app: FastAPI):
                 f"{settings.MAX_MEMORY_MB}MB RAM max")
 
     try:
-        # Initialiser le pool de navigateurs
-        await browser_pool.initialize()
+        # Echantillonnage systeme partage (health, stats, admission), avec
+        # les etats lus par /health et /ready: aucun appel Redis ni worker
+        # navigateur par sonde
+        system_monitor.track("global_sessions", session_manager.slots.count)
+        system_monitor.track("browser_pool", remote_capturer.get_stats if remote_capturer else browser_pool.get_stats)
+        system_monitor.start()
+
+        if remote_capturer:
+            # Navigateurs dans des workers separes (python -m api.worker)
+            await remote_capturer.check()
+        else:
+            # Initialiser le pool de navigateurs
+            await browser_pool.initialize()
+
+            # Demarrer l'admission memoire (si activee)
+            admission_controller.start()
+
+        if work_queue_node:
+            # Consommer la file distribuee avec le backend local du noeud
+            await work_queue_node.start(remote_capturer or capturer)
 
         # Demarrer le cleanup automatique des sessions
         session_manager.start_cleanup()
@@ -58,11 +85,32 @@ async def lifespan(app: FastAPI):
     logger.info("[STOP] Arret de l'application...")
 
     try:
+        # Drain: plus d'admission, les captures en cours (y compris celles
+        # relayees aux workers navigateur) se terminent, au plus DRAIN_TIMEOUT,
+        # avant la fermeture du navigateur
+        if await drain_captures(settings.DRAIN_TIMEOUT):
+            logger.info("[DRAIN] Aucune capture en cours")
+        else:
+            logger.warning(f"[DRAIN] {inflight_captures()} capture(s) interrompue(s) apres {settings.DRAIN_TIMEOUT}s")
+
+        if work_queue_node:
+            # Les jobs non termines a temps seront repris par un autre noeud
+            await work_queue_node.stop(timeout=settings.DRAIN_TIMEOUT)
+
         # Arreter le cleanup
         await session_manager.stop_cleanup()
 
-        # Nettoyer le pool de navigateurs
-        await browser_pool.cleanup()
+        if not remote_capturer:
+            # Arreter l'admission memoire
+            await admission_controller.stop()
+
+            # Nettoyer le pool de navigateurs
+            await browser_pool.cleanup()
+
+        # Arreter le pool d'assemblage des tuiles
+        shutdown_stitch_pool()
+
+        await system_monitor.stop()
 
         logger.info("[OK] Application arretee proprement")
 
@@ -88,6 +136,7 @@ app = FastAPI(
 @app.exception_handler(RateLimitExceeded)
 async def custom_rate_limit_handler(request: Request, exc: RateLimitExceeded):
     """Handler personnalise pour les erreurs de rate limiting."""
+    REQUESTS_BLOCKED_TOTAL.inc("rate_limit")
     return JSONResponse(
         status_code=429,
         content={
@@ -176,6 +225,23 @@ async def get_redoc(request: Request):
     )
 
 
+# Jauges lues au moment du scrape
+Gauge("shoturl_captures_active", "Captures en cours", lambda: admission_controller.active)
+Gauge("shoturl_captures_waiting", "Captures en attente d'admission", lambda: admission_controller.waiting)
+Gauge("shoturl_analysis_active", "Captures d'analyse en cours", lambda: admission_controller.analysis_active)
+Gauge("shoturl_concurrency_limit", "Limite de concurrence effective", admission_controller.effective_limit)
+Gauge("shoturl_browser_contexts", "Contextes navigateur actifs", lambda: len(browser_pool.contexts))
+Gauge("shoturl_sessions_active", "Sessions actives", lambda: len(session_manager.sessions))
+Gauge("shoturl_browser_rss_bytes", "RSS de l'arbre Chromium", lambda: system_monitor.samples[-1]["browser_rss_mb"] * 1024 * 1024)
+Gauge("shoturl_event_loop_lag_seconds", "Retard de l'event loop", lambda: system_monitor.samples[-1]["loop_lag_ms"] / 1000)
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Metriques au format Prometheus."""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
 # Servir les fichiers statiques du frontend (si build existe)
 # IMPORTANT: Mount assets BEFORE mounting root to avoid conflicts
 if settings.STATIC_DIR.exists():
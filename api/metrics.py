@@ -0,0 +1,222 @@
+"""Metriques Prometheus (format texte) sans dependance externe."""
+
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Bornes (secondes) adaptees aux phases de capture: de 5ms a 60s
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0)
+
+_registry: List["_Metric"] = []
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    """Formate les labels Prometheus: {a="x",b="y"}."""
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    """Base commune: nom, aide, type et enregistrement global."""
+
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        _registry.append(self)
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    """Compteur monotone (un increment = une addition dans un dict)."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def _samples(self) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {value}"
+            for labels, value in self._values.items()
+        ]
+
+
+class Gauge(_Metric):
+    """Jauge lue au moment du scrape (aucun cout sur le chemin critique)."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, getter: Callable[[], float]):
+        super().__init__(name, documentation)
+        self.getter = getter
+
+    def _samples(self) -> List[str]:
+        try:
+            value = self.getter()
+        except Exception:
+            return []
+        return [f"{self.name} {value}"]
+
+
+class Histogram(_Metric):
+    """Histogramme a bornes fixes (recherche dichotomique + 2 additions)."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = buckets
+        # Par serie: [compteurs par bucket (+Inf inclus), somme]
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, *labels: str):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def _samples(self) -> List[str]:
+        lines = []
+        for labels, (counts, total) in self._series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                bucket_labels = _format_labels(self.labelnames, labels, f'le="{le}"')
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+def render_metrics() -> str:
+    """Exporte toutes les metriques au format texte Prometheus."""
+    return "\n".join(metric.render() for metric in _registry) + "\n"
+
+
+# ========== Metriques de l'application ==========
+
+CAPTURE_PHASE_SECONDS = Histogram(
+    "shoturl_capture_phase_seconds",
+    "Duree de chaque phase d'une capture",
+    ("phase",)
+)
+
+CAPTURES_TOTAL = Counter(
+    "shoturl_captures_total",
+    "Captures terminees par resultat",
+    ("outcome",)
+)
+
+CACHE_REQUESTS_TOTAL = Counter(
+    "shoturl_cache_requests_total",
+    "Lectures du cache Redis par resultat",
+    ("result",)
+)
+
+PREWARM_TOTAL = Counter(
+    "shoturl_prewarm_total",
+    "Contextes servis depuis le pre-warm (hit) ou crees a la demande (miss)",
+    ("result",)
+)
+
+CONTEXT_RECYCLE_TOTAL = Counter(
+    "shoturl_context_recycle_total",
+    "Contextes recycles (reused), remis en reserve (recycled), ou fermes (retired, reset_failed)",
+    ("result",)
+)
+
+SUBRESOURCE_CACHE_TOTAL = Counter(
+    "shoturl_subresource_cache_total",
+    "Sous-ressources servies du cache disque (hit), telechargees (miss), stockees, ou non eligibles (bypass)",
+    ("result",)
+)
+
+REQUESTS_BLOCKED_TOTAL = Counter(
+    "shoturl_requests_blocked_total",
+    "Requetes de capture refusees par raison",
+    ("reason",)
+)
+
+
+class CaptureTimings:
+    """
+    Chronologie d'une requete de capture.
+
+    Chaque phase est enregistree avec son debut et sa duree en millisecondes,
+    relatifs au debut de la requete (horloge monotone perf_counter).
+    """
+
+    def __init__(self):
+        self.origin = time.perf_counter()
+        self.phases: List[Dict] = []
+
+    def record(self, phase: str, started: float, ended: float):
+        self.phases.append({
+            "phase": phase,
+            "start_ms": round((started - self.origin) * 1000, 1),
+            "duration_ms": round((ended - started) * 1000, 1),
+        })
+
+    def extend(self, phases: List[Dict], started: float):
+        """Ajoute des phases mesurees ailleurs (worker), relatives a `started`."""
+        offset_ms = (started - self.origin) * 1000
+        for entry in phases:
+            self.phases.append({**entry, "start_ms": round(entry["start_ms"] + offset_ms, 1)})
+
+    def total_ms(self) -> float:
+        return round((time.perf_counter() - self.origin) * 1000, 1)
+
+    def to_dict(self) -> Dict:
+        return {"total_ms": self.total_ms(), "phases": self.phases}
+
+    def server_timing(self) -> str:
+        """Valeur de l'en-tete Server-Timing (une entree par phase)."""
+        entries = [
+            f'{entry["phase"]};dur={entry["duration_ms"]}'
+            for entry in self.phases
+        ]
+        entries.append(f"total;dur={self.total_ms()}")
+        return ", ".join(entries)
+
+
+def observe_phase(phase: str, started: float, ended: float, timings: Optional[CaptureTimings] = None):
+    """Enregistre une phase dans l'histogramme et, si fournie, la chronologie."""
+    CAPTURE_PHASE_SECONDS.observe(ended - started, phase)
+    if timings is not None:
+        timings.record(phase, started, ended)
+
+
+@contextmanager
+def track_phase(phase: str, timings: Optional[CaptureTimings] = None):
+    """Mesure la duree d'un bloc dans shoturl_capture_phase_seconds."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_phase(phase, started, time.perf_counter(), timings)
+
+
+async def timed(phase: str, awaitable, timings: Optional[CaptureTimings] = None):
+    """Attend une coroutine en mesurant sa duree (etapes paralleles)."""
+    with track_phase(phase, timings):
+        return await awaitable
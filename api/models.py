@@ -1,7 +1,7 @@
 """Modeles Pydantic pour validation des donnees."""
 
-from typing import Optional
-from pydantic import BaseModel, Field, HttpUrl, field_validator
+from typing import List, Optional
+from pydantic import BaseModel, Field, HttpUrl, field_validator, model_validator
 
 
 class CaptureRequest(BaseModel):
@@ -9,13 +9,39 @@ class CaptureRequest(BaseModel):
 
     url: str = Field(..., description="URL du site a capturer")
     full_page: bool = Field(False, description="Capture full-page ou viewport")
+    full_page_mode: str = Field(
+        "single",
+        description="Mode full-page: single (une image), tiles (tranches de viewport) ou stitched (tranches assemblees)"
+    )
     device: Optional[str] = Field("desktop", description="Type de device (desktop, tablet, phone)")
+    devices: Optional[List[str]] = Field(
+        None,
+        description="Plusieurs devices pour un seul chargement: un screenshot par viewport (remplace device/width/height)"
+    )
     width: Optional[int] = Field(None, ge=200, le=3840, description="Largeur custom viewport")
     height: Optional[int] = Field(None, ge=200, le=2160, description="Hauteur custom viewport")
     delay: int = Field(0, ge=0, le=30, description="Delai avant capture (secondes)")
+    filmstrip: Optional[List[float]] = Field(
+        None,
+        max_length=10,
+        description="Offsets (secondes depuis la navigation, 0-30) des screenshots intermediaires"
+    )
     click: Optional[str] = Field(None, max_length=200, description="Selecteur CSS d'element a cliquer")
     hide: Optional[str] = Field(None, max_length=500, description="Selecteurs CSS d'elements a masquer")
     grab_html: bool = Field(False, description="Capturer le HTML source")
+    readiness: str = Field(
+        "fixed",
+        description="Attente avant capture: fixed (delai fixe) ou smart (stabilite visuelle, delay = plafond)"
+    )
+
+    include: Optional[List[str]] = Field(
+        None,
+        description="Etapes a executer: screenshot, dom, network, html (defaut: screenshot, dom, network)"
+    )
+    mode: str = Field(
+        "full",
+        description="full (rendu complet) ou analysis (reseau + DOM sans screenshot, images bloquees)"
+    )
 
     @field_validator('url')
     @classmethod
@@ -38,18 +64,118 @@ class CaptureRequest(BaseModel):
             raise ValueError("Device doit etre: desktop, tablet ou phone")
         return v
 
+    @field_validator('devices')
+    @classmethod
+    def validate_devices(cls, v: Optional[List[str]]) -> Optional[List[str]]:
+        """Valide la liste de devices (ordre conserve, sans doublons)."""
+        if v is None:
+            return None
+        devices = list(dict.fromkeys(device.lower() for device in v))
+        if not devices:
+            raise ValueError("Devices ne peut pas etre vide")
+        invalid = [device for device in devices if device not in ["desktop", "tablet", "phone"]]
+        if invalid:
+            raise ValueError(f"Devices inconnus: {', '.join(invalid)} (desktop, tablet, phone)")
+        return devices
+
+    @field_validator('filmstrip')
+    @classmethod
+    def validate_filmstrip(cls, v: Optional[List[float]]) -> Optional[List[float]]:
+        """Valide les offsets du filmstrip (tries, sans doublons)."""
+        if v is None:
+            return None
+        offsets = sorted(set(v))
+        if not offsets:
+            raise ValueError("Filmstrip ne peut pas etre vide")
+        if offsets[0] < 0 or offsets[-1] > 30:
+            raise ValueError("Offsets du filmstrip entre 0 et 30 secondes")
+        return offsets
+
+    @field_validator('full_page_mode')
+    @classmethod
+    def validate_full_page_mode(cls, v: str) -> str:
+        """Valide le mode full-page."""
+        v = v.lower()
+        if v not in ["single", "tiles", "stitched"]:
+            raise ValueError("Full page mode doit etre: single, tiles ou stitched")
+        return v
+
+    @field_validator('readiness')
+    @classmethod
+    def validate_readiness(cls, v: str) -> str:
+        """Valide le mode d'attente."""
+        v = v.lower()
+        if v not in ["fixed", "smart"]:
+            raise ValueError("Readiness doit etre: fixed ou smart")
+        return v
+
+    @field_validator('include')
+    @classmethod
+    def validate_include(cls, v: Optional[List[str]]) -> Optional[List[str]]:
+        """Valide les etapes demandees."""
+        if v is None:
+            return None
+        stages = sorted({stage.lower() for stage in v})
+        invalid = [stage for stage in stages if stage not in ["screenshot", "dom", "network", "html"]]
+        if invalid:
+            raise ValueError(f"Etapes inconnues: {', '.join(invalid)} (screenshot, dom, network, html)")
+        return stages
+
+    @field_validator('mode')
+    @classmethod
+    def validate_mode(cls, v: str) -> str:
+        """Valide le mode de capture."""
+        v = v.lower()
+        if v not in ["full", "analysis"]:
+            raise ValueError("Mode doit etre: full ou analysis")
+        return v
+
+    @model_validator(mode="after")
+    def validate_analysis_include(self) -> "CaptureRequest":
+        """Le mode analysis ne rend rien: un screenshot demande explicitement est refuse."""
+        if self.mode == "analysis" and self.include is not None and "screenshot" in self.include:
+            raise ValueError("Mode analysis incompatible avec l'etape screenshot (reseau + DOM seulement)")
+        return self
+
+    @model_validator(mode="after")
+    def validate_devices_screenshot(self) -> "CaptureRequest":
+        """Devices: un screenshot par viewport, impossible sans screenshot."""
+        if self.devices is None:
+            return self
+        if self.mode == "analysis":
+            raise ValueError("Devices incompatible avec le mode analysis (aucun screenshot)")
+        if self.include is not None and "screenshot" not in self.include:
+            raise ValueError("Devices necessite l'etape screenshot dans include")
+        return self
+
 
 class CaptureResponse(BaseModel):
     """Reponse de capture."""
 
     session_id: str
-    screenshot: str = Field(..., description="Screenshot encode en base64")
+    screenshot: Optional[str] = Field(None, description="Screenshot encode en base64 (absent si non demande)")
     screenshot_format: str = "png"
-    network_logs: list
-    dom_elements: dict
+    screenshot_tiles: Optional[list] = Field(None, description="Tuiles full-page (mode tiles)")
+    screenshot_hash: Optional[dict] = Field(None, description="Empreintes perceptuelles (phash, dhash)")
+    screenshot_viewports: Optional[list] = Field(
+        None,
+        description="Un element par device (devices): dimensions, hauteur de page, empreinte et screenshot "
+                    "(celui du premier device est le champ screenshot)"
+    )
+    filmstrip: Optional[list] = Field(
+        None,
+        description="Frames du filmstrip: offset_ms, url, phash, screenshot, unchanged_ms (frames identiques fusionnees)"
+    )
+    near_duplicate_of: Optional[dict] = Field(None, description="Capture indexee quasi identique (id, distance)")
+    network_logs: Optional[list] = None
+    dom_elements: Optional[dict] = None
     final_url: str
     capture_config: dict
     html_source: Optional[str] = None
+    timings: Optional[dict] = Field(
+        None,
+        description="Chronologie de la requete: total_ms et phases (phase, start_ms, duration_ms)"
+    )
 
 
 class HealthResponse(BaseModel):
@@ -0,0 +1,204 @@
+"""
+Echantillonnage systeme en arriere-plan.
+
+Une seule tache collecte periodiquement memoire/CPU de l'hote, RSS et CPU
+de l'arbre Chromium et retard de l'event loop dans un buffer circulaire.
+Health, stats et admission lisent le dernier echantillon en O(1) au lieu
+de refaire les syscalls (et les appels Redis) a chaque requete. Les autres
+etats couteux a lire (sessions globales dans Redis, stats des workers
+navigateur) sont rafraichis au meme rythme comme instantanes nommes.
+"""
+
+import asyncio
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional
+
+import psutil
+
+from api.config import settings, logger
+
+# Noms des processus Chromium lances par Playwright
+BROWSER_PROCESS_NAMES = ("chrome", "chromium", "headless_shell")
+
+
+class SystemMonitor:
+    """Echantillonneur systeme partage (buffer circulaire d'echantillons)."""
+
+    def __init__(self):
+        self.samples: Deque[Dict] = deque(maxlen=settings.MONITOR_HISTORY_SIZE)
+        self.cache_stats: Dict = {"enabled": False, "status": "not sampled"}
+        self.task: Optional[asyncio.Task] = None
+        self._listeners: List[Callable[[Dict], Awaitable[None]]] = []
+        # Instantanes nommes (hors buffer): nom -> derniere valeur de la source
+        self.snapshots: Dict[str, Any] = {}
+        self._sources: Dict[str, Callable[[], Awaitable[Any]]] = {}
+        # Processus suivis d'un echantillon a l'autre (cpu_percent est un delta)
+        self._browser_procs: Dict[int, psutil.Process] = {}
+        self._cache_sampled_at = 0.0
+
+    def subscribe(self, listener: Callable[[Dict], Awaitable[None]]):
+        """Appelle `listener(echantillon)` apres chaque echantillon."""
+        if listener not in self._listeners:
+            self._listeners.append(listener)
+
+    def unsubscribe(self, listener: Callable[[Dict], Awaitable[None]]):
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def track(self, name: str, source: Callable[[], Awaitable[Any]]):
+        """Rafraichit `snapshots[name] = await source()` a chaque echantillon."""
+        self._sources[name] = source
+
+    async def _refresh_snapshots(self):
+        names = list(self._sources)
+        values = await asyncio.gather(*(self._sources[name]() for name in names), return_exceptions=True)
+        for name, value in zip(names, values):
+            if isinstance(value, Exception):
+                logger.error(f"Erreur instantane monitoring ({name}): {value}")
+            else:
+                self.snapshots[name] = value
+
+    def _browser_tree(self) -> Dict:
+        """
+        RSS et CPU de l'arbre de processus Chromium.
+
+        Parcourt les descendants du processus courant (driver Playwright
+        inclus) et additionne les processus navigateur (browser, renderers...).
+        """
+        rss = 0
+        cpu = 0.0
+        seen = {}
+        try:
+            children = psutil.Process().children(recursive=True)
+        except psutil.Error:
+            children = []
+
+        for proc in children:
+            try:
+                name = proc.name().lower()
+                if not any(pattern in name for pattern in BROWSER_PROCESS_NAMES):
+                    continue
+                # Reutiliser l'objet Process: cpu_percent mesure depuis l'appel precedent
+                proc = self._browser_procs.get(proc.pid, proc)
+                rss += proc.memory_info().rss
+                cpu += proc.cpu_percent(interval=None)
+                seen[proc.pid] = proc
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                continue
+
+        self._browser_procs = seen
+        return {
+            "browser_rss_mb": round(rss / 1024 / 1024, 1),
+            "browser_cpu_percent": round(cpu, 1),
+            "browser_processes": len(seen),
+        }
+
+    def _collect(self) -> Dict:
+        """Mesures systeme (syscalls, appele hors de l'event loop)."""
+        mem = psutil.virtual_memory()
+        return {
+            "memory_percent": mem.percent,
+            "memory_used_mb": int(mem.used / 1024 / 1024),
+            "memory_total_mb": int(mem.total / 1024 / 1024),
+            "memory_available_mb": int(mem.available / 1024 / 1024),
+            "cpu_percent": psutil.cpu_percent(interval=None),
+            **self._browser_tree(),
+        }
+
+    async def sample(self, loop_lag_ms: float = 0.0) -> Dict:
+        """Prend un echantillon, l'ajoute au buffer et notifie les abonnes."""
+        snapshot = {"timestamp": time.time(), "loop_lag_ms": round(loop_lag_ms, 2)}
+        snapshot.update(await asyncio.to_thread(self._collect))
+        self.samples.append(snapshot)
+
+        # Stats du cache (Redis INFO + SCAN) a un rythme plus lent
+        if time.monotonic() - self._cache_sampled_at >= settings.MONITOR_CACHE_STATS_INTERVAL:
+            from api.cache import get_cache_stats
+            self._cache_sampled_at = time.monotonic()
+            self.cache_stats = await asyncio.to_thread(get_cache_stats)
+
+        await self._refresh_snapshots()
+
+        for listener in list(self._listeners):
+            try:
+                await listener(snapshot)
+            except Exception as e:
+                logger.error(f"Erreur abonne monitoring: {e}")
+        return snapshot
+
+    async def _loop(self):
+        interval = settings.MONITOR_SAMPLE_INTERVAL
+        logger.info(f"Demarrage monitoring systeme (intervalle: {interval}s, "
+                    f"historique: {settings.MONITOR_HISTORY_SIZE} echantillons)")
+        loop = asyncio.get_running_loop()
+        lag_ms = 0.0
+
+        while True:
+            try:
+                await self.sample(lag_ms)
+                # Retard de l'event loop: depassement du reveil programme
+                scheduled = loop.time() + interval
+                await asyncio.sleep(interval)
+                lag_ms = max(0.0, loop.time() - scheduled) * 1000
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Erreur echantillonnage systeme: {e}")
+                await asyncio.sleep(interval)
+
+    def start(self):
+        """Demarre l'echantillonnage (idempotent)."""
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._loop())
+            logger.info("[+] Monitoring systeme demarre")
+
+    async def stop(self):
+        """Arrete l'echantillonnage."""
+        if self.task and not self.task.done():
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            logger.info("[+] Monitoring systeme arrete")
+
+    def latest(self) -> Dict:
+        """
+        Dernier echantillon (O(1)).
+
+        Avant le premier echantillon (monitoring non demarre), mesure
+        directement pour que les appelants aient toujours des valeurs.
+        """
+        if self.samples:
+            return self.samples[-1]
+        return {"timestamp": time.time(), "loop_lag_ms": 0.0, **self._collect()}
+
+    def history(self, seconds: Optional[float] = None) -> List[Dict]:
+        """Echantillons des `seconds` dernieres secondes (tout le buffer par defaut)."""
+        if seconds is None:
+            return list(self.samples)
+        since = time.time() - seconds
+        return [sample for sample in self.samples if sample["timestamp"] >= since]
+
+    def get_stats(self, window_seconds: float = 60) -> Dict:
+        """Dernier echantillon et agregats sur une fenetre courte."""
+        window = self.history(window_seconds)
+        summary = {}
+        for key in ("memory_percent", "cpu_percent", "browser_rss_mb", "browser_cpu_percent", "loop_lag_ms"):
+            values = [sample[key] for sample in window]
+            if values:
+                summary[key] = {"avg": round(sum(values) / len(values), 2), "max": max(values)}
+
+        return {
+            "running": self.task is not None and not self.task.done(),
+            "sample_interval": settings.MONITOR_SAMPLE_INTERVAL,
+            "samples": len(self.samples),
+            "latest": self.samples[-1] if self.samples else None,
+            "window_seconds": window_seconds,
+            "window": summary,
+        }
+
+
+# Instance globale
+system_monitor = SystemMonitor()
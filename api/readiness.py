@@ -0,0 +1,145 @@
+"""Detection de stabilite visuelle d'une page (remplace les delais fixes)."""
+
+import asyncio
+import time
+from typing import Dict, Optional
+from playwright.async_api import Page
+
+from api.config import settings, logger
+
+# Injecte avant tout script de la page: date du dernier changement visuel
+# (mutation DOM ou layout shift)
+READINESS_INIT_SCRIPT = """
+(() => {
+    const state = { lastChange: performance.now() };
+    Object.defineProperty(window, '__shoturlReadiness', { value: state, enumerable: false });
+    const touch = () => { state.lastChange = performance.now(); };
+
+    const observe = () => {
+        new MutationObserver(touch).observe(document, {
+            childList: true, subtree: true, attributes: true, characterData: true
+        });
+    };
+    if (document.documentElement) {
+        observe();
+    } else {
+        document.addEventListener('readystatechange', observe, { once: true });
+    }
+
+    try {
+        new PerformanceObserver(touch).observe({ type: 'layout-shift', buffered: true });
+    } catch (e) {}
+})();
+"""
+
+# Etat courant cote page: calme DOM, polices et images chargees
+READINESS_CHECK_SCRIPT = """
+() => {
+    const state = window.__shoturlReadiness;
+    const domQuietMs = state ? performance.now() - state.lastChange : null;
+    const fontsReady = document.fonts ? document.fonts.status === 'loaded' : true;
+    const imagesReady = [...document.images].every(
+        img => img.complete || img.loading === 'lazy'
+    );
+    return { dom_quiet_ms: domQuietMs, fonts_ready: fontsReady, images_ready: imagesReady };
+}
+"""
+
+
+class ReadinessWaiter:
+    """
+    Attend qu'une page soit visuellement stable.
+
+    Conditions (toutes requises, sous un plafond dur):
+    - reseau: au plus READINESS_MAX_INFLIGHT requetes en vol pendant la fenetre
+    - DOM: aucune mutation ni layout shift pendant la fenetre
+    - ressources: polices et images chargees
+    """
+
+    def __init__(self, page: Page):
+        self.page = page
+        self.inflight = 0
+        self._network_busy_at = time.monotonic()
+
+    async def attach(self):
+        """Installe l'observateur (a appeler AVANT la navigation)."""
+        await self.page.add_init_script(script=READINESS_INIT_SCRIPT)
+        self.page.on("request", self._on_request)
+        self.page.on("requestfinished", self._on_request_done)
+        self.page.on("requestfailed", self._on_request_done)
+
+    def _on_request(self, request):
+        self.inflight += 1
+        if self.inflight > settings.READINESS_MAX_INFLIGHT:
+            self._network_busy_at = time.monotonic()
+
+    def _on_request_done(self, request):
+        self.inflight = max(0, self.inflight - 1)
+        if self.inflight >= settings.READINESS_MAX_INFLIGHT:
+            self._network_busy_at = time.monotonic()
+
+    async def wait(self, max_wait_ms: int) -> Dict:
+        """
+        Attend la stabilite de la page.
+
+        Args:
+            max_wait_ms: Plafond dur d'attente (millisecondes)
+
+        Returns:
+            Dict avec la condition declenchee ("stable" ou "timeout"),
+            le temps ecoule et l'instant ou chaque critere a ete atteint
+        """
+        window_s = settings.READINESS_QUIET_WINDOW_MS / 1000
+        poll_s = settings.READINESS_POLL_INTERVAL_MS / 1000
+        started = time.monotonic()
+        deadline = started + max_wait_ms / 1000
+
+        reached: Dict[str, Optional[int]] = {"network": None, "dom": None, "assets": None}
+        page_state: Dict = {}
+
+        def mark(check: str, ok: bool, now: float):
+            if not ok:
+                reached[check] = None
+            elif reached[check] is None:
+                reached[check] = int((now - started) * 1000)
+
+        while True:
+            now = time.monotonic()
+            network_quiet = (
+                self.inflight <= settings.READINESS_MAX_INFLIGHT
+                and now - self._network_busy_at >= window_s
+            )
+            mark("network", network_quiet, now)
+
+            # Evaluer la page seulement quand le reseau est calme (1 aller-retour)
+            if network_quiet:
+                try:
+                    page_state = await self.page.evaluate(READINESS_CHECK_SCRIPT)
+                except Exception as e:
+                    logger.debug(f"Verification stabilite impossible: {e}")
+                    page_state = {}
+
+                dom_quiet_ms = page_state.get("dom_quiet_ms")
+                now = time.monotonic()
+                mark("dom", dom_quiet_ms is None or dom_quiet_ms >= settings.READINESS_QUIET_WINDOW_MS, now)
+                mark("assets", page_state.get("fonts_ready", True) and page_state.get("images_ready", True), now)
+
+            if all(value is not None for value in reached.values()):
+                condition = "stable"
+                break
+
+            if now >= deadline:
+                condition = "timeout"
+                break
+
+            await asyncio.sleep(min(poll_s, max(0.0, deadline - now)))
+
+        result = {
+            "condition": condition,
+            "elapsed_ms": int((time.monotonic() - started) * 1000),
+            "max_wait_ms": max_wait_ms,
+            "reached_ms": reached,
+            "inflight_requests": self.inflight,
+        }
+        logger.debug(f"Stabilite page: {condition} apres {result['elapsed_ms']}ms")
+        return result
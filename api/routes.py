@@ -1,7 +1,12 @@
 """Routes API FastAPI pour ShotURL v3.0."""
 
-from fastapi import APIRouter, HTTPException, status, Request
-from fastapi.responses import JSONResponse
+import asyncio
+import json
+import secrets
+from typing import Dict, Optional, Tuple
+
+from fastapi import APIRouter, HTTPException, status, Request, Response, Query
+from fastapi.responses import JSONResponse, StreamingResponse
 from slowapi import Limiter
 from slowapi.util import get_remote_address
 
@@ -14,138 +19,292 @@ from api.security import (
     sanitize_selector,
     parse_device_dimensions
 )
-from api.capture import capturer
+from api.capture import capturer, STREAM_PARTS
 from api.session import session_manager
 from api.browser import browser_pool
+from api.admission import admission_controller, AdmissionClosed
 from api.config import settings, logger
-from api.cache import get_cached_capture, set_cached_capture, get_cache_stats
+from api.cache import get_cached_capture, set_cached_capture
+from api.similarity import similarity_index
+from api.worker import remote_capturer
+from api.work_queue import queued_capturer, work_queue_node
+from api.monitoring import system_monitor
+from api.shared_state import limiter_options
+from api.metrics import REQUESTS_BLOCKED_TOTAL, CaptureTimings, track_phase
 
 # Creer le router
 router = APIRouter()
 
 # Rate limiter
-limiter = Limiter(key_func=get_remote_address)
+limiter = Limiter(key_func=get_remote_address, **limiter_options())
 
+# Drain demande via /drain (tache gardee pour ne pas etre collectee)
+_drain_task: Optional[asyncio.Task] = None
 
-@router.post("/capture", response_model=CaptureResponse, tags=["Capture"])
-@limiter.limit("10/minute")
-async def capture_screenshot(request: Request, capture_req: CaptureRequest):
-    """
-    Capture complete d'un site web: screenshot + reseau + DOM.
+# Captures via la file distribuee si activee, sinon dans les workers
+# navigateur si configures, sinon dans ce process
+capture_backend = queued_capturer or remote_capturer or capturer
+
+
+async def _browser_stats() -> Dict:
+    """Statistiques du pool local ou agregees des workers navigateur."""
+    if remote_capturer:
+        return await remote_capturer.get_stats()
+    return await browser_pool.get_stats()
 
-    - **url**: URL du site a analyser
-    - **full_page**: Capture complete de la page (defaut: False)
-    - **device**: Type d'appareil (desktop, tablet, phone)
-    - **width/height**: Dimensions personnalisees (optionnel)
-    - **delay**: Delai avant capture en secondes (0-30)
-    - **click**: Selecteur CSS d'element a cliquer avant capture
-    - **hide**: Selecteurs CSS d'elements a masquer (separes par virgule)
-    - **grab_html**: Capturer le HTML source (defaut: False)
+
+def inflight_captures() -> int:
+    """Captures en cours sur ce noeud (locales et relayees aux workers navigateur)."""
+    count = admission_controller.active + admission_controller.analysis_active
+    if remote_capturer:
+        count += remote_capturer.active
+    return count
+
+
+async def drain_captures(timeout: float) -> bool:
+    """
+    Draine l'admission locale et les captures relayees aux workers navigateur.
 
     Returns:
-        Objet avec screenshot (base64), logs reseau, elements DOM
+        True si toutes les captures se sont terminees dans `timeout`
     """
-    session_id = None
+    drains = [admission_controller.drain(timeout)]
+    if remote_capturer:
+        drains.append(remote_capturer.drain(timeout))
+    return all(await asyncio.gather(*drains))
 
-    try:
-        # Verifier la limite de sessions concurrentes
-        active_sessions = len(session_manager.sessions)
-        if active_sessions >= settings.MAX_CONCURRENT_SESSIONS:
-            logger.warning(
-                f"Too many concurrent sessions: {active_sessions}/{settings.MAX_CONCURRENT_SESSIONS}"
-            )
-            raise HTTPException(
-                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-                detail=f"Too many concurrent requests ({active_sessions}). Please wait and try again."
-            )
 
-        # Creer une session
-        session_id = session_manager.create_session()
+async def _open_session() -> str:
+    """Cree une session ou refuse la requete si trop de sessions sont actives (ou en drain)."""
+    if admission_controller.draining:
+        REQUESTS_BLOCKED_TOTAL.inc("draining")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Service is shutting down. Please retry on another instance.",
+            headers={"Retry-After": "5"}
+        )
+
+    session_id = await session_manager.create_session()
+    if session_id is None:
+        logger.warning(f"Too many concurrent sessions (max {settings.MAX_CONCURRENT_SESSIONS})")
+        REQUESTS_BLOCKED_TOTAL.inc("session_limit")
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=f"Too many concurrent requests (max {settings.MAX_CONCURRENT_SESSIONS}). Please wait and try again."
+        )
+    return session_id
+
+
+def _prepare_capture(capture_req: CaptureRequest,
+                     timings: Optional[CaptureTimings] = None) -> Tuple[str, Dict, Dict]:
+    """
+    Valide une requete de capture.
+
+    Args:
+        capture_req: Requete de capture
+        timings: Chronologie de la requete (optionnel)
+
+    Returns:
+        Tuple (url normalisee, options pour capturer, options de cache)
 
+    Raises:
+        HTTPException: URL ou selecteurs invalides
+    """
+    with track_phase("url_probe", timings):
         # Extraire URL originale si SafeLink
         url = extract_safelink_url(capture_req.url)
 
         # Detecter le meilleur protocole (HTTP vs HTTPS)
         url = probe_url_scheme(url)
-        logger.debug(f"URL apres detection protocole: {url}")
+    logger.debug(f"URL apres detection protocole: {url}")
+
+    # Validation securite
+    with track_phase("url_validation", timings):
+        valid = is_valid_url(url)
+    if not valid:
+        logger.warning(f"URL invalide ou dangereuse: {url}")
+        REQUESTS_BLOCKED_TOTAL.inc("invalid_url")
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="URL invalide, dangereuse ou non autorisee (IP privee, domaine local, etc.)"
+        )
 
-        # Validation securite
-        if not is_valid_url(url):
-            logger.warning(f"URL invalide ou dangereuse: {url}")
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="URL invalide, dangereuse ou non autorisee (IP privee, domaine local, etc.)"
-            )
+    with track_phase("reachability", timings):
+        reachable = is_reachable(url)
+    if not reachable:
+        logger.warning(f"URL non accessible: {url}")
+        REQUESTS_BLOCKED_TOTAL.inc("unreachable")
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="URL non accessible (DNS echoue ou timeout)"
+        )
 
-        if not is_reachable(url):
-            logger.warning(f"URL non accessible: {url}")
+    # Valider dimensions
+    width, height = parse_device_dimensions(
+        device=capture_req.device,
+        width=capture_req.width,
+        height=capture_req.height
+    )
+
+    # Plusieurs devices: un seul chargement au viewport du premier
+    viewports = None
+    if capture_req.devices:
+        if capture_req.full_page and capture_req.full_page_mode != "single":
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
-                detail="URL non accessible (DNS echoue ou timeout)"
+                detail="devices n'est pas compatible avec full_page_mode tiles ou stitched"
             )
+        viewports = []
+        for device in capture_req.devices:
+            device_width, device_height = parse_device_dimensions(device=device, width=None, height=None)
+            viewports.append({"device": device, "width": device_width, "height": device_height})
+        width, height = viewports[0]["width"], viewports[0]["height"]
+
+    # Valider selecteurs
+    click_selector = sanitize_selector(capture_req.click) if capture_req.click else None
+    hide_selectors = capture_req.hide if capture_req.hide else None
+
+    if capture_req.hide:
+        # Valider chaque selecteur individuellement
+        for sel in capture_req.hide.split(','):
+            if not sanitize_selector(sel.strip()):
+                REQUESTS_BLOCKED_TOTAL.inc("invalid_selector")
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"Selecteur CSS invalide: {sel}"
+                )
+
+    capture_options = {
+        "full_page": capture_req.full_page,
+        "width": width,
+        "height": height,
+        "delay": capture_req.delay,
+        "click_selector": click_selector,
+        "hide_selectors": hide_selectors,
+        "grab_html": capture_req.grab_html,
+        "readiness": capture_req.readiness,
+        "include": capture_req.include,
+        "full_page_mode": capture_req.full_page_mode,
+        "mode": capture_req.mode,
+        "viewports": viewports,
+        "filmstrip": capture_req.filmstrip,
+    }
+
+    cache_options = {
+        "device": capture_req.device,
+        "devices": capture_req.devices,
+        "filmstrip": capture_req.filmstrip,
+        "full_page": capture_req.full_page,
+        "full_page_mode": capture_req.full_page_mode,
+        "delay": capture_req.delay,
+        "grab_html": capture_req.grab_html,
+        "readiness": capture_req.readiness,
+        "include": capture_req.include,
+        "mode": capture_req.mode,
+    }
+
+    return url, capture_options, cache_options
+
+
+def _index_screenshot(session_id: str, url: str, data: Dict):
+    """Indexe l'empreinte du screenshot et signale un quasi-doublon."""
+    fingerprint = data.get("screenshot_hash")
+    if not fingerprint:
+        return
+
+    duplicate = similarity_index.add(session_id, fingerprint["phash"], url)
+    if duplicate:
+        duplicate_id, distance = duplicate
+        data["near_duplicate_of"] = {"id": duplicate_id, "distance": distance}
+        logger.info(f"[SIMILAR] {url} quasi identique a {duplicate_id[:8]}... (distance {distance})")
+
+
+def _with_timings(response: Response, result: Dict, timings: CaptureTimings) -> Dict:
+    """Joint la chronologie au resultat et a l'en-tete Server-Timing."""
+    response.headers["Server-Timing"] = timings.server_timing()
+    # Copie: la chronologie ne doit pas se retrouver dans le cache
+    return {**result, "timings": timings.to_dict()}
+
+
+def _ndjson_line(part: str, data: Dict) -> bytes:
+    """Serialise une partie de capture en ligne NDJSON."""
+    return (json.dumps({"part": part, **data}) + "\n").encode()
 
-        # Valider dimensions
-        width, height = parse_device_dimensions(
-            device=capture_req.device,
-            width=capture_req.width,
-            height=capture_req.height
-        )
 
-        # Valider selecteurs
-        click_selector = sanitize_selector(capture_req.click) if capture_req.click else None
-        hide_selectors = capture_req.hide if capture_req.hide else None
+@router.post("/capture", response_model=CaptureResponse, tags=["Capture"])
+@limiter.limit("10/minute")
+async def capture_screenshot(request: Request, response: Response, capture_req: CaptureRequest):
+    """
+    Capture complete d'un site web: screenshot + reseau + DOM.
 
-        if capture_req.hide:
-            # Valider chaque selecteur individuellement
-            for sel in capture_req.hide.split(','):
-                if not sanitize_selector(sel.strip()):
-                    raise HTTPException(
-                        status_code=status.HTTP_400_BAD_REQUEST,
-                        detail=f"Selecteur CSS invalide: {sel}"
-                    )
+    - **url**: URL du site a analyser
+    - **full_page**: Capture complete de la page (defaut: False)
+    - **full_page_mode**: single, tiles ou stitched (tuiles de viewport, memoire bornee)
+    - **device**: Type d'appareil (desktop, tablet, phone)
+    - **devices**: Plusieurs appareils pour un seul chargement (un screenshot par viewport)
+    - **width/height**: Dimensions personnalisees (optionnel)
+    - **delay**: Delai avant capture en secondes (0-30)
+    - **filmstrip**: Offsets (secondes) de screenshots intermediaires pendant le meme chargement
+    - **click**: Selecteur CSS d'element a cliquer avant capture
+    - **hide**: Selecteurs CSS d'elements a masquer (separes par virgule)
+    - **grab_html**: Capturer le HTML source (defaut: False)
+    - **readiness**: fixed (delai fixe) ou smart (attente de stabilite, delay = plafond)
+    - **include**: Etapes a executer (screenshot, dom, network, html), toutes par defaut sauf html
+    - **mode**: full ou analysis (reseau + DOM sans rendu, images/media/fonts bloques, viewport reduit)
+
+    Returns:
+        Objet avec screenshot (base64), logs reseau, elements DOM et
+        chronologie des phases (timings, repris dans l'en-tete Server-Timing)
+    """
+    session_id = None
+    timings = CaptureTimings()
+
+    try:
+        with track_phase("session", timings):
+            # Creer une session (limite de sessions concurrentes, commune aux replicas)
+            session_id = await _open_session()
+
+        # Validation (URL, dimensions, selecteurs)
+        url, capture_options, cache_options = _prepare_capture(capture_req, timings)
 
         # Log de la requete
         logger.info(f"[TARGET] Capture demandee: {url} (session: {session_id[:8]}...)")
 
         # Verifier le cache Redis (si active)
-        cache_options = {
-            "device": capture_req.device,
-            "full_page": capture_req.full_page,
-            "delay": capture_req.delay,
-            "grab_html": capture_req.grab_html,
-        }
-
-        cached_result = await get_cached_capture(url, cache_options)
+        cached_result = await get_cached_capture(url, cache_options, timings)
         if cached_result:
             logger.info(f"[CACHE HIT] Serving cached capture for {url}")
             await session_manager.cleanup_session(session_id)
-            return cached_result
+            return _with_timings(response, cached_result, timings)
 
         # Capture
-        result = await capturer.capture_all(
-            url=url,
-            full_page=capture_req.full_page,
-            width=width,
-            height=height,
-            delay=capture_req.delay,
-            click_selector=click_selector,
-            hide_selectors=hide_selectors,
-            grab_html=capture_req.grab_html
-        )
+        result = await capture_backend.capture_all(url=url, timings=timings, session_id=session_id, **capture_options)
 
         # Ajouter le session_id
         result["session_id"] = session_id
 
+        # Indexer l'empreinte du screenshot (recherche de similarite)
+        with track_phase("index", timings):
+            _index_screenshot(session_id, url, result)
+
         # Mettre en cache si active
-        await set_cached_capture(url, cache_options, result)
+        await set_cached_capture(url, cache_options, result, timings)
 
         logger.info(f"[OK] Capture reussie: {url} (session: {session_id[:8]}...)")
 
-        return result
+        return _with_timings(response, result, timings)
 
     except HTTPException:
         raise
 
+    except AdmissionClosed as e:
+        REQUESTS_BLOCKED_TOTAL.inc("draining")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e),
+            headers={"Retry-After": "5"}
+        )
+
     except Exception as e:
         logger.error(f"[ERROR] Erreur capture: {e}", exc_info=True)
         raise HTTPException(
@@ -159,6 +318,197 @@ async def capture_screenshot(request: Request, capture_req: CaptureRequest):
             await session_manager.cleanup_session(session_id)
 
 
+@router.post("/capture/stream", tags=["Capture"])
+@limiter.limit("10/minute")
+async def capture_screenshot_stream(request: Request, capture_req: CaptureRequest):
+    """
+    Capture en flux NDJSON: une ligne JSON par etape, envoyee des qu'elle est prete.
+
+    Memes parametres que /capture. Lignes produites, dans l'ordre:
+    session, network (logs + final_url), dom, screenshot, html (optionnel),
+    config, puis done (avec la chronologie des phases). En cas d'echec en cours de capture: une ligne error.
+    Le resultat n'est pas mis en cache (jamais assemble en memoire).
+
+    Returns:
+        Flux application/x-ndjson
+    """
+    timings = CaptureTimings()
+    with track_phase("session", timings):
+        session_id = await _open_session()
+
+    try:
+        url, capture_options, cache_options = _prepare_capture(capture_req, timings)
+        logger.info(f"[TARGET] Capture (flux) demandee: {url} (session: {session_id[:8]}...)")
+        cached_result = await get_cached_capture(url, cache_options, timings)
+    except BaseException:
+        await session_manager.cleanup_session(session_id)
+        raise
+
+    async def stream():
+        try:
+            yield _ndjson_line("session", {"session_id": session_id})
+
+            if cached_result:
+                logger.info(f"[CACHE HIT] Serving cached capture for {url}")
+                for part, keys in STREAM_PARTS.items():
+                    data = {key: cached_result[key] for key in keys if key in cached_result}
+                    if data:
+                        yield _ndjson_line(part, data)
+            else:
+                async for part, data in capture_backend.capture_stream(url, timings=timings, session_id=session_id, **capture_options):
+                    if part == "screenshot":
+                        with track_phase("index", timings):
+                            _index_screenshot(session_id, url, data)
+                    yield _ndjson_line(part, data)
+
+            yield _ndjson_line("done", {"timings": timings.to_dict()})
+            logger.info(f"[OK] Capture (flux) reussie: {url} (session: {session_id[:8]}...)")
+
+        except Exception as e:
+            logger.error(f"[ERROR] Erreur capture (flux): {e}", exc_info=True)
+            yield _ndjson_line("error", {"detail": f"Erreur lors de la capture: {str(e)}"})
+
+        finally:
+            await session_manager.cleanup_session(session_id)
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
+@router.get("/captures/similar", tags=["Capture"])
+@limiter.limit("60/minute")
+async def find_similar_captures(
+    request: Request,
+    capture_id: str = Query(..., alias="id", description="session_id d'une capture indexee"),
+    radius: Optional[int] = Query(None, ge=0, le=64, description="Distance de Hamming maximale"),
+    limit: int = Query(20, ge=1, le=200)
+):
+    """
+    Cherche les captures visuellement proches d'une capture indexee (pHash).
+
+    Returns:
+        Empreinte de reference et captures a distance <= radius
+    """
+    entry = similarity_index.get(capture_id)
+    if not entry:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Capture {capture_id} non indexee"
+        )
+
+    radius = settings.SIMILARITY_DEFAULT_RADIUS if radius is None else radius
+    # +1: la capture elle-meme fait partie des resultats
+    matches = similarity_index.search(entry["hash"], radius, limit=limit + 1)
+
+    return {
+        "id": capture_id,
+        "url": entry["url"],
+        "phash": f"{entry['hash']:016x}",
+        "radius": radius,
+        "matches": [match for match in matches if match["id"] != capture_id][:limit],
+    }
+
+
+@router.get("/live", tags=["Admin"])
+async def liveness():
+    """Liveness: le process repond (aucune dependance verifiee, pas de rate limit)."""
+    return {"status": "alive"}
+
+
+@router.get("/ready", tags=["Admin"])
+async def readiness():
+    """
+    Readiness: l'instance peut recevoir du trafic.
+
+    Fausse pendant le drain, si le navigateur n'est pas lance (aucun worker
+    navigateur joignable en mode workers) ou si plus de READINESS_MAX_WAITING
+    captures attendent une admission. En mode workers, l'attente est celle
+    des workers (dernier echantillon du monitoring).
+    Pas de rate limit (sonde du load balancer).
+    """
+    reasons = []
+    waiting = admission_controller.waiting
+    if admission_controller.draining:
+        reasons.append("draining")
+
+    if remote_capturer:
+        pool = system_monitor.snapshots.get("browser_pool")
+        if pool is not None:
+            workers = [worker for worker in pool["workers"] if worker.get("reachable")]
+            waiting += sum(worker["admission"]["waiting_captures"] for worker in workers)
+            if not workers:
+                reasons.append("no browser worker reachable")
+            elif all(worker["admission"]["draining"] for worker in workers):
+                reasons.append("browser workers draining")
+    elif browser_pool.browser is None:
+        reasons.append("browser not running")
+
+    if waiting > settings.READINESS_MAX_WAITING:
+        reasons.append(f"saturated ({waiting} waiting > {settings.READINESS_MAX_WAITING})")
+
+    body = {
+        "ready": not reasons,
+        "reasons": reasons,
+        "active_captures": inflight_captures(),
+        "waiting_captures": waiting,
+    }
+    if reasons:
+        return JSONResponse(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, content=body)
+    return body
+
+
+def _require_admin(request: Request):
+    """
+    Reserve un endpoint d'admin: jeton X-Admin-Token si ADMIN_TOKEN est
+    defini, sinon clients locaux uniquement.
+    """
+    if settings.ADMIN_TOKEN:
+        token = request.headers.get("X-Admin-Token", "")
+        if secrets.compare_digest(token.encode(), settings.ADMIN_TOKEN.encode()):
+            return
+    elif request.client and request.client.host in ("127.0.0.1", "::1"):
+        return
+    raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
+
+
+@router.post("/drain", tags=["Admin"])
+@limiter.limit("5/minute")
+async def start_drain(request: Request):
+    """
+    Demarre le drain (hook preStop d'un deploiement progressif).
+
+    Readiness devient fausse, les nouvelles captures sont refusees (503) et
+    les captures en cours se terminent; l'arret du process attend ensuite
+    au plus DRAIN_TIMEOUT. Reserve a l'admin (voir _require_admin),
+    annulable via /undrain.
+    """
+    _require_admin(request)
+    global _drain_task
+    if _drain_task is None:
+        logger.info("[DRAIN] Drain demande")
+        _drain_task = asyncio.create_task(drain_captures(settings.DRAIN_TIMEOUT))
+    return {
+        "draining": True,
+        "active_captures": inflight_captures(),
+        "drain_timeout": settings.DRAIN_TIMEOUT
+    }
+
+
+@router.post("/undrain", tags=["Admin"])
+@limiter.limit("5/minute")
+async def stop_drain(request: Request):
+    """Annule un drain demande via /drain: le replica redevient pret."""
+    _require_admin(request)
+    global _drain_task
+    if _drain_task is not None:
+        logger.info("[DRAIN] Drain annule")
+        _drain_task.cancel()
+        _drain_task = None
+    await admission_controller.undrain()
+    if remote_capturer:
+        remote_capturer.undrain()
+    return {"draining": False, "active_captures": inflight_captures()}
+
+
 @router.get("/health", response_model=HealthResponse, tags=["Admin"])
 @limiter.limit("30/minute")
 async def health_check(request: Request):
@@ -172,9 +522,10 @@ async def health_check(request: Request):
     - Statistiques du pool de navigateurs
     """
     try:
+        # Instantanes du monitoring: ni Redis ni aller-retour worker par sonde
         stats = session_manager.get_stats()
-        browser_stats = await browser_pool.get_stats()
-        cache_stats = get_cache_stats()
+        browser_stats = system_monitor.snapshots.get("browser_pool") or await _browser_stats()
+        cache_stats = system_monitor.cache_stats
 
         response = {
             "status": "healthy",
@@ -273,15 +624,20 @@ async def get_stats(request: Request):
     """
     try:
         session_stats = session_manager.get_stats()
-        browser_stats = await browser_pool.get_stats()
+        browser_stats = await _browser_stats()
 
         return {
             "sessions": session_stats,
             "browser_pool": browser_stats,
+            "admission": admission_controller.get_stats(),
+            "similarity": similarity_index.get_stats(),
+            "work_queue": work_queue_node.get_stats() if work_queue_node else None,
+            "system": system_monitor.get_stats(),
             "config": {
                 "max_concurrent_browsers": settings.MAX_CONCURRENT_BROWSERS,
                 "max_concurrent_sessions": settings.MAX_CONCURRENT_SESSIONS,
                 "max_memory_mb": settings.MAX_MEMORY_MB,
+                "memory_admission_enabled": settings.MEMORY_ADMISSION_ENABLED,
                 "browser_timeout": settings.BROWSER_TIMEOUT,
                 "cleanup_interval": settings.CLEANUP_INTERVAL
             }
@@ -293,3 +649,21 @@ async def get_stats(request: Request):
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=str(e)
         )
+
+
+@router.get("/stats/history", tags=["Admin"])
+@limiter.limit("20/minute")
+async def get_stats_history(
+    request: Request,
+    seconds: float = Query(60, gt=0, le=3600, description="Fenetre d'historique (secondes)")
+):
+    """
+    Historique court des echantillons systeme (memoire, CPU, RSS Chromium,
+    retard de l'event loop), limite a la taille du buffer circulaire.
+    """
+    samples = system_monitor.history(seconds)
+    return {
+        "sample_interval": settings.MONITOR_SAMPLE_INTERVAL,
+        "count": len(samples),
+        "samples": samples
+    }
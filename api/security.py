@@ -53,9 +53,10 @@ def is_valid_url(url: str) -> bool:
         # Verifier si c'est une IP
         try:
             ip = ipaddress.ip_address(host)
-            # Bloquer les IPs privees/locales/reservees
-            if (ip.is_private or ip.is_loopback or ip.is_reserved or
-                ip.is_multicast or ip.is_link_local):
+            # Bloquer les IPs privees/locales/reservees (sauf ALLOW_LOCAL_URLS,
+            # seule verification levee: domaines et mots-cles restent bloques)
+            if not settings.ALLOW_LOCAL_URLS and (ip.is_private or ip.is_loopback or ip.is_reserved or
+                                                  ip.is_multicast or ip.is_link_local):
                 logger.warning(f"IP non-publique bloquee: {ip}")
                 return False
             return True
@@ -1,38 +1,89 @@
 """Gestion des sessions utilisateur avec cleanup automatique."""
 
 import asyncio
+import heapq
 import time
 import uuid
-import psutil
-from typing import Dict, Optional
-from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
 
 from api.config import settings, logger
+from api.shared_state import ConcurrencySlots
+from api.monitoring import system_monitor
 
 
 class SessionManager:
-    """Gere les sessions utilisateur et leur cleanup automatique."""
+    """
+    Gere les sessions utilisateur et leur cleanup automatique.
+
+    Une session possede le contexte et la page de sa capture (ou, pour une
+    capture relayee a un worker navigateur, la connexion vers ce worker):
+    arret, expiration et cleanup force ferment reellement ces ressources.
+    L'expiration vient d'un tas (expires_at, session_id): les entrees
+    perimees (activite plus recente) sont ignorees au moment du pop.
+    """
 
     def __init__(self):
         self.sessions: Dict[str, Dict] = {}
+        # Limite MAX_CONCURRENT_SESSIONS commune a toutes les replicas
+        self.slots = ConcurrencySlots("sessions", settings.SESSION_TIMEOUT)
         self.cleanup_task: Optional[asyncio.Task] = None
         self._lock = asyncio.Lock()
+        self._expiry_heap: List[Tuple[float, str]] = []
+        self._wakeup = asyncio.Event()
+
+    def _schedule_expiry(self, session_id: str, session: Dict):
+        """Repousse l'expiration d'une session (nouvelle entree dans le tas)."""
+        session["expires_at"] = session["last_activity"] + settings.SESSION_TIMEOUT
+        if len(self._expiry_heap) > 2 * len(self.sessions) + 64:
+            # Trop d'entrees perimees (sessions terminees): reconstruire le tas
+            self._expiry_heap = [(s["expires_at"], sid) for sid, s in self.sessions.items() if sid != session_id]
+            heapq.heapify(self._expiry_heap)
+        earliest = self._expiry_heap[0][0] if self._expiry_heap else None
+        heapq.heappush(self._expiry_heap, (session["expires_at"], session_id))
+        if earliest is None or session["expires_at"] < earliest:
+            # Nouvelle echeance la plus proche: reveiller la boucle
+            self._wakeup.set()
+
+    async def _close_resources(self, session_id: str, session: Dict):
+        """Ferme la page et libere le contexte detenus par la session."""
+        from api.browser import browser_pool
+
+        connection = session.pop("connection", None)
+        if connection is not None:
+            # Le worker annule la capture (et ferme sa page) a la fermeture
+            connection.close()
+        page, context = session.pop("page", None), session.pop("context", None)
+        if page is not None:
+            try:
+                await page.close()
+            except Exception as e:
+                logger.warning(f"Erreur fermeture page (session {session_id[:8]}...): {e}")
+        if context is not None:
+            await browser_pool.release_context(context, reusable=False)
 
-    def create_session(self) -> str:
+    async def create_session(self) -> Optional[str]:
         """
-        Cree une nouvelle session.
+        Cree une nouvelle session si la limite de sessions le permet.
 
         Returns:
-            session_id (UUID)
+            session_id (UUID) ou None si MAX_CONCURRENT_SESSIONS est atteint
         """
         session_id = str(uuid.uuid4())
 
+        if not await self.slots.acquire(session_id, settings.MAX_CONCURRENT_SESSIONS):
+            return None
+
+        now = time.time()
         self.sessions[session_id] = {
-            "created_at": time.time(),
-            "last_activity": time.time(),
+            "created_at": now,
+            "last_activity": now,
             "status": "active",
-            "requests": []
+            "requests": [],
+            "context": None,
+            "page": None,
+            "connection": None
         }
+        self._schedule_expiry(session_id, self.sessions[session_id])
 
         logger.debug(f"Session creee: {session_id}")
         return session_id
@@ -43,13 +94,43 @@ class SessionManager:
             if session_id in self.sessions:
                 self.sessions[session_id]["requests"].append(request_info)
                 self.sessions[session_id]["last_activity"] = time.time()
+                self._schedule_expiry(session_id, self.sessions[session_id])
+
+    def attach(self, session_id: Optional[str], context=None, page=None, connection=None):
+        """
+        Confie le contexte et/ou la page d'une capture a sa session, ou la
+        connexion (StreamWriter) d'une capture relayee a un worker navigateur.
+
+        Sans effet si la session est inconnue de ce process (ex: dans le
+        worker navigateur lui-meme).
+        """
+        session = self.sessions.get(session_id) if session_id else None
+        if session is None:
+            return
+        if context is not None:
+            session["context"] = context
+        if page is not None:
+            session["page"] = page
+        if connection is not None:
+            session["connection"] = connection
+
+    def detach(self, session_id: Optional[str]):
+        """Reprend les ressources d'une session (la capture les ferme elle-meme)."""
+        session = self.sessions.get(session_id) if session_id else None
+        if session is not None:
+            session["context"] = None
+            session["page"] = None
+            session["connection"] = None
 
     async def cleanup_session(self, session_id: str):
-        """Nettoie une session specifique."""
+        """Nettoie une session specifique (ferme ses ressources navigateur)."""
         async with self._lock:
-            if session_id in self.sessions:
-                del self.sessions[session_id]
-                logger.debug(f"Session nettoyee: {session_id}")
+            session = self.sessions.pop(session_id, None)
+        await self.slots.release(session_id)
+
+        if session is not None:
+            await self._close_resources(session_id, session)
+            logger.debug(f"Session nettoyee: {session_id}")
 
     async def get_session(self, session_id: str) -> Optional[Dict]:
         """Recupere une session."""
@@ -63,75 +144,108 @@ class SessionManager:
                 "last_activity": s["last_activity"],
                 "age_seconds": int(time.time() - s["created_at"]),
                 "status": s["status"],
-                "request_count": len(s["requests"])
+                "request_count": len(s["requests"]),
+                "has_context": s["context"] is not None or s["connection"] is not None
             }
             for sid, s in self.sessions.items()
         }
 
-    async def _cleanup_loop(self):
-        """Boucle de cleanup automatique."""
-        logger.info(f"Demarrage cleanup automatique (intervalle: {settings.CLEANUP_INTERVAL}s)")
-
-        while True:
-            try:
-                await asyncio.sleep(settings.CLEANUP_INTERVAL)
-
-                now = time.time()
-                to_remove = []
+    async def _expire_due(self) -> int:
+        """Retire les sessions echues du haut du tas; retourne leur nombre."""
+        now = time.time()
+        expired = []
 
-                async with self._lock:
-                    for session_id, session in self.sessions.items():
-                        age = now - session["last_activity"]
+        async with self._lock:
+            while self._expiry_heap and self._expiry_heap[0][0] <= now:
+                expires_at, session_id = heapq.heappop(self._expiry_heap)
+                session = self.sessions.get(session_id)
+                # Entree perimee: session terminee ou activite plus recente
+                if session is None or session["expires_at"] != expires_at:
+                    continue
+                del self.sessions[session_id]
+                expired.append((session_id, session))
 
-                        # Supprimer les sessions expirees
-                        if age > settings.SESSION_TIMEOUT:
-                            to_remove.append(session_id)
-                            logger.info(f"Session expiree: {session_id} (inactivite: {int(age)}s)")
+        for session_id, session in expired:
+            await self.slots.release(session_id)
+            logger.info(f"Session expiree: {session_id} (inactivite: {int(now - session['last_activity'])}s)")
+            await self._close_resources(session_id, session)
+        return len(expired)
 
-                    for session_id in to_remove:
-                        del self.sessions[session_id]
+    async def _cleanup_loop(self):
+        """
+        Boucle de cleanup: dort jusqu'a la prochaine expiration (ou un reveil
+        par une echeance plus proche), le controle memoire gardant au plus
+        CLEANUP_INTERVAL entre deux passages.
+        """
+        logger.info(f"Demarrage cleanup automatique (controle memoire: {settings.CLEANUP_INTERVAL}s)")
+        next_memory_check = time.monotonic()
 
-                # Monitoring memoire
-                mem = psutil.virtual_memory()
-                if mem.percent > 85:
+        while True:
+            try:
+                timeout = max(0.0, next_memory_check - time.monotonic())
+                if self._expiry_heap:
+                    timeout = min(timeout, max(0.0, self._expiry_heap[0][0] - time.time()))
+
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+                    continue  # Echeance plus proche ajoutee: recalculer l'attente
+                except asyncio.TimeoutError:
+                    pass
+
+                await self._expire_due()
+
+                if time.monotonic() < next_memory_check:
+                    continue
+                next_memory_check = time.monotonic() + settings.CLEANUP_INTERVAL
+
+                # Monitoring memoire (dernier echantillon systeme)
+                mem = system_monitor.latest()
+                if mem["memory_percent"] > 85:
                     logger.warning(
-                        f"[WARNING]  Memoire critique: {mem.percent}% "
-                        f"({mem.used / 1024 / 1024:.0f}MB / {mem.total / 1024 / 1024:.0f}MB)"
+                        f"[WARNING]  Memoire critique: {mem['memory_percent']}% "
+                        f"({mem['memory_used_mb']}MB / {mem['memory_total_mb']}MB)"
                     )
 
                     # Force cleanup des plus vieilles sessions si critique
-                    if mem.percent > 90:
+                    if mem["memory_percent"] > 90:
                         await self._force_cleanup(keep_count=2)
 
                 # Log periodique
                 if len(self.sessions) > 0:
                     logger.debug(
                         f"Cleanup: {len(self.sessions)} sessions actives, "
-                        f"RAM: {mem.percent}% ({mem.used / 1024 / 1024:.0f}MB)"
+                        f"RAM: {mem['memory_percent']}% ({mem['memory_used_mb']}MB)"
                     )
 
+            except asyncio.CancelledError:
+                raise
             except Exception as e:
                 logger.error(f"Erreur dans cleanup loop: {e}")
+                await asyncio.sleep(1)
 
     async def _force_cleanup(self, keep_count: int = 2):
-        """Force le cleanup des plus vieilles sessions en cas de RAM critique."""
+        """
+        Force le cleanup des plus vieilles sessions en cas de RAM critique.
+
+        Les contextes des sessions retirees sont fermes: la memoire du
+        renderer est reellement rendue.
+        """
         logger.warning(f"Force cleanup - Conservation de {keep_count} sessions max")
 
         async with self._lock:
-            # Trier par derniere activite
-            sorted_sessions = sorted(
-                self.sessions.items(),
-                key=lambda x: x[1]["last_activity"],
-                reverse=True
-            )
+            # Les N plus recentes sont gardees
+            to_keep = set(heapq.nlargest(keep_count, self.sessions, key=lambda sid: self.sessions[sid]["last_activity"]))
+            removed = [(sid, session) for sid, session in self.sessions.items() if sid not in to_keep]
 
-            # Garder seulement les N plus recentes
-            to_keep = {sid: data for sid, data in sorted_sessions[:keep_count]}
-            removed_count = len(self.sessions) - len(to_keep)
+            for session_id, _ in removed:
+                del self.sessions[session_id]
 
-            self.sessions = to_keep
+        for session_id, session in removed:
+            await self.slots.release(session_id)
+            await self._close_resources(session_id, session)
 
-            logger.warning(f"[+] Force cleanup termine: {removed_count} sessions supprimees")
+        logger.warning(f"[+] Force cleanup termine: {len(removed)} sessions supprimees")
 
     def start_cleanup(self):
         """Demarre la tache de cleanup automatique."""
@@ -150,16 +264,24 @@ class SessionManager:
             logger.info("[+] Cleanup automatique arrete")
 
     def get_stats(self) -> Dict:
-        """Retourne les statistiques."""
-        mem = psutil.virtual_memory()
+        """
+        Retourne les statistiques (memoire et sessions globales: derniers
+        echantillons du monitoring, decompte local avant le premier).
+        """
+        mem = system_monitor.latest()
 
         return {
             "active_sessions": len(self.sessions),
+            "sessions_with_context": sum(
+                1 for s in self.sessions.values() if s["context"] is not None or s["connection"] is not None
+            ),
+            "global_active_sessions": system_monitor.snapshots.get("global_sessions", len(self.slots.local)),
             "max_sessions": settings.MAX_CONCURRENT_SESSIONS,
-            "memory_percent": mem.percent,
-            "memory_used_mb": int(mem.used / 1024 / 1024),
-            "memory_total_mb": int(mem.total / 1024 / 1024),
-            "memory_available_mb": int(mem.available / 1024 / 1024)
+            "shared_state": self.slots.backend,
+            "memory_percent": mem["memory_percent"],
+            "memory_used_mb": mem["memory_used_mb"],
+            "memory_total_mb": mem["memory_total_mb"],
+            "memory_available_mb": mem["memory_available_mb"]
         }
 
 
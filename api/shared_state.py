@@ -0,0 +1,144 @@
+"""Etat partage entre replicas: stockage des rate limits et places de concurrence."""
+
+import time
+from typing import Dict
+
+from api.config import settings, logger
+
+# Import conditionnel de Redis (SHARED_STATE_BACKEND=redis)
+# Client asyncio: les places sont prises sur le chemin des requetes, un
+# Redis lent ne doit pas bloquer l'event loop. La connexion est etablie au
+# premier appel; tant que Redis est absent les operations retombent en local.
+redis_client = None
+if settings.SHARED_STATE_BACKEND == "redis":
+    try:
+        import redis.asyncio as aioredis
+        redis_client = aioredis.Redis(
+            host=settings.REDIS_HOST,
+            port=settings.REDIS_PORT,
+            db=settings.REDIS_DB,
+            socket_connect_timeout=1,
+            socket_timeout=1
+        )
+        logger.info(f"[+] Etat partage Redis: {settings.REDIS_HOST}:{settings.REDIS_PORT}")
+    except ImportError:
+        logger.warning("[!] SHARED_STATE_BACKEND=redis mais module redis absent: etat local")
+        redis_client = None
+
+# Prise d'une place: purge des baux expires puis ajout si sous la limite (atomique)
+ACQUIRE_SCRIPT = """
+local now = tonumber(ARGV[1])
+local lease = tonumber(ARGV[2])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now - lease)
+if redis.call('ZCARD', KEYS[1]) >= tonumber(ARGV[3]) then
+    return 0
+end
+redis.call('ZADD', KEYS[1], now, ARGV[4])
+redis.call('EXPIRE', KEYS[1], math.ceil(lease))
+return 1
+"""
+
+
+def limiter_options() -> Dict:
+    """
+    Options de stockage pour slowapi.Limiter.
+
+    Avec Redis, les compteurs de rate limit sont communs a toutes les
+    replicas; si Redis tombe, slowapi bascule sur un stockage memoire local.
+    """
+    if redis_client is None:
+        return {}
+    return {
+        "storage_uri": f"redis://{settings.REDIS_HOST}:{settings.REDIS_PORT}/{settings.REDIS_DB}",
+        "in_memory_fallback_enabled": True,
+        "key_prefix": "shoturl",
+    }
+
+
+class ConcurrencySlots:
+    """
+    Places de concurrence communes aux replicas (ex: sessions actives).
+
+    Chaque place est un membre d'un sorted set Redis avec un bail: une replica
+    qui meurt sans liberer ses places les perd apres `lease_seconds`. Sans
+    Redis (ou pendant une panne), le decompte est local a la replica.
+    """
+
+    def __init__(self, name: str, lease_seconds: float):
+        self.key = f"shoturl:slots:{name}"
+        self.lease_seconds = lease_seconds
+        self.local: Dict[str, float] = {}
+        self._acquire_script = redis_client.register_script(ACQUIRE_SCRIPT) if redis_client else None
+        self._degraded = False
+
+    def _redis_failed(self, error: Exception):
+        if not self._degraded:
+            logger.warning(f"[!] Redis indisponible ({self.key}): decompte local - {error}")
+        self._degraded = True
+
+    def _redis_ok(self):
+        if self._degraded:
+            logger.info(f"[+] Redis de nouveau disponible ({self.key})")
+        self._degraded = False
+
+    async def acquire(self, member: str, limit: int) -> bool:
+        """
+        Prend une place si moins de `limit` sont occupees.
+
+        Args:
+            member: Identifiant unique de la place (ex: session_id)
+            limit: Nombre maximal de places
+
+        Returns:
+            True si la place est obtenue
+        """
+        now = time.time()
+
+        if self._acquire_script is not None:
+            try:
+                granted = bool(await self._acquire_script(keys=[self.key], args=[now, self.lease_seconds, limit, member]))
+                self._redis_ok()
+                if granted:
+                    self.local[member] = now
+                return granted
+            except Exception as e:
+                self._redis_failed(e)
+
+        if len(self.local) >= limit:
+            return False
+        self.local[member] = now
+        return True
+
+    async def release(self, member: str):
+        """Libere une place."""
+        if self.local.pop(member, None) is None:
+            return
+
+        if redis_client is not None:
+            try:
+                await redis_client.zrem(self.key, member)
+                self._redis_ok()
+            except Exception as e:
+                self._redis_failed(e)
+
+    async def count(self) -> int:
+        """Nombre de places occupees (toutes replicas si Redis est disponible)."""
+        if redis_client is not None:
+            try:
+                count = await redis_client.zcount(self.key, time.time() - self.lease_seconds, "+inf")
+                self._redis_ok()
+                return count
+            except Exception as e:
+                self._redis_failed(e)
+        return len(self.local)
+
+    @property
+    def backend(self) -> str:
+        return "redis" if redis_client is not None and not self._degraded else "local"
+
+    async def get_stats(self) -> Dict:
+        return {
+            "backend": self.backend,
+            "local": len(self.local),
+            "global": await self.count(),
+        }
@@ -0,0 +1,241 @@
+"""Empreintes perceptuelles des screenshots et index de similarite."""
+
+import io
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from api.config import settings, logger
+
+# Import conditionnel de NumPy + Pillow (calcul des empreintes)
+try:
+    import numpy as np
+    from PIL import Image
+    HASHING_AVAILABLE = True
+except ImportError:
+    HASHING_AVAILABLE = False
+
+if settings.SIMILARITY_ENABLED and not HASHING_AVAILABLE:
+    logger.warning("[!] SIMILARITY_ENABLED mais numpy/Pillow absents: empreintes desactivees")
+
+_DCT_SIZE = 32
+_HASH_SIZE = 8
+_dct_matrix = None
+
+
+def _grayscale(png: bytes, width: int, height: int) -> "np.ndarray":
+    """Decode un PNG et le reduit en niveaux de gris."""
+    with Image.open(io.BytesIO(png)) as image:
+        small = image.convert("L").resize((width, height), Image.Resampling.BILINEAR)
+    return np.asarray(small, dtype=np.float32)
+
+
+def _pack_bits(bits: "np.ndarray") -> int:
+    """Convertit une matrice booleenne 8x8 en entier 64 bits."""
+    return int.from_bytes(np.packbits(bits.flatten()).tobytes(), "big")
+
+
+def compute_phash(png: bytes) -> int:
+    """
+    pHash: signe des basses frequences de la DCT 2D (32x32 -> 8x8).
+
+    Args:
+        png: Screenshot PNG
+
+    Returns:
+        Empreinte 64 bits
+    """
+    global _dct_matrix
+
+    if _dct_matrix is None:
+        n = np.arange(_DCT_SIZE)
+        _dct_matrix = np.cos(np.pi * (2 * n[None, :] + 1) * n[:, None] / (2 * _DCT_SIZE)).astype(np.float32)
+
+    pixels = _grayscale(png, _DCT_SIZE, _DCT_SIZE)
+    dct = _dct_matrix @ pixels @ _dct_matrix.T
+    low = dct[:_HASH_SIZE, :_HASH_SIZE]
+    # Mediane sans la composante continue (luminosite moyenne)
+    median = np.median(low.flatten()[1:])
+    return _pack_bits(low > median)
+
+
+def compute_dhash(png: bytes) -> int:
+    """
+    dHash: gradient horizontal sur une image 9x8.
+
+    Args:
+        png: Screenshot PNG
+
+    Returns:
+        Empreinte 64 bits
+    """
+    pixels = _grayscale(png, _HASH_SIZE + 1, _HASH_SIZE)
+    return _pack_bits(pixels[:, 1:] > pixels[:, :-1])
+
+
+def hamming(a: int, b: int) -> int:
+    """Distance de Hamming entre deux empreintes."""
+    return (a ^ b).bit_count()
+
+
+def screenshot_fingerprint(png: bytes) -> Optional[Dict[str, str]]:
+    """
+    Calcule les empreintes d'un screenshot (a appeler hors event loop).
+
+    Returns:
+        Dict {"phash", "dhash"} en hexadecimal ou None si desactive/impossible
+    """
+    if not (settings.SIMILARITY_ENABLED and HASHING_AVAILABLE):
+        return None
+
+    try:
+        return {
+            "phash": f"{compute_phash(png):016x}",
+            "dhash": f"{compute_dhash(png):016x}",
+        }
+    except Exception as e:
+        logger.warning(f"[!] Erreur calcul empreinte: {e}")
+        return None
+
+
+class _BKNode:
+    """Noeud de BK-tree: une empreinte et ses enfants indexes par distance."""
+
+    __slots__ = ("hash", "ids", "children")
+
+    def __init__(self, hash_value: int):
+        self.hash = hash_value
+        self.ids: List[str] = []
+        self.children: Dict[int, "_BKNode"] = {}
+
+
+class SimilarityIndex:
+    """
+    Index en memoire des empreintes (BK-tree sur la distance de Hamming).
+
+    Les captures identiques partagent un noeud. Les plus anciennes sont
+    evincees au-dela de SIMILARITY_MAX_ENTRIES (suppression logique, arbre
+    reconstruit quand la moitie des entrees est obsolete).
+    """
+
+    def __init__(self):
+        self.entries: "OrderedDict[str, Dict]" = OrderedDict()
+        self.root: Optional[_BKNode] = None
+        self._stale = 0
+
+    def add(self, capture_id: str, phash_hex: str, url: str) -> Optional[Tuple[str, int]]:
+        """
+        Indexe une capture.
+
+        Args:
+            capture_id: Identifiant (session_id de la capture)
+            phash_hex: Empreinte pHash hexadecimale
+            url: URL capturee
+
+        Returns:
+            (id, distance) du plus proche quasi-doublon deja indexe, ou None
+        """
+        hash_value = int(phash_hex, 16)
+
+        duplicate = None
+        matches = self.search(hash_value, settings.SIMILARITY_DUPLICATE_RADIUS, limit=1)
+        if matches:
+            duplicate = (matches[0]["id"], matches[0]["distance"])
+
+        self.entries[capture_id] = {
+            "hash": hash_value,
+            "url": url,
+            "captured_at": time.time(),
+        }
+        self._insert(hash_value, capture_id)
+
+        while len(self.entries) > settings.SIMILARITY_MAX_ENTRIES:
+            self.entries.popitem(last=False)
+            self._stale += 1
+
+        if self._stale > len(self.entries):
+            self._rebuild()
+
+        return duplicate
+
+    def _insert(self, hash_value: int, capture_id: str):
+        if self.root is None:
+            self.root = _BKNode(hash_value)
+            self.root.ids.append(capture_id)
+            return
+
+        node = self.root
+        while True:
+            distance = hamming(hash_value, node.hash)
+            if distance == 0:
+                node.ids.append(capture_id)
+                return
+            child = node.children.get(distance)
+            if child is None:
+                child = _BKNode(hash_value)
+                child.ids.append(capture_id)
+                node.children[distance] = child
+                return
+            node = child
+
+    def _rebuild(self):
+        """Reconstruit l'arbre sans les entrees evincees."""
+        self.root = None
+        self._stale = 0
+        for capture_id, entry in self.entries.items():
+            self._insert(entry["hash"], capture_id)
+
+    def get(self, capture_id: str) -> Optional[Dict]:
+        """Retourne l'entree d'une capture indexee."""
+        return self.entries.get(capture_id)
+
+    def search(self, hash_value: int, radius: int, limit: int = 50) -> List[Dict]:
+        """
+        Cherche les captures a distance de Hamming <= radius.
+
+        Args:
+            hash_value: Empreinte pHash
+            radius: Distance maximale (0-64)
+            limit: Nombre maximal de resultats
+
+        Returns:
+            Liste triee par distance de {id, url, distance, captured_at}
+        """
+        if self.root is None:
+            return []
+
+        matches = []
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            distance = hamming(hash_value, node.hash)
+            if distance <= radius:
+                for capture_id in node.ids:
+                    entry = self.entries.get(capture_id)
+                    # Ignorer les entrees evincees (suppression logique)
+                    if entry is not None and entry["hash"] == node.hash:
+                        matches.append({
+                            "id": capture_id,
+                            "url": entry["url"],
+                            "distance": distance,
+                            "captured_at": entry["captured_at"],
+                        })
+            # Inegalite triangulaire: seuls ces enfants peuvent correspondre
+            for child_distance, child in node.children.items():
+                if distance - radius <= child_distance <= distance + radius:
+                    stack.append(child)
+
+        matches.sort(key=lambda match: match["distance"])
+        return matches[:limit]
+
+    def get_stats(self) -> Dict:
+        """Retourne les statistiques de l'index."""
+        return {
+            "enabled": settings.SIMILARITY_ENABLED and HASHING_AVAILABLE,
+            "entries": len(self.entries),
+            "max_entries": settings.SIMILARITY_MAX_ENTRIES,
+        }
+
+
+# Instance globale
+similarity_index = SimilarityIndex()
@@ -0,0 +1,333 @@
+"""
+Cache disque partage des sous-ressources statiques (scripts, CSS, images).
+
+Les contextes sont ephemeres: sans ce cache, les bibliotheques communes
+(jQuery, bundles CDN, Bootstrap) sont retelechargees a chaque capture.
+Les reponses sont servies par interception (route.fulfill), uniquement si
+elles sont publiques et fraiches selon Cache-Control; rien de ce qui porte
+un etat (cookies, Authorization, Set-Cookie) n'est stocke ni rejoue.
+
+Le repertoire peut etre partage entre process (ecriture atomique): une
+entree absente de l'index local est relue sur disque, et l'index est
+resynchronise avec le repertoire toutes les _RESCAN_INTERVAL secondes
+pour que la taille (eviction LRU) soit bornee pour le repertoire entier,
+avec au plus _RESCAN_INTERVAL secondes d'ecritures des autres process en
+depassement.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import tempfile
+import time
+from collections import OrderedDict
+from email.utils import parsedate_to_datetime
+from typing import Dict, List, Optional
+
+from api.config import settings, logger
+from api.metrics import SUBRESOURCE_CACHE_TOTAL
+
+# Types de ressources mis en cache (fonts et media sont bloques par le pool)
+CACHEABLE_TYPES = ("script", "stylesheet", "image")
+
+# En-tetes jamais rejoues (etat, ou invalides pour un corps deja decode)
+_DROPPED_HEADERS = {"set-cookie", "content-encoding", "content-length", "transfer-encoding", "connection"}
+
+# Resynchronisation de l'index avec le repertoire partage (secondes)
+_RESCAN_INTERVAL = 60
+
+
+def freshness_lifetime(headers: Dict[str, str]) -> Optional[float]:
+    """
+    Duree de fraicheur d'une reponse pour un cache partage (secondes).
+
+    Returns:
+        None si la reponse ne doit pas etre mise en cache
+    """
+    directives = {}
+    for part in headers.get("cache-control", "").lower().split(","):
+        name, _, value = part.strip().partition("=")
+        if name:
+            directives[name] = value.strip('"')
+
+    if {"no-store", "no-cache", "private"} & directives.keys():
+        return None
+
+    lifetime = None
+    for name in ("s-maxage", "max-age"):
+        if name in directives:
+            try:
+                lifetime = float(directives[name])
+            except ValueError:
+                return None
+            break
+
+    if lifetime is None and "expires" in headers:
+        try:
+            expires = parsedate_to_datetime(headers["expires"]).timestamp()
+            date = parsedate_to_datetime(headers["date"]).timestamp() if "date" in headers else time.time()
+            lifetime = expires - date
+        except (TypeError, ValueError):
+            return None
+
+    if lifetime is None:
+        return None
+
+    try:
+        lifetime -= float(headers.get("age", 0))
+    except ValueError:
+        pass
+    return lifetime if lifetime > 0 else None
+
+
+class SubresourceCache:
+    """Cache disque borne (LRU) des sous-ressources publiques."""
+
+    def __init__(self, directory: str, max_bytes: int, max_entry_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        # cle -> (taille, expiration), ordre = usage le plus ancien d'abord
+        self.index: "OrderedDict[str, tuple]" = OrderedDict()
+        self.total_bytes = 0
+        self._scanned_at = 0.0
+        os.makedirs(directory, exist_ok=True)
+        self._load_index()
+
+    def _path(self, key: str, suffix: str) -> str:
+        return os.path.join(self.directory, f"{key}.{suffix}")
+
+    def _scan(self) -> List[tuple]:
+        """Entrees sur disque (stored_at, cle, taille, expiration), plus anciennes d'abord."""
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.directory, name)) as f:
+                    meta = json.load(f)
+                entries.append((meta["stored_at"], name[:-5], meta["size"], meta["expires_at"]))
+            except (OSError, ValueError, KeyError):
+                continue
+        return sorted(entries)
+
+    def _rebuild(self, entries: List[tuple]):
+        """
+        Remplace l'index par le contenu du disque.
+
+        Les entrees deja connues gardent leur ordre LRU local, apres celles
+        ecrites par d'autres process (jamais utilisees ici).
+        """
+        on_disk = {key: (size, expires_at) for _, key, size, expires_at in entries}
+        index = OrderedDict((key, on_disk[key]) for key in on_disk if key not in self.index)
+        for key in self.index:
+            if key in on_disk:
+                index[key] = on_disk[key]
+        self.index = index
+        self.total_bytes = sum(size for size, _ in index.values())
+        self._scanned_at = time.time()
+
+    def _load_index(self):
+        """Reprend les entrees deja sur disque (redemarrage, autre process)."""
+        entries = self._scan()
+        self._rebuild(entries)
+        if entries:
+            logger.info(f"[+] Cache sous-ressources: {len(entries)} entrees ({self.total_bytes / 1024 / 1024:.1f}MB)")
+
+    @staticmethod
+    def key(url: str) -> str:
+        return hashlib.sha256(url.encode()).hexdigest()
+
+    async def _rescan(self):
+        """Resynchronise l'index avec le repertoire partage (lecture en thread)."""
+        self._rebuild(await asyncio.to_thread(self._scan))
+
+    def _read(self, key: str) -> Optional[tuple]:
+        try:
+            with open(self._path(key, "json")) as f:
+                meta = json.load(f)
+            with open(self._path(key, "body"), "rb") as f:
+                body = f.read()
+            return meta, body
+        except (OSError, ValueError):
+            return None
+
+    def _write(self, key: str, meta: Dict, body: bytes):
+        # Ecriture atomique: un lecteur concurrent voit l'ancienne ou la nouvelle entree.
+        # Fichier temporaire unique: deux manques simultanes sur la meme URL
+        # (meme process ou non) ne partagent jamais le meme fichier
+        for suffix, data, mode in (("body", body, "wb"), ("json", json.dumps(meta), "w")):
+            fd, tmp = tempfile.mkstemp(dir=self.directory, prefix=f"{key}.{suffix}.", suffix=".tmp")
+            try:
+                with os.fdopen(fd, mode) as f:
+                    f.write(data)
+                os.replace(tmp, self._path(key, suffix))
+            except BaseException:
+                try:
+                    os.unlink(tmp)
+                except OSError:
+                    pass
+                raise
+
+    def _unlink(self, keys: List[str]):
+        """Supprime les fichiers d'entrees retirees (a appeler hors event loop)."""
+        for key in keys:
+            for suffix in ("json", "body"):
+                try:
+                    os.unlink(self._path(key, suffix))
+                except OSError:
+                    pass
+
+    async def _remove(self, keys: List[str]):
+        """Retire des entrees de l'index puis leurs fichiers (thread)."""
+        for key in keys:
+            size, _ = self.index.pop(key, (0, 0))
+            self.total_bytes -= size
+        if keys:
+            await asyncio.to_thread(self._unlink, keys)
+
+    async def _evict(self):
+        """Retire les entrees les moins recemment utilisees jusqu'a 90% du budget."""
+        target = self.max_bytes * 0.9
+        evicted = []
+        total = self.total_bytes
+        for key, (size, _) in self.index.items():
+            if total <= target:
+                break
+            evicted.append(key)
+            total -= size
+        await self._remove(evicted)
+
+    async def lookup(self, url: str) -> Optional[tuple]:
+        """Retourne (meta, corps) si une entree fraiche existe."""
+        key = self.key(url)
+        entry = self.index.get(key)
+        if entry is not None and entry[1] <= time.time():
+            await self._remove([key])
+            return None
+
+        stored = await asyncio.to_thread(self._read, key)
+        if stored is None:
+            if entry is not None:
+                # Evincee par un autre process
+                await self._remove([key])
+            return None
+
+        meta, body = stored
+        if entry is None:
+            # Ecrite par un autre process depuis le dernier scan
+            if meta.get("expires_at", 0) <= time.time():
+                return None
+            self.index[key] = (len(body), meta["expires_at"])
+            self.total_bytes += len(body)
+        self.index.move_to_end(key)
+        return stored
+
+    async def store(self, url: str, status: int, headers: Dict[str, str], body: bytes) -> bool:
+        """Stocke une reponse si elle est publique, fraiche et de taille raisonnable."""
+        if status != 200 or len(body) > self.max_entry_bytes or "set-cookie" in headers:
+            return False
+        # Vary autre que Accept-Encoding: variantes non distinguees par la cle
+        vary = {value.strip().lower() for value in headers.get("vary", "").split(",") if value.strip()}
+        if vary - {"accept-encoding"}:
+            return False
+        lifetime = freshness_lifetime(headers)
+        if lifetime is None:
+            return False
+
+        key = self.key(url)
+        now = time.time()
+        meta = {
+            "url": url,
+            "status": status,
+            "headers": {name: value for name, value in headers.items() if name not in _DROPPED_HEADERS},
+            "stored_at": now,
+            "expires_at": now + lifetime,
+            "size": len(body),
+        }
+        try:
+            await asyncio.to_thread(self._write, key, meta, body)
+        except OSError as e:
+            logger.warning(f"[!] Ecriture cache sous-ressources impossible: {e}")
+            return False
+
+        if key in self.index:
+            self.total_bytes -= self.index[key][0]
+        self.index[key] = (len(body), meta["expires_at"])
+        self.index.move_to_end(key)
+        self.total_bytes += len(body)
+        if now - self._scanned_at > _RESCAN_INTERVAL:
+            # Ecritures des autres process: budget du repertoire entier
+            await self._rescan()
+        if self.total_bytes > self.max_bytes:
+            await self._evict()
+        return True
+
+    async def handle(self, route, stats: Dict):
+        """
+        Sert une requete interceptee depuis le cache, ou la telecharge et la stocke.
+
+        Args:
+            route: Route Playwright (GET d'un type CACHEABLE_TYPES)
+            stats: Compteurs de la capture en cours (hits, misses, stored, bytes_saved)
+        """
+        request = route.request
+        request_headers = await request.all_headers()
+        if "cookie" in request_headers or "authorization" in request_headers:
+            # Requete porteuse d'etat: jamais servie ni stockee
+            SUBRESOURCE_CACHE_TOTAL.inc("bypass")
+            await route.continue_()
+            return
+
+        cached = await self.lookup(request.url)
+        if cached is not None:
+            meta, body = cached
+            stats["hits"] += 1
+            stats["bytes_saved"] += len(body)
+            SUBRESOURCE_CACHE_TOTAL.inc("hit")
+            await route.fulfill(status=meta["status"], headers=meta["headers"], body=body)
+            return
+
+        stats["misses"] += 1
+        SUBRESOURCE_CACHE_TOTAL.inc("miss")
+        try:
+            # Redirections rendues au navigateur: chaque saut reste visible
+            # dans le journal reseau et repasse par le cache sous sa propre URL
+            response = await route.fetch(max_redirects=0)
+        except Exception:
+            # Erreur reseau: laisser le navigateur la produire lui-meme
+            await route.continue_()
+            return
+        await route.fulfill(response=response)
+        if response.url != request.url:
+            return
+
+        try:
+            body = await response.body()
+            if await self.store(request.url, response.status, await response.all_headers(), body):
+                stats["stored"] += 1
+                SUBRESOURCE_CACHE_TOTAL.inc("stored")
+        except Exception as e:
+            logger.debug(f"Sous-ressource non mise en cache ({request.url}): {e}")
+
+    def get_stats(self) -> Dict:
+        return {
+            "entries": len(self.index),
+            "size_mb": round(self.total_bytes / 1024 / 1024, 1),
+            "max_size_mb": round(self.max_bytes / 1024 / 1024, 1),
+            "directory": self.directory,
+        }
+
+
+# Instance globale (None si desactive)
+subresource_cache: Optional[SubresourceCache] = None
+if settings.SUBRESOURCE_CACHE_ENABLED:
+    try:
+        subresource_cache = SubresourceCache(
+            settings.SUBRESOURCE_CACHE_DIR,
+            settings.SUBRESOURCE_CACHE_MAX_MB * 1024 * 1024,
+            settings.SUBRESOURCE_CACHE_MAX_ENTRY_MB * 1024 * 1024
+        )
+    except OSError as e:
+        logger.warning(f"[!] Cache sous-ressources desactive ({settings.SUBRESOURCE_CACHE_DIR}): {e}")
@@ -0,0 +1,124 @@
+"""Capture full-page par tuiles (memoire bornee) et assemblage hors process."""
+
+import asyncio
+import io
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+from playwright.async_api import Page
+
+from api.config import settings, logger
+
+# Import conditionnel de Pillow (assemblage des tuiles)
+try:
+    from PIL import Image
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+# Pool de process pour l'assemblage: une image geante ne pese pas sur l'API
+_stitch_executor: Optional[ProcessPoolExecutor] = None
+
+
+async def capture_tiles(page: Page, width: int, height: int) -> Dict:
+    """
+    Capture la page par tranches de la hauteur du viewport.
+
+    Chaque tranche est un screenshot du viewport apres defilement: Chromium
+    ne rend jamais plus qu'un viewport a la fois, meme pour une page de
+    50 000px. La hauteur totale est plafonnee a FULLPAGE_MAX_HEIGHT.
+
+    Args:
+        page: Page Playwright chargee
+        width: Largeur du viewport
+        height: Hauteur du viewport
+
+    Returns:
+        Dict avec tiles (liste de {y, height, png}), page_height, truncated
+    """
+    page_height = await page.evaluate(
+        "() => Math.max(document.documentElement.scrollHeight, document.body ? document.body.scrollHeight : 0)"
+    )
+    total_height = min(page_height, settings.FULLPAGE_MAX_HEIGHT)
+
+    tiles = []
+    y = 0
+    while y < total_height:
+        tile_height = min(height, total_height - y)
+
+        # Le navigateur borne le defilement: lire la position reelle
+        scroll_y = await page.evaluate("(y) => { window.scrollTo(0, y); return window.scrollY; }", y)
+        offset = y - scroll_y
+
+        png = await page.screenshot(
+            type="png",
+            clip={"x": 0, "y": offset, "width": width, "height": tile_height}
+        )
+        tiles.append({"y": y, "height": tile_height, "png": png})
+        y += tile_height
+
+    # Revenir en haut pour les etapes suivantes
+    await page.evaluate("() => window.scrollTo(0, 0)")
+
+    if page_height > total_height:
+        logger.warning(f"Page tronquee a {total_height}px (hauteur reelle: {page_height}px)")
+
+    return {
+        "tiles": tiles,
+        "page_height": page_height,
+        "captured_height": total_height,
+        "truncated": page_height > total_height,
+    }
+
+
+def _stitch_png(tiles: List[bytes], width: int, total_height: int) -> bytes:
+    """Assemble les tuiles PNG verticalement (execute dans un process dedie)."""
+    canvas = Image.new("RGB", (width, total_height), "white")
+    y = 0
+    for tile in tiles:
+        with Image.open(io.BytesIO(tile)) as image:
+            canvas.paste(image, (0, y))
+            y += image.height
+
+    output = io.BytesIO()
+    canvas.save(output, format="PNG")
+    return output.getvalue()
+
+
+async def stitch_tiles(tiles: List[Dict], width: int, total_height: int) -> Optional[bytes]:
+    """
+    Assemble les tuiles en une image dans un process separe.
+
+    Args:
+        tiles: Tuiles retournees par capture_tiles
+        width: Largeur des tuiles
+        total_height: Hauteur totale capturee
+
+    Returns:
+        PNG assemble ou None si Pillow n'est pas installe
+    """
+    global _stitch_executor
+
+    if not PIL_AVAILABLE:
+        logger.warning("[!] Pillow non installe: tuiles retournees sans assemblage")
+        return None
+
+    if _stitch_executor is None:
+        _stitch_executor = ProcessPoolExecutor(max_workers=settings.FULLPAGE_STITCH_WORKERS)
+
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _stitch_executor,
+        _stitch_png,
+        [tile["png"] for tile in tiles],
+        width,
+        total_height
+    )
+
+
+def shutdown_stitch_pool():
+    """Arrete le pool de process d'assemblage."""
+    global _stitch_executor
+
+    if _stitch_executor is not None:
+        _stitch_executor.shutdown(wait=False, cancel_futures=True)
+        _stitch_executor = None
@@ -0,0 +1,481 @@
+"""
+File de captures distribuee entre noeuds (mode pull).
+
+Les noeuds API publient les jobs dans une file partagee; chaque noeud tire
+un job des qu'il a de la capacite (admission), le capture, puis publie le
+resultat pour le noeud qui l'a soumis.
+
+Backends:
+- redis: stream + consumer group. Un job non acquitte et sans heartbeat
+  depuis WORK_QUEUE_VISIBILITY_TIMEOUT (noeud mort) est repris par un autre
+  noeud (XAUTOCLAIM), jusqu'a WORK_QUEUE_MAX_ATTEMPTS livraisons.
+- local: meme semantique dans le process (tests, noeud unique).
+"""
+
+import asyncio
+import json
+import os
+import socket
+import time
+import uuid
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from api.config import settings, logger
+from api.capture import Capturer, STREAM_PARTS
+from api.metrics import CaptureTimings, observe_phase
+
+STREAM_KEY = "shoturl:jobs"
+GROUP_NAME = "capturers"
+ATTEMPTS_KEY = "shoturl:jobs:attempts"
+RESULT_KEY = "shoturl:jobs:result:{}"
+
+
+class LocalWorkQueue:
+    """File en memoire avec timeout de visibilite (stand-in de Redis)."""
+
+    def __init__(self):
+        self.pending: asyncio.Queue = asyncio.Queue()
+        self.inflight: Dict[str, Tuple[Dict, float]] = {}
+        self.attempts: Dict[str, int] = {}
+        self.results: Dict[str, asyncio.Future] = {}
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    async def submit(self, job: Dict):
+        self.results[job["id"]] = asyncio.get_running_loop().create_future()
+        await self.pending.put(job)
+
+    async def wait_result(self, job_id: str, timeout: float) -> Optional[Dict]:
+        future = self.results.get(job_id)
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), timeout=timeout)
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            if future.done():
+                self.results.pop(job_id, None)
+
+    async def fetch(self, consumer: str, block_ms: int) -> Optional[Dict]:
+        getter = asyncio.ensure_future(self.pending.get())
+        try:
+            await asyncio.wait({getter}, timeout=block_ms / 1000)
+        except BaseException:
+            # Annule pendant l'attente: ne pas perdre un job deja retire
+            if getter.done() and not getter.cancelled():
+                self.pending.put_nowait(getter.result())
+            raise
+        finally:
+            if not getter.done():
+                getter.cancel()
+        if not getter.done() or getter.cancelled():
+            return None
+        job = getter.result()
+        self.attempts[job["id"]] = self.attempts.get(job["id"], 0) + 1
+        job["attempt"] = self.attempts[job["id"]]
+        self.inflight[job["id"]] = (job, time.monotonic() + settings.WORK_QUEUE_VISIBILITY_TIMEOUT)
+        return job
+
+    async def heartbeat(self, job: Dict, consumer: str):
+        if job["id"] in self.inflight:
+            self.inflight[job["id"]] = (job, time.monotonic() + settings.WORK_QUEUE_VISIBILITY_TIMEOUT)
+
+    async def complete(self, job: Dict, outcome: Dict):
+        self.inflight.pop(job["id"], None)
+        self.attempts.pop(job["id"], None)
+        future = self.results.get(job["id"])
+        if future and not future.done():
+            future.set_result(outcome)
+
+    async def release(self, job: Dict):
+        """Rend un job non traite (noeud en drain) sans compter de tentative."""
+        self.inflight.pop(job["id"], None)
+        self.attempts[job["id"]] = self.attempts.get(job["id"], 1) - 1
+        await self.pending.put(job)
+
+    async def reclaim(self, consumer: str, count: int = 1) -> List[Dict]:
+        """Remet en file les jobs dont le timeout de visibilite est depasse."""
+        now = time.monotonic()
+        expired = [job for job, deadline in self.inflight.values() if deadline <= now]
+        for job in expired:
+            del self.inflight[job["id"]]
+            await self.pending.put(job)
+        return []
+
+    def get_stats(self) -> Dict:
+        return {"backend": "local", "pending": self.pending.qsize(), "inflight": len(self.inflight)}
+
+
+class RedisWorkQueue:
+    """File partagee sur un stream Redis (consumer group)."""
+
+    def __init__(self):
+        import redis.asyncio as aioredis
+
+        self.client = aioredis.Redis(
+            host=settings.REDIS_HOST,
+            port=settings.REDIS_PORT,
+            db=settings.REDIS_DB,
+            decode_responses=True,
+            socket_connect_timeout=2
+        )
+        self._claim_cursor = "0-0"
+
+    async def start(self):
+        from redis.exceptions import ResponseError
+        try:
+            await self.client.xgroup_create(STREAM_KEY, GROUP_NAME, id="0", mkstream=True)
+        except ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    async def stop(self):
+        await self.client.aclose()
+
+    async def submit(self, job: Dict):
+        await self.client.xadd(STREAM_KEY, {"job": json.dumps(job)})
+
+    async def wait_result(self, job_id: str, timeout: float) -> Optional[Dict]:
+        reply = await self.client.blpop([RESULT_KEY.format(job_id)], timeout=max(1, int(timeout)))
+        return json.loads(reply[1]) if reply else None
+
+    def _decode(self, message_id: str, fields: Dict) -> Dict:
+        job = json.loads(fields["job"])
+        job["message_id"] = message_id
+        return job
+
+    async def _count_attempt(self, job: Dict) -> Dict:
+        job["attempt"] = await self.client.hincrby(ATTEMPTS_KEY, job["id"], 1)
+        return job
+
+    async def fetch(self, consumer: str, block_ms: int) -> Optional[Dict]:
+        reply = await self.client.xreadgroup(GROUP_NAME, consumer, {STREAM_KEY: ">"}, count=1, block=block_ms)
+        if not reply:
+            return None
+        message_id, fields = reply[0][1][0]
+        return await self._count_attempt(self._decode(message_id, fields))
+
+    async def heartbeat(self, job: Dict, consumer: str):
+        # Reclamer son propre message remet son temps d'inactivite a zero
+        await self.client.xclaim(STREAM_KEY, GROUP_NAME, consumer, 0, [job["message_id"]], justid=True)
+
+    async def complete(self, job: Dict, outcome: Dict):
+        result_key = RESULT_KEY.format(job["id"])
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.rpush(result_key, json.dumps(outcome))
+            pipe.expire(result_key, settings.WORK_QUEUE_RESULT_TIMEOUT)
+            pipe.xack(STREAM_KEY, GROUP_NAME, job["message_id"])
+            pipe.xdel(STREAM_KEY, job["message_id"])
+            pipe.hdel(ATTEMPTS_KEY, job["id"])
+            await pipe.execute()
+
+    async def release(self, job: Dict):
+        """Rend un job non traite (noeud en drain): republie, sans compter de tentative."""
+        payload = {key: value for key, value in job.items() if key not in ("message_id", "attempt")}
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.xadd(STREAM_KEY, {"job": json.dumps(payload)})
+            pipe.xack(STREAM_KEY, GROUP_NAME, job["message_id"])
+            pipe.xdel(STREAM_KEY, job["message_id"])
+            pipe.hincrby(ATTEMPTS_KEY, job["id"], -1)
+            await pipe.execute()
+
+    async def reclaim(self, consumer: str, count: int = 1) -> List[Dict]:
+        """
+        Reprend les jobs d'un noeud silencieux depuis le timeout de visibilite.
+
+        Un job repris doit demarrer aussitot (heartbeat): l'appelant n'en
+        reclame pas plus qu'il n'a de places reservees.
+        """
+        reply = await self.client.xautoclaim(
+            STREAM_KEY, GROUP_NAME, consumer,
+            min_idle_time=settings.WORK_QUEUE_VISIBILITY_TIMEOUT * 1000,
+            start_id=self._claim_cursor,
+            count=count
+        )
+        self._claim_cursor = reply[0]
+        jobs = []
+        for message_id, fields in reply[1]:
+            if fields:
+                jobs.append(await self._count_attempt(self._decode(message_id, fields)))
+        return jobs
+
+    def get_stats(self) -> Dict:
+        return {"backend": "redis", "stream": STREAM_KEY, "group": GROUP_NAME}
+
+
+def _create_queue():
+    if settings.WORK_QUEUE_BACKEND == "redis":
+        try:
+            return RedisWorkQueue()
+        except ImportError:
+            logger.warning("[!] WORK_QUEUE_BACKEND=redis mais module redis absent: file locale")
+    return LocalWorkQueue()
+
+
+class QueuedCapturer(Capturer):
+    """
+    Capturer qui delegue les captures a la file distribuee.
+
+    Le resultat complet revient en une fois; capture_stream le redecoupe
+    en parties (STREAM_PARTS) pour garder la meme interface.
+    """
+
+    def __init__(self, queue):
+        self.queue = queue
+
+    async def capture_stream(
+        self,
+        url: str,
+        timings: Optional[CaptureTimings] = None,
+        **options
+    ) -> AsyncIterator[Tuple[str, Dict]]:
+        job_id = str(uuid.uuid4())
+        submitted_at = time.perf_counter()
+        await self.queue.submit({"id": job_id, "url": url, "options": options})
+        logger.debug(f"[QUEUE] Job {job_id[:8]}... soumis: {url}")
+
+        outcome = await self.queue.wait_result(job_id, settings.WORK_QUEUE_RESULT_TIMEOUT)
+        received_at = time.perf_counter()
+        if outcome is None:
+            raise RuntimeError(f"Aucun resultat apres {settings.WORK_QUEUE_RESULT_TIMEOUT}s (job {job_id})")
+
+        # Phases du noeud executant, placees juste avant la reception
+        remote_timings = outcome.get("timings") or {}
+        remote_started = received_at - remote_timings.get("total_ms", 0) / 1000
+        observe_phase("queue_wait", submitted_at, max(submitted_at, remote_started), timings)
+        if timings is not None and remote_timings:
+            timings.extend(remote_timings["phases"], remote_started)
+
+        if not outcome.get("ok"):
+            raise RuntimeError(outcome.get("error", "Echec de la capture distante"))
+
+        result = outcome["result"]
+        for part, keys in STREAM_PARTS.items():
+            data = {key: result[key] for key in keys if key in result}
+            if data:
+                yield part, data
+
+
+class WorkQueueNode:
+    """
+    Consommateurs de la file sur ce noeud (tirent les jobs selon la capacite).
+
+    Une place est reservee avant chaque lecture de la file et gardee jusqu'a
+    la fin du job: le noeud ne detient jamais plus de jobs qu'il ne peut en
+    executer, le surplus reste dans la file pour les autres noeuds.
+    """
+
+    def __init__(self, queue):
+        self.queue = queue
+        self.consumer_prefix = f"{socket.gethostname()}-{os.getpid()}"
+        self.tasks: List[asyncio.Task] = []
+        self.processed = 0
+        self.failed = 0
+        self.busy = 0
+        self.reserved = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._capacity_changed = asyncio.Condition()
+        self._reclaimed: set = set()
+
+    def capacity(self) -> int:
+        """
+        Jobs executables a la fois: limite effective de l'admission locale,
+        ou somme de celles des workers navigateur (dernier echantillon).
+        """
+        from api.admission import admission_controller
+        from api.monitoring import system_monitor
+
+        pool = system_monitor.snapshots.get("browser_pool") or {}
+        if "workers" in pool:
+            return sum(
+                worker["admission"]["effective_concurrency"]
+                for worker in pool["workers"] if worker.get("reachable")
+            )
+        return admission_controller.effective_limit()
+
+    def _can_reserve(self) -> bool:
+        from api.admission import admission_controller
+        return not admission_controller.draining and self.reserved < self.capacity()
+
+    async def _reserve(self):
+        """Reserve une place d'execution (avant de lire la file)."""
+        async with self._capacity_changed:
+            # La capacite varie sans notification (admission, workers): re-verifier
+            while not self._can_reserve():
+                try:
+                    await asyncio.wait_for(self._capacity_changed.wait(), timeout=1)
+                except asyncio.TimeoutError:
+                    pass
+            self.reserved += 1
+
+    async def _unreserve(self):
+        async with self._capacity_changed:
+            self.reserved -= 1
+            self._capacity_changed.notify_all()
+
+    @asynccontextmanager
+    async def _reservation(self):
+        """Place reservee jusqu'a la fin du job (rendue si la file est vide)."""
+        await self._reserve()
+        try:
+            yield
+        finally:
+            await self._unreserve()
+
+    async def _process(self, job: Dict, consumer: str, backend: Capturer):
+        self.busy += 1
+        self._idle.clear()
+        try:
+            await self._run(job, consumer, backend)
+        finally:
+            self.busy -= 1
+            if self.busy == 0:
+                self._idle.set()
+
+    async def _run(self, job: Dict, consumer: str, backend: Capturer):
+        from api.admission import admission_controller, AdmissionClosed
+
+        if admission_controller.draining:
+            # Job tire pendant le debut du drain: le rendre a un autre noeud
+            await self.queue.release(job)
+            return
+
+        if job["attempt"] > settings.WORK_QUEUE_MAX_ATTEMPTS:
+            logger.error(f"[QUEUE] Job {job['id'][:8]}... abandonne apres {job['attempt'] - 1} tentatives")
+            await self.queue.complete(job, {"ok": False, "error": f"Capture abandonnee apres {job['attempt'] - 1} tentatives"})
+            self.failed += 1
+            return
+
+        async def keep_alive():
+            while True:
+                await asyncio.sleep(settings.WORK_QUEUE_VISIBILITY_TIMEOUT / 3)
+                await self.queue.heartbeat(job, consumer)
+
+        heartbeat = asyncio.create_task(keep_alive())
+        timings = CaptureTimings()
+        try:
+            result = await backend.capture_all(job["url"], timings=timings, **job["options"])
+            outcome = {"ok": True, "result": result, "timings": timings.to_dict()}
+            self.processed += 1
+        except AdmissionClosed:
+            # Drain demarre pendant l'attente d'admission: le job n'a pas
+            # ete capture, il revient dans la file pour un autre noeud
+            heartbeat.cancel()
+            await self.queue.release(job)
+            logger.info(f"[QUEUE] Job {job['id'][:8]}... rendu a la file (drain)")
+            return
+        except Exception as e:
+            # Erreur de capture: renvoyee telle quelle (pas de nouvel essai)
+            outcome = {"ok": False, "error": str(e), "timings": timings.to_dict()}
+            self.failed += 1
+        finally:
+            heartbeat.cancel()
+
+        await self.queue.complete(job, outcome)
+        logger.debug(f"[QUEUE] Job {job['id'][:8]}... traite (tentative {job['attempt']}, "
+                     f"active: {admission_controller.active})")
+
+    async def _consumer_loop(self, index: int, backend: Capturer):
+        consumer = f"{self.consumer_prefix}-{index}"
+        while True:
+            try:
+                # Ne tirer un job que sur une place reservee (rendue si la file est vide)
+                async with self._reservation():
+                    job = await self.queue.fetch(consumer, block_ms=1000)
+                    if job:
+                        await self._process(job, consumer, backend)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"[QUEUE] Erreur consommateur {consumer}: {e}")
+                await asyncio.sleep(1)
+
+    async def _run_reclaimed(self, job: Dict, consumer: str, backend: Capturer):
+        try:
+            await self._process(job, consumer, backend)
+        finally:
+            await self._unreserve()
+
+    async def _reclaim_loop(self, backend: Capturer):
+        consumer = f"{self.consumer_prefix}-reclaim"
+        while True:
+            try:
+                # Un job repris par place reservee: il demarre aussitot (heartbeat)
+                # au lieu d'attendre ici et d'expirer a nouveau
+                await self._reserve()
+                try:
+                    jobs = await self.queue.reclaim(consumer, count=1)
+                except BaseException:
+                    await self._unreserve()
+                    raise
+                if not jobs:
+                    await self._unreserve()
+                    await asyncio.sleep(max(1, settings.WORK_QUEUE_VISIBILITY_TIMEOUT / 2))
+                    continue
+
+                job = jobs[0]
+                logger.warning(f"[QUEUE] Job {job['id'][:8]}... repris (tentative {job['attempt']})")
+                task = asyncio.create_task(self._run_reclaimed(job, consumer, backend))
+                self._reclaimed.add(task)
+                task.add_done_callback(self._reclaimed.discard)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"[QUEUE] Erreur reprise des jobs: {e}")
+                await asyncio.sleep(1)
+
+    async def start(self, backend: Capturer):
+        """Demarre les consommateurs (WORK_QUEUE_CONSUMERS) et la reprise des jobs."""
+        await self.queue.start()
+        if settings.WORK_QUEUE_CONSUMERS <= 0:
+            logger.info("[QUEUE] Noeud API seul (aucun consommateur)")
+            return
+
+        self.tasks = [
+            asyncio.create_task(self._consumer_loop(index, backend))
+            for index in range(settings.WORK_QUEUE_CONSUMERS)
+        ]
+        self.tasks.append(asyncio.create_task(self._reclaim_loop(backend)))
+        logger.info(f"[QUEUE] {settings.WORK_QUEUE_CONSUMERS} consommateurs demarres ({self.consumer_prefix})")
+
+    async def stop(self, timeout: float = 0):
+        """
+        Arrete les consommateurs.
+
+        Args:
+            timeout: Attente maximale des jobs en cours (les jobs non
+                termines seront repris par un autre noeud)
+        """
+        if timeout and self.busy:
+            try:
+                await asyncio.wait_for(self._idle.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"[QUEUE] {self.busy} job(s) encore en cours a l'arret")
+        tasks = self.tasks + list(self._reclaimed)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.tasks = []
+        await self.queue.stop()
+
+    def get_stats(self) -> Dict:
+        return {
+            **self.queue.get_stats(),
+            "consumers": settings.WORK_QUEUE_CONSUMERS,
+            "busy": self.busy,
+            "reserved": self.reserved,
+            "capacity": self.capacity(),
+            "processed": self.processed,
+            "failed": self.failed,
+        }
+
+
+# Instances globales (None si la file est desactivee)
+work_queue = _create_queue() if settings.WORK_QUEUE_ENABLED else None
+work_queue_node = WorkQueueNode(work_queue) if work_queue else None
+queued_capturer = QueuedCapturer(work_queue) if work_queue else None
@@ -0,0 +1,340 @@
+"""
+Worker navigateur hors process, joint par socket Unix.
+
+Le worker possede le pool Playwright et l'admission; les process API
+(plusieurs workers uvicorn possibles) lui envoient les captures.
+
+Protocole: trames JSON prefixees par leur longueur (4 octets, big-endian).
+Requete {"op": "capture" | "stats" | "ping", ...}; une capture renvoie une
+trame par partie ({"part", "data"}) puis {"done"} ou {"error"} ("closed":
+true si le worker draine et n'a pas admis la capture).
+
+Lancement:
+    python -m api.worker --socket /tmp/shoturl-browser-0.sock
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import signal
+import struct
+import time
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from api.config import settings, logger
+from api.capture import Capturer
+from api.admission import AdmissionClosed
+from api.session import session_manager
+from api.metrics import CaptureTimings
+
+# Garde-fou: un screenshot full-page encode depasse rarement quelques dizaines de MB
+MAX_FRAME_BYTES = 256 * 1024 * 1024
+_HEADER = struct.Struct(">I")
+
+
+async def _write_frame(writer: asyncio.StreamWriter, message: Dict):
+    payload = json.dumps(message).encode()
+    writer.write(_HEADER.pack(len(payload)) + payload)
+    await writer.drain()
+
+
+async def _read_frame(reader: asyncio.StreamReader) -> Dict:
+    (length,) = _HEADER.unpack(await reader.readexactly(_HEADER.size))
+    if length > MAX_FRAME_BYTES:
+        raise ValueError(f"Trame trop grande: {length} octets")
+    return json.loads(await reader.readexactly(length))
+
+
+# ========== Cote worker ==========
+
+class BrowserWorker:
+    """Serveur IPC: execute les captures sur le pool de navigateurs local."""
+
+    def __init__(self, socket_path: str):
+        self.socket_path = socket_path
+        self.capturer = Capturer()
+        self.server: Optional[asyncio.AbstractServer] = None
+
+    async def _run_capture(self, request: Dict, writer: asyncio.StreamWriter):
+        timings = CaptureTimings()
+        try:
+            async for part, data in self.capturer.capture_stream(
+                request["url"], timings=timings, **request.get("options", {})
+            ):
+                await _write_frame(writer, {"part": part, "data": data})
+            await _write_frame(writer, {"done": True, "timings": timings.to_dict()})
+        except ConnectionError:
+            raise
+        except AdmissionClosed as e:
+            # Capture non commencee: l'appelant peut la confier a un autre noeud
+            await _write_frame(writer, {"error": str(e), "closed": True, "timings": timings.to_dict()})
+        except Exception as e:
+            await _write_frame(writer, {"error": str(e), "timings": timings.to_dict()})
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request = await _read_frame(reader)
+            op = request.get("op")
+
+            if op == "capture":
+                capture = asyncio.create_task(self._run_capture(request, writer))
+                # Le client n'envoie plus rien: EOF = client parti, annuler la capture
+                disconnect = asyncio.create_task(reader.read(1))
+                done, _ = await asyncio.wait({capture, disconnect}, return_when=asyncio.FIRST_COMPLETED)
+                if capture not in done:
+                    logger.warning(f"[WORKER] Client deconnecte, annulation de {request.get('url')}")
+                    capture.cancel()
+                disconnect.cancel()
+                await asyncio.gather(capture, return_exceptions=True)
+
+            elif op == "stats":
+                from api.browser import browser_pool
+                from api.admission import admission_controller
+                from api.monitoring import system_monitor
+                await _write_frame(writer, {
+                    "pid": os.getpid(),
+                    "system": system_monitor.latest(),
+                    "browser_pool": await browser_pool.get_stats(),
+                    "admission": admission_controller.get_stats(),
+                })
+
+            elif op == "ping":
+                await _write_frame(writer, {"ok": True, "pid": os.getpid()})
+
+            else:
+                await _write_frame(writer, {"error": f"Operation inconnue: {op}"})
+
+        except (ConnectionError, asyncio.IncompleteReadError):
+            logger.debug("[WORKER] Connexion fermee par le client")
+        except Exception as e:
+            logger.error(f"[WORKER] Erreur requete: {e}")
+        finally:
+            writer.close()
+
+    async def serve(self):
+        """Demarre le pool et sert les requetes jusqu'a SIGTERM/SIGINT."""
+        from api.browser import browser_pool
+        from api.admission import admission_controller
+        from api.tiles import shutdown_stitch_pool
+        from api.monitoring import system_monitor
+
+        await browser_pool.initialize()
+        system_monitor.start()
+        admission_controller.start()
+
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        self.server = await asyncio.start_unix_server(self._handle, path=self.socket_path)
+        logger.info(f"[WORKER] Pret sur {self.socket_path} (pid {os.getpid()})")
+
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, stop.set)
+
+        try:
+            await stop.wait()
+            # Terminer les captures en cours avant de fermer le navigateur
+            if not await admission_controller.drain(settings.DRAIN_TIMEOUT):
+                logger.warning(f"[WORKER] Captures interrompues apres {settings.DRAIN_TIMEOUT}s de drain")
+        finally:
+            logger.info("[WORKER] Arret...")
+            self.server.close()
+            await self.server.wait_closed()
+            await admission_controller.stop()
+            await system_monitor.stop()
+            await browser_pool.cleanup()
+            shutdown_stitch_pool()
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+
+
+# ========== Cote API ==========
+
+class RemoteCapturer(Capturer):
+    """
+    Capturer dont les captures s'executent dans des workers navigateur.
+
+    Meme interface que Capturer (capture_all, capture_stream). Chaque
+    capture ouvre une connexion vers le worker le moins charge; un worker
+    injoignable est saute au profit du suivant. Les captures relayees sont
+    comptees ici: l'admission du process API ne les voit pas.
+
+    La connexion est confiee a la session de la capture: l'arret,
+    l'expiration ou le cleanup force de la session la ferment, et le worker
+    annule alors la capture (EOF = client parti).
+    """
+
+    def __init__(self, socket_paths: List[str]):
+        self.workers = [{"socket": path, "inflight": 0, "failures": 0} for path in socket_paths]
+        self._order = itertools.count()
+        # Captures relayees en cours (connexion comprise) et drain
+        self.active = 0
+        self.draining = False
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    def _candidates(self) -> List[Dict]:
+        # Moins de captures en cours d'abord, rotation en cas d'egalite
+        offset = next(self._order)
+        rotated = self.workers[offset % len(self.workers):] + self.workers[:offset % len(self.workers)]
+        return sorted(rotated, key=lambda worker: worker["inflight"])
+
+    async def _connect(self) -> Tuple[Dict, asyncio.StreamReader, asyncio.StreamWriter]:
+        last_error = None
+        for worker in self._candidates():
+            try:
+                reader, writer = await asyncio.wait_for(
+                    asyncio.open_unix_connection(worker["socket"], limit=2 ** 20),
+                    timeout=settings.BROWSER_WORKER_CONNECT_TIMEOUT
+                )
+                return worker, reader, writer
+            except (OSError, asyncio.TimeoutError) as e:
+                worker["failures"] += 1
+                last_error = e
+                logger.warning(f"[!] Worker {worker['socket']} injoignable: {e}")
+        raise RuntimeError(f"Aucun worker navigateur disponible: {last_error}")
+
+    async def _ask(self, worker: Dict, message: Dict) -> Dict:
+        """Requete simple (une trame aller, une trame retour) vers un worker donne."""
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_unix_connection(worker["socket"]),
+            timeout=settings.BROWSER_WORKER_CONNECT_TIMEOUT
+        )
+        try:
+            await _write_frame(writer, message)
+            return await _read_frame(reader)
+        finally:
+            writer.close()
+
+    async def check(self) -> int:
+        """Verifie les workers au demarrage; retourne le nombre de joignables."""
+        reachable = 0
+        for worker in self.workers:
+            try:
+                reply = await self._ask(worker, {"op": "ping"})
+                logger.info(f"[+] Worker navigateur {worker['socket']} (pid {reply.get('pid')})")
+                reachable += 1
+            except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError) as e:
+                logger.warning(f"[!] Worker navigateur {worker['socket']} injoignable: {e}")
+        return reachable
+
+    async def capture_stream(
+        self,
+        url: str,
+        timings: Optional[CaptureTimings] = None,
+        **options
+    ) -> AsyncIterator[Tuple[str, Dict]]:
+        """
+        Relaie les parties produites par un worker (voir Capturer.capture_stream).
+
+        Les phases mesurees dans le worker sont ajoutees a la chronologie,
+        decalees de l'instant d'envoi.
+
+        Raises:
+            AdmissionClosed: Drain demarre (ici ou dans le worker)
+        """
+        if self.draining:
+            raise AdmissionClosed("Service en cours d'arret, capture non admise")
+
+        self.active += 1
+        self._idle.clear()
+        try:
+            worker, reader, writer = await self._connect()
+        except Exception:
+            self._done()
+            raise
+        worker["inflight"] += 1
+        session_id = options.get("session_id")
+        session_manager.attach(session_id, connection=writer)
+        sent_at = time.perf_counter()
+        try:
+            await _write_frame(writer, {"op": "capture", "url": url, "options": options})
+            while True:
+                frame = await _read_frame(reader)
+                if "part" in frame:
+                    yield frame["part"], frame["data"]
+                    continue
+
+                if timings is not None and frame.get("timings"):
+                    timings.extend(frame["timings"]["phases"], sent_at)
+                if frame.get("closed"):
+                    raise AdmissionClosed(frame["error"])
+                if "error" in frame:
+                    raise RuntimeError(frame["error"])
+                return
+        except (asyncio.IncompleteReadError, ConnectionError):
+            raise RuntimeError(f"Worker {worker['socket']} interrompu pendant la capture")
+        finally:
+            session_manager.detach(session_id)
+            worker["inflight"] -= 1
+            writer.close()
+            self._done()
+
+    def _done(self):
+        self.active -= 1
+        if self.active == 0:
+            self._idle.set()
+
+    async def drain(self, timeout: float) -> bool:
+        """
+        Refuse les nouvelles captures et attend la fin des captures relayees.
+
+        Returns:
+            True si toutes les captures se sont terminees a temps
+        """
+        self.draining = True
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout=timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    def undrain(self):
+        """Annule un drain: les captures sont de nouveau relayees."""
+        self.draining = False
+
+    async def get_stats(self) -> Dict:
+        """Statistiques agregees des workers (format de BrowserPool.get_stats)."""
+        workers = []
+        for worker in self.workers:
+            entry = {"socket": worker["socket"], "inflight": worker["inflight"], "failures": worker["failures"]}
+            try:
+                entry.update(await self._ask(worker, {"op": "stats"}))
+                entry["reachable"] = True
+            except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError) as e:
+                entry.update({"reachable": False, "error": str(e)})
+            workers.append(entry)
+
+        pools = [w["browser_pool"] for w in workers if w.get("reachable")]
+        return {
+            "active_contexts": sum(pool["active_contexts"] for pool in pools),
+            "prewarm_contexts": sum(pool["prewarm_contexts"] for pool in pools),
+            "prewarm_enabled": settings.PREWARM_ENABLED,
+            "idle_contexts": sum(pool.get("idle_contexts", 0) for pool in pools),
+            "context_recycle_enabled": settings.CONTEXT_RECYCLE_ENABLED,
+            "max_contexts": sum(pool["max_contexts"] for pool in pools),
+            "browser_running": bool(pools),
+            "workers": workers,
+        }
+
+
+def _worker_sockets() -> List[str]:
+    return [path.strip() for path in settings.BROWSER_WORKER_SOCKETS.split(",") if path.strip()]
+
+
+# Instance globale (None: captures dans le process API)
+remote_capturer: Optional[RemoteCapturer] = RemoteCapturer(_worker_sockets()) if _worker_sockets() else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Worker navigateur ShotURL")
+    parser.add_argument("--socket", required=True, help="Chemin du socket Unix")
+    args = parser.parse_args()
+    asyncio.run(BrowserWorker(args.socket).serve())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Simulation de la limite adaptative (LatencyLimit) en saturation
+
+Service simule: jusqu'a CAPACITY captures en parallele sans ralentissement,
+au-dela la latence croit lineairement avec la concurrence (CPU partage).
+Apres une phase de charge legere, des clients en nombre illimite gardent
+toujours `limite courante` captures en cours. La limite doit redescendre
+pres de CAPACITY et y rester, au lieu de rester bloquee au maximum.
+
+Exemples:
+  python tests/scripts/adaptive_limit_sim.py            # gradient et aimd
+  python tests/scripts/adaptive_limit_sim.py --check    # code retour 1 si la limite ne baisse pas
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parents[2]
+
+sys.path.insert(0, str(ROOT_DIR))
+# La configuration cree logs/ dans le repertoire courant
+os.chdir(ROOT_DIR)
+
+from api.config import settings  # noqa: E402
+from api.admission import LatencyLimit  # noqa: E402
+
+CAPACITY = 4
+BASE_LATENCY = 2.0
+
+
+def simulated_latency(inflight: int, rng: random.Random) -> float:
+    """Latence d'une capture avec `inflight` captures en cours (bruit +-20%)."""
+    return BASE_LATENCY * max(1.0, inflight / CAPACITY) * rng.uniform(0.8, 1.2)
+
+
+def simulate(algorithm: str, max_limit: int, light: int, saturated: int, seed: int) -> dict:
+    """Charge legere puis saturation; retourne l'evolution de la limite."""
+    settings.ADAPTIVE_LIMIT_ALGORITHM = algorithm
+    rng = random.Random(seed)
+    limit = LatencyLimit(min_limit=1, max_limit=max_limit)
+
+    for _ in range(light):
+        limit.update(simulated_latency(1, rng), inflight=1)
+    after_light = limit.limit
+
+    history = []
+    for _ in range(saturated):
+        inflight = limit.current()
+        limit.update(simulated_latency(inflight, rng), inflight=inflight)
+        history.append(limit.limit)
+
+    tail = history[len(history) // 2:]
+    return {
+        "after_light": after_light,
+        "tail_mean": statistics.mean(tail),
+        "tail_max": max(tail),
+        "baseline_s": limit.baseline_latency,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulation de la limite adaptative en saturation")
+    parser.add_argument("--max-limit", type=int, default=16, help="MAX_CONCURRENT_BROWSERS simule")
+    parser.add_argument("--light", type=int, default=30, help="Captures en charge legere")
+    parser.add_argument("--saturated", type=int, default=2000, help="Captures en saturation")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--check", action="store_true",
+                        help="Echoue si la limite moyenne en saturation depasse 2 x CAPACITY")
+    args = parser.parse_args()
+
+    print(f"Capacite simulee: {CAPACITY}, limite max: {args.max_limit}, "
+          f"tolerance: {settings.ADAPTIVE_LATENCY_TOLERANCE}, fenetre: {settings.ADAPTIVE_BASELINE_WINDOW}")
+    failed = False
+    for algorithm in ("gradient", "aimd"):
+        result = simulate(algorithm, args.max_limit, args.light, args.saturated, args.seed)
+        ok = result["tail_mean"] <= 2 * CAPACITY
+        failed |= not ok
+        print(f"  {algorithm:<8} apres charge legere: {result['after_light']:5.1f}  "
+              f"saturation (2e moitie): moyenne {result['tail_mean']:5.1f}, max {result['tail_max']:5.1f}  "
+              f"reference {result['baseline_s']:.2f}s  {'OK' if ok else 'ECHEC'}")
+
+    if args.check and failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
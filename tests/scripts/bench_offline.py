@@ -0,0 +1,488 @@
+#!/usr/bin/env python3
+"""
+Benchmark hors ligne de ShotURL
+Sert des pages synthetiques en local et mesure les captures a concurrence fixe
+
+Modes:
+  capturer  Appelle Capturer.capture_all directement (pool de navigateurs local)
+  api       Passe par l'API complete (/api/capture). Sans --base-url, l'API est
+            demarree dans ce process avec ALLOW_LOCAL_URLS=true et sans rate limit.
+            Avec --base-url, le serveur cible doit tourner avec ALLOW_LOCAL_URLS=true.
+
+Exemples:
+  python tests/scripts/bench_offline.py --mode capturer --concurrency 1,2,4
+  python tests/scripts/bench_offline.py --mode api --scenarios heavy_dom,redirects -n 20
+  python tests/scripts/bench_offline.py --context-modes fresh,recycle   # gain du recyclage
+  python tests/scripts/bench_offline.py --capture-modes full,analysis   # debit du mode analyse
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import socket
+import struct
+import sys
+import threading
+import time
+import zlib
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import urlparse, parse_qs
+
+ROOT_DIR = Path(__file__).resolve().parents[2]
+RESULTS_DIR = ROOT_DIR / "tests" / "results"
+
+# Scenarios: nom -> chemin sur le serveur synthetique
+SCENARIOS = {
+    "simple": "/simple",
+    "heavy_dom": "/heavy-dom?nodes=20000&forms=20",
+    "subresources": "/subresources?count=300",
+    "slow_resources": "/slow-resources?count=10&ms=1500",
+    "stalled_resource": "/stalled",
+    "tall_page": "/tall?px=30000",
+    "redirects": "/redirect?hops=5",
+    "kit_libraries": "/kit?libs=8&ms=150",
+}
+
+
+def _tiny_png() -> bytes:
+    """PNG 1x1 valide (genere une fois)."""
+    def chunk(kind, data):
+        body = kind + data
+        return struct.pack(">I", len(data)) + body + struct.pack(">I", zlib.crc32(body))
+    header = struct.pack(">IIBBBBB", 1, 1, 8, 2, 0, 0, 0)
+    pixels = zlib.compress(b"\x00\xcc\x33\x33")
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", pixels) + chunk(b"IEND", b"")
+
+
+PNG_BYTES = _tiny_png()
+
+
+def _page(title: str, body: str, head: str = "") -> bytes:
+    return (
+        f"<!DOCTYPE html><html><head><meta charset='utf-8'><title>{title}</title>{head}</head>"
+        f"<body>{body}</body></html>"
+    ).encode()
+
+
+class SyntheticSiteHandler(BaseHTTPRequestHandler):
+    """Pages synthetiques deterministes (aucun acces internet)."""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, content_type: str, body: bytes, headers: dict = None,
+              cache_control: str = "no-store"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", cache_control)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        query = {key: values[0] for key, values in parse_qs(parsed.query).items()}
+        route = parsed.path
+
+        try:
+            if route == "/simple":
+                self._send(200, "text/html", _page("Simple", "<h1>Hello</h1><p>Static page</p>"))
+
+            elif route == "/heavy-dom":
+                # DOM lourd: noeuds, liens, formulaires et scripts inline
+                nodes = int(query.get("nodes", 20000))
+                forms = int(query.get("forms", 20))
+                items = "".join(
+                    f"<div class='row r{i % 50}'><a href='/simple?i={i}' onclick='void 0'>item {i}</a></div>"
+                    for i in range(nodes // 2)
+                )
+                form_html = "".join(
+                    f"<form action='/login{i}' method='post'>"
+                    f"<input name='user{i}'><input type='password' name='pass{i}'><button>Go</button></form>"
+                    for i in range(forms)
+                )
+                scripts = "".join(f"<script>var v{i} = {i};</script>" for i in range(30))
+                self._send(200, "text/html", _page("Heavy DOM", items + form_html + scripts))
+
+            elif route == "/subresources":
+                # Centaines de sous-ressources (images, scripts, feuilles de style)
+                count = int(query.get("count", 300))
+                head = "".join(f"<link rel='stylesheet' href='/asset/s{i}.css'>" for i in range(count // 10))
+                body = "".join(f"<img src='/asset/i{i}.png' width='8' height='8'>" for i in range(count))
+                body += "".join(f"<script src='/asset/j{i}.js'></script>" for i in range(count // 10))
+                self._send(200, "text/html", _page("Subresources", body, head))
+
+            elif route == "/slow-resources":
+                count = int(query.get("count", 10))
+                ms = int(query.get("ms", 1500))
+                body = "".join(f"<img src='/delay?ms={ms}&i={i}' width='8' height='8'>" for i in range(count))
+                self._send(200, "text/html", _page("Slow resources", "<h1>Slow</h1>" + body))
+
+            elif route == "/stalled":
+                # Une ressource qui ne repond jamais (jusqu'a la fin du benchmark)
+                self._send(200, "text/html", _page("Stalled", "<h1>Stalled</h1><img src='/hang'>"))
+
+            elif route == "/tall":
+                px = int(query.get("px", 30000))
+                blocks = "".join(
+                    f"<section style='height:1000px;background:hsl({i * 37 % 360},60%,80%)'>Block {i}</section>"
+                    for i in range(max(1, px // 1000))
+                )
+                self._send(200, "text/html", _page("Tall", blocks))
+
+            elif route == "/redirect":
+                hops = int(query.get("hops", 5))
+                target = f"/redirect?hops={hops - 1}" if hops > 1 else "/simple"
+                self._send(302, "text/plain", b"", {"Location": target})
+
+            elif route == "/kit":
+                # Page de kit: bibliotheques "CDN" cachables et lentes a telecharger
+                libs = int(query.get("libs", 8))
+                ms = int(query.get("ms", 150))
+                head = "".join(f"<script src='/lib/lib{i}.js?ms={ms}'></script>" for i in range(libs))
+                head += f"<link rel='stylesheet' href='/lib/theme.css?ms={ms}'>"
+                self._send(200, "text/html", _page("Kit", "<form><input name='user'></form>", head))
+
+            elif route.startswith("/lib/"):
+                time.sleep(int(query.get("ms", 0)) / 1000)
+                # ~90KB, taille d'une bibliotheque minifiee courante
+                padding = b"/*" + b"x" * 90000 + b"*/"
+                content_type = "text/css" if route.endswith(".css") else "application/javascript"
+                self._send(200, content_type, padding, cache_control="public, max-age=86400")
+
+            elif route.startswith("/asset/"):
+                if route.endswith(".png"):
+                    self._send(200, "image/png", PNG_BYTES)
+                elif route.endswith(".css"):
+                    self._send(200, "text/css", b"body { margin: 0; }")
+                else:
+                    self._send(200, "application/javascript", b"window.__n = (window.__n || 0) + 1;")
+
+            elif route == "/delay":
+                time.sleep(int(query.get("ms", 1000)) / 1000)
+                self._send(200, "image/png", PNG_BYTES)
+
+            elif route == "/hang":
+                self.server.stop_event.wait()
+
+            else:
+                self._send(404, "text/plain", b"not found")
+
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+
+class SyntheticSite:
+    """Serveur HTTP local dans un thread dedie."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        self.server = ThreadingHTTPServer((host, port), SyntheticSiteHandler)
+        self.server.daemon_threads = True
+        self.server.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.stop_event.set()
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def percentile(values, pct):
+    """Percentile par rang le plus proche."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = math.ceil(pct / 100 * len(ordered))
+    return ordered[max(0, min(len(ordered), rank) - 1)]
+
+
+def summarize(samples, elapsed):
+    """Debit, erreurs et p50/p95/p99 (total et par phase) d'une serie."""
+    ok = [s for s in samples if s["status"] == "success"]
+    errors = {}
+    for sample in samples:
+        if sample["status"] != "success":
+            errors[sample["error"]] = errors.get(sample["error"], 0) + 1
+
+    phases = {}
+    for sample in ok:
+        for phase, duration in sample["phases"].items():
+            phases.setdefault(phase, []).append(duration)
+
+    def stats(values):
+        return {f"p{p}": percentile(values, p) for p in (50, 95, 99)}
+
+    return {
+        "requests": len(samples),
+        "success": len(ok),
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(ok) / elapsed, 3) if elapsed > 0 else 0,
+        "total_ms": stats([s["total_ms"] for s in ok]),
+        "phases_ms": {phase: stats(values) for phase, values in sorted(phases.items())},
+    }
+
+
+def phase_durations(timings: dict) -> dict:
+    """Somme des durees par phase (une phase peut apparaitre plusieurs fois)."""
+    durations = {}
+    for entry in timings.get("phases", []):
+        durations[entry["phase"]] = durations.get(entry["phase"], 0) + entry["duration_ms"]
+    return durations
+
+
+class CapturerRunner:
+    """Captures en process via Capturer.capture_all."""
+
+    async def start(self):
+        from api.browser import browser_pool
+        from api.admission import admission_controller
+        await browser_pool.initialize()
+        admission_controller.start()
+
+    async def stop(self):
+        from api.browser import browser_pool
+        from api.admission import admission_controller
+        from api.tiles import shutdown_stitch_pool
+        await admission_controller.stop()
+        await browser_pool.cleanup()
+        shutdown_stitch_pool()
+
+    async def set_context_mode(self, mode: str):
+        """fresh: un contexte neuf par capture; recycle: contextes reinitialises."""
+        from api.browser import browser_pool
+        from api.config import settings
+        settings.CONTEXT_RECYCLE_ENABLED = mode == "recycle"
+        # Repartir sans reserve pour que chaque mode soit mesure a froid
+        await browser_pool.close_idle_contexts()
+
+    async def run_one(self, url: str, options: dict) -> dict:
+        from api.capture import capturer
+        from api.metrics import CaptureTimings
+
+        timings = CaptureTimings()
+        try:
+            await capturer.capture_all(url=url, timings=timings, **options)
+            return {"status": "success", "total_ms": timings.total_ms(), "phases": phase_durations(timings.to_dict())}
+        except Exception as e:
+            return {"status": "error", "error": type(e).__name__, "total_ms": timings.total_ms()}
+
+
+class ApiRunner:
+    """Captures via l'API HTTP (serveur externe ou uvicorn en process)."""
+
+    def __init__(self, base_url: str = None):
+        self.base_url = base_url
+        self.server = None
+        self.server_task = None
+        self.client = None
+
+    async def start(self):
+        import httpx
+
+        if not self.base_url:
+            import uvicorn
+            from api.main import app, limiter as app_limiter
+            from api.routes import limiter as routes_limiter
+
+            # Le benchmark mesure la capture, pas le rate limiting
+            app_limiter.enabled = False
+            routes_limiter.enabled = False
+
+            with socket.socket() as sock:
+                sock.bind(("127.0.0.1", 0))
+                port = sock.getsockname()[1]
+
+            config = uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning")
+            self.server = uvicorn.Server(config)
+            self.server_task = asyncio.create_task(self.server.serve())
+            while not self.server.started:
+                if self.server_task.done():
+                    self.server_task.result()
+                await asyncio.sleep(0.05)
+            self.base_url = f"http://127.0.0.1:{port}"
+
+        self.client = httpx.AsyncClient(base_url=self.base_url, timeout=120)
+
+    async def stop(self):
+        if self.client:
+            await self.client.aclose()
+        if self.server:
+            self.server.should_exit = True
+            await self.server_task
+
+    async def run_one(self, url: str, options: dict) -> dict:
+        payload = {
+            "url": url,
+            "full_page": options["full_page"],
+            "width": options["width"],
+            "height": options["height"],
+            "readiness": options["readiness"],
+        }
+        if options.get("full_page_mode"):
+            payload["full_page_mode"] = options["full_page_mode"]
+        if options.get("mode"):
+            payload["mode"] = options["mode"]
+
+        started = time.perf_counter()
+        try:
+            response = await self.client.post("/api/capture", json=payload)
+            total_ms = round((time.perf_counter() - started) * 1000, 1)
+            if response.status_code != 200:
+                return {"status": "error", "error": f"HTTP {response.status_code}", "total_ms": total_ms}
+            phases = phase_durations(response.json().get("timings") or {})
+            return {"status": "success", "total_ms": total_ms, "phases": phases}
+        except Exception as e:
+            return {"status": "error", "error": type(e).__name__,
+                    "total_ms": round((time.perf_counter() - started) * 1000, 1)}
+
+
+async def run_level(runner, url: str, options: dict, concurrency: int, iterations: int):
+    """Execute `iterations` captures avec `concurrency` workers (boucle fermee)."""
+    queue = asyncio.Queue()
+    for _ in range(iterations):
+        queue.put_nowait(None)
+    samples = []
+
+    async def worker():
+        while True:
+            try:
+                queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            samples.append(await runner.run_one(url, options))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(samples, time.perf_counter() - started)
+
+
+def print_report(report):
+    print(f"\n{'='*96}")
+    print(f"{'scenario':<26}{'conc':>5}{'ok':>7}{'rps':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}  slowest phases (p95)")
+    print(f"{'='*96}")
+    for run in report["runs"]:
+        total = run["total_ms"]
+        slowest = sorted(run["phases_ms"].items(), key=lambda item: -(item[1]["p95"] or 0))[:3]
+        phases = ", ".join(f"{name}={stats['p95']:.0f}" for name, stats in slowest)
+        fmt = lambda value: f"{value:.0f}" if value is not None else "-"
+        tags = [run[key] for key in ("capture_mode", "context_mode") if run.get(key)]
+        label = run["scenario"] + (f" [{','.join(tags)}]" if tags else "")
+        print(f"{label:<26}{run['concurrency']:>5}{run['success']:>4}/{run['requests']:<3}"
+              f"{run['throughput_rps']:>7.2f}{fmt(total['p50']):>10}{fmt(total['p95']):>10}{fmt(total['p99']):>10}  {phases}")
+        if run["errors"]:
+            print(f"{'':<31}errors: {run['errors']}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark hors ligne sur pages synthetiques")
+    parser.add_argument("--mode", choices=["capturer", "api"], default="capturer")
+    parser.add_argument("--base-url", help="API deja demarree (mode api)")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="Liste separee par virgules")
+    parser.add_argument("--concurrency", default="1,2,4", help="Niveaux de concurrence (ex: 1,2,4)")
+    parser.add_argument("-n", "--iterations", type=int, default=10, help="Captures par scenario et niveau")
+    parser.add_argument("--full-page", action="store_true")
+    parser.add_argument("--full-page-mode", choices=["single", "tiles", "stitched"], default="single")
+    parser.add_argument("--readiness", choices=["fixed", "smart"], default="fixed")
+    parser.add_argument("--width", type=int, default=1920)
+    parser.add_argument("--height", type=int, default=1080)
+    parser.add_argument("--site-host", default="127.0.0.1",
+                        help="Interface du serveur synthetique (0.0.0.0 si l'API tourne dans un conteneur)")
+    parser.add_argument("--context-modes",
+                        help="Modes de contexte a comparer en mode capturer (ex: fresh,recycle)")
+    parser.add_argument("--capture-modes",
+                        help="Modes de capture a comparer (ex: full,analysis)")
+    parser.add_argument("--output", help="Fichier JSON du rapport (defaut: tests/results/)")
+    args = parser.parse_args()
+
+    scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = [name for name in scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"Scenarios inconnus: {unknown} (disponibles: {', '.join(SCENARIOS)})")
+    levels = [int(level) for level in args.concurrency.split(",")]
+    context_modes = [mode.strip() for mode in args.context_modes.split(",")] if args.context_modes else [None]
+    if context_modes != [None] and (args.mode != "capturer" or set(context_modes) - {"fresh", "recycle"}):
+        parser.error("--context-modes: fresh et/ou recycle, en mode capturer uniquement")
+    capture_modes = [mode.strip() for mode in args.capture_modes.split(",")] if args.capture_modes else [None]
+    if set(capture_modes) - {None, "full", "analysis"}:
+        parser.error("--capture-modes: full et/ou analysis")
+
+    # Les modules api lisent la configuration a l'import
+    os.environ["ALLOW_LOCAL_URLS"] = "true"
+    sys.path.insert(0, str(ROOT_DIR))
+
+    options = {
+        "full_page": args.full_page,
+        "full_page_mode": args.full_page_mode,
+        "width": args.width,
+        "height": args.height,
+        "readiness": args.readiness,
+    }
+
+    runner = CapturerRunner() if args.mode == "capturer" else ApiRunner(args.base_url)
+
+    with SyntheticSite(host=args.site_host) as site:
+        print(f"Synthetic site: {site.base_url}")
+        await runner.start()
+        runs = []
+        try:
+            for context_mode in context_modes:
+                if context_mode:
+                    await runner.set_context_mode(context_mode)
+                for capture_mode in capture_modes:
+                    run_options = {**options, "mode": capture_mode} if capture_mode else options
+                    for scenario in scenarios:
+                        url = site.base_url + SCENARIOS[scenario]
+                        for concurrency in levels:
+                            print(f"[{scenario}] concurrency={concurrency} iterations={args.iterations}"
+                                  + (f" contexts={context_mode}" if context_mode else "")
+                                  + (f" capture={capture_mode}" if capture_mode else "") + "...")
+                            result = await run_level(runner, url, run_options, concurrency, args.iterations)
+                            run = {"scenario": scenario, "concurrency": concurrency, **result}
+                            if context_mode:
+                                run["context_mode"] = context_mode
+                            if capture_mode:
+                                run["capture_mode"] = capture_mode
+                            runs.append(run)
+        finally:
+            await runner.stop()
+
+    report = {
+        "timestamp": datetime.now().isoformat(),
+        "mode": args.mode,
+        "options": options,
+        "iterations": args.iterations,
+        "env": {key: value for key, value in os.environ.items()
+                if key.startswith(("MAX_", "PREWARM", "ADMISSION", "ADAPTIVE", "READINESS", "FULLPAGE", "CONTEXT_RECYCLE",
+                                   "ANALYSIS"))},
+        "runs": runs,
+    }
+    print_report(report)
+
+    output = Path(args.output) if args.output else (
+        RESULTS_DIR / f"bench_offline_{args.mode}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    )
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+    print(f"\nRapport sauvegarde: {output}\n")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
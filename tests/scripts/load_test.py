@@ -1,11 +1,24 @@
 #!/usr/bin/env python3
 """
 Script de test de charge pour ShotURL
-Teste les performances avec plusieurs requetes simultanees
+
+Modes:
+  burst    N requetes simultanees (comportement historique)
+  open     Generateur en boucle ouverte: arrivees a debit constant ou Poisson,
+           independantes des reponses (pas d'omission coordonnee)
+  compare  Compare deux rapports JSON et signale les regressions
+
+Exemples:
+  python3 load_test.py 10
+  python3 load_test.py open --rate 2 --duration 120 --arrival poisson --mix mixed --output run_a.json
+  python3 load_test.py compare run_a.json run_b.json --threshold 10
 """
 
+import argparse
 import asyncio
 import aiohttp
+import math
+import random
 import time
 from datetime import datetime
 import json
@@ -21,17 +34,86 @@ TEST_URLS = [
     "https://www.twitch.tv/gotaga",
 ]
 
+# Melanges de scenarios: (poids, options de capture)
+SCENARIO_MIXES = {
+    "desktop": [
+        (1, {"device": "desktop", "full_page": False, "delay": 0, "grab_html": False}),
+    ],
+    "mixed": [
+        (5, {"device": "desktop", "full_page": False, "delay": 0, "grab_html": False}),
+        (2, {"device": "phone", "full_page": False, "delay": 0, "grab_html": False}),
+        (1, {"device": "tablet", "full_page": False, "delay": 0, "grab_html": False}),
+        (1, {"device": "desktop", "full_page": True, "delay": 0, "grab_html": False}),
+        (1, {"device": "desktop", "full_page": False, "delay": 2, "grab_html": True}),
+    ],
+    "heavy": [
+        (1, {"device": "desktop", "full_page": True, "delay": 2, "grab_html": True}),
+        (1, {"device": "desktop", "full_page": True, "full_page_mode": "tiles", "delay": 0, "grab_html": False}),
+    ],
+}
+
+# Percentiles rapportes et compares
+PERCENTILES = (50, 90, 95, 99, 99.9)
+
+
+class LatencyHistogram:
+    """
+    Histogramme a precision relative fixe (facon HdrHistogram).
+
+    Chaque valeur (ms) tombe dans un bucket logarithmique de largeur
+    relative `precision`: memoire bornee quel que soit le nombre de
+    mesures, percentiles exacts a `precision` pres, fusion et
+    serialisation triviales.
+    """
+
+    def __init__(self, precision: float = 0.01):
+        self.precision = precision
+        self._log_base = math.log1p(precision)
+        self.counts = {}
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    def record(self, value_ms: float):
+        value_ms = max(value_ms, 0.001)
+        index = int(math.log(value_ms) / self._log_base)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.total += 1
+        self.min = value_ms if self.min is None else min(self.min, value_ms)
+        self.max = value_ms if self.max is None else max(self.max, value_ms)
+
+    def percentile(self, pct: float):
+        if not self.total:
+            return None
+        rank = max(1, math.ceil(pct / 100 * self.total))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                # Borne haute du bucket, plafonnee au max observe
+                return min(math.exp((index + 1) * self._log_base), self.max)
+        return self.max
+
+    def summary(self) -> dict:
+        result = {f"p{pct:g}": _round(self.percentile(pct)) for pct in PERCENTILES}
+        result.update({"min": _round(self.min), "max": _round(self.max), "count": self.total})
+        return result
 
-async def capture_url(session, url, test_id):
+    def to_dict(self) -> dict:
+        return {"precision": self.precision, "counts": {str(k): v for k, v in sorted(self.counts.items())}}
+
+
+def _round(value):
+    return round(value, 1) if value is not None else None
+
+
+async def capture_url(session, url, test_id, payload=None):
     """Capture une URL et mesure le temps"""
     start_time = time.time()
 
     payload = {
         "url": url,
-        "full_page": False,
-        "device": "desktop",
-        "delay": 0,
-        "grab_html": False
+        **(payload or {"full_page": False, "device": "desktop", "delay": 0, "grab_html": False}),
     }
 
     try:
@@ -51,8 +133,8 @@ async def capture_url(session, url, test_id):
                     "url": url,
                     "status": "success",
                     "elapsed": elapsed,
-                    "screenshot_size": len(data.get("screenshot", "")),
-                    "network_logs": len(data.get("network_logs", [])),
+                    "screenshot_size": len(data.get("screenshot") or ""),
+                    "network_logs": len(data.get("network_logs") or []),
                 }
             else:
                 error_text = await response.text()
@@ -62,6 +144,7 @@ async def capture_url(session, url, test_id):
                     "url": url,
                     "status": "error",
                     "elapsed": elapsed,
+                    "http_status": response.status,
                     "error": f"HTTP {response.status}: {error_text[:100]}"
                 }
     except asyncio.TimeoutError:
@@ -81,12 +164,13 @@ async def capture_url(session, url, test_id):
             "url": url,
             "status": "exception",
             "elapsed": elapsed,
-            "error": str(e)
+            "error": f"{type(e).__name__}: {str(e)[:100]}"
         }
 
 
-async def run_concurrent_test(num_requests):
+async def run_concurrent_test(num_requests, urls=None):
     """Lance plusieurs captures simultanees"""
+    urls = urls or TEST_URLS
     print(f"\n{'='*60}")
     print(f"Test de charge: {num_requests} requetes simultanees")
     print(f"Target: {BASE_URL}")
@@ -98,7 +182,7 @@ async def run_concurrent_test(num_requests):
         # Creer les taches
         tasks = []
         for i in range(num_requests):
-            url = TEST_URLS[i % len(TEST_URLS)]
+            url = urls[i % len(urls)]
             tasks.append(capture_url(session, url, i + 1))
 
         # Executer toutes les taches en parallele
@@ -153,6 +237,231 @@ async def run_concurrent_test(num_requests):
     return results
 
 
+def arrival_offsets(rate, duration, arrival, rng):
+    """Instants d'envoi planifies (secondes depuis le debut)."""
+    offsets = []
+    t = 0.0
+    while True:
+        t += rng.expovariate(rate) if arrival == "poisson" else 1.0 / rate
+        if t >= duration:
+            return offsets
+        offsets.append(t)
+
+
+def pick_scenario(mix, rng):
+    """Tire un scenario selon les poids du melange."""
+    weights = [weight for weight, _ in mix]
+    index = rng.choices(range(len(mix)), weights=weights)[0]
+    return index, mix[index][1]
+
+
+def scenario_name(options):
+    parts = [options.get("device", "desktop")]
+    if options.get("full_page"):
+        parts.append("full" if options.get("full_page_mode", "single") == "single" else options["full_page_mode"])
+    if options.get("delay"):
+        parts.append(f"delay{options['delay']}")
+    if options.get("grab_html"):
+        parts.append("html")
+    return "-".join(parts)
+
+
+async def run_open_loop(args):
+    """
+    Generateur en boucle ouverte.
+
+    Les requetes partent a des instants planifies a l'avance, quelle que soit
+    la vitesse du serveur. La latence est mesuree depuis l'instant PLANIFIE
+    (un envoi retarde compte dans la latence), ce qui evite l'omission
+    coordonnee. La duree de service (depuis l'envoi reel) est aussi rapportee.
+    """
+    rng = random.Random(args.seed)
+    if args.mix_file:
+        with open(args.mix_file) as f:
+            mix = [(entry.get("weight", 1), entry["options"]) for entry in json.load(f)]
+    else:
+        mix = SCENARIO_MIXES[args.mix]
+    urls = args.target or TEST_URLS
+    offsets = arrival_offsets(args.rate, args.duration, args.arrival, rng)
+    plan = [(offset, urls[i % len(urls)], *pick_scenario(mix, rng)) for i, offset in enumerate(offsets)]
+
+    print(f"\n{'='*60}")
+    print(f"Open-loop: {len(plan)} requests, {args.rate}/s {args.arrival} over {args.duration}s, mix={args.mix_file or args.mix}")
+    print(f"Target: {BASE_URL}")
+    print(f"{'='*60}\n")
+
+    latency = LatencyHistogram()
+    service = LatencyHistogram()
+    per_scenario = {}
+    errors = {}
+    counts = {"success": 0, "error": 0, "dropped": 0}
+    inflight = 0
+    max_inflight_seen = 0
+    send_lag = LatencyHistogram()
+
+    async def fire(session, scheduled_at, url, options):
+        nonlocal inflight, max_inflight_seen
+        sent_at = time.perf_counter()
+        send_lag.record((sent_at - scheduled_at) * 1000)
+        inflight += 1
+        max_inflight_seen = max(max_inflight_seen, inflight)
+        outcome = None
+        try:
+            async with session.post(
+                f"{BASE_URL}/api/capture",
+                json={"url": url, **options},
+                timeout=aiohttp.ClientTimeout(total=args.timeout)
+            ) as response:
+                await response.read()
+                if response.status != 200:
+                    outcome = f"HTTP {response.status}"
+        except asyncio.TimeoutError:
+            outcome = "timeout"
+        except Exception as e:
+            outcome = type(e).__name__
+        finally:
+            inflight -= 1
+
+        done_at = time.perf_counter()
+        if outcome:
+            counts["error"] += 1
+            errors[outcome] = errors.get(outcome, 0) + 1
+            return
+
+        counts["success"] += 1
+        latency.record((done_at - scheduled_at) * 1000)
+        service.record((done_at - sent_at) * 1000)
+        name = scenario_name(options)
+        per_scenario.setdefault(name, LatencyHistogram()).record((done_at - scheduled_at) * 1000)
+
+    connector = aiohttp.TCPConnector(limit=0)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        tasks = []
+        start = time.perf_counter()
+        for offset, url, _, options in plan:
+            scheduled_at = start + offset
+            delay = scheduled_at - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if args.max_inflight and inflight >= args.max_inflight:
+                # Le client sature: compter l'abandon plutot que ralentir le debit
+                counts["dropped"] += 1
+                errors["client_dropped"] = errors.get("client_dropped", 0) + 1
+                continue
+            tasks.append(asyncio.create_task(fire(session, scheduled_at, url, options)))
+        await asyncio.gather(*tasks)
+        total_time = time.perf_counter() - start
+
+    report = {
+        "timestamp": datetime.now().isoformat(),
+        "mode": "open",
+        "target": BASE_URL,
+        "config": {
+            "rate": args.rate,
+            "duration": args.duration,
+            "arrival": args.arrival,
+            "mix": args.mix_file or args.mix,
+            "seed": args.seed,
+            "urls": urls,
+            "max_inflight": args.max_inflight,
+        },
+        "total_time": round(total_time, 3),
+        "requests": len(plan),
+        "counts": counts,
+        "error_rate": round((counts["error"] + counts["dropped"]) / len(plan), 4) if plan else 0,
+        "throughput": round(counts["success"] / total_time, 3) if total_time else 0,
+        "max_inflight": max_inflight_seen,
+        "latency_ms": latency.summary(),
+        "service_ms": service.summary(),
+        "send_lag_ms": send_lag.summary(),
+        "errors": errors,
+        "scenarios": {name: hist.summary() for name, hist in sorted(per_scenario.items())},
+        "histogram": latency.to_dict(),
+    }
+
+    print_open_report(report)
+
+    filename = args.output or f"load_test_open_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    with open(filename, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nRapport sauvegarde: {filename}\n")
+    return report
+
+
+def print_open_report(report):
+    print(f"\n{'='*60}")
+    print("RESULTATS")
+    print(f"{'='*60}\n")
+    counts = report["counts"]
+    print(f"Total requests: {report['requests']}  success={counts['success']} "
+          f"errors={counts['error']} dropped={counts['dropped']}")
+    print(f"Throughput: {report['throughput']}/s  max in flight: {report['max_inflight']}")
+    print(f"Total test time: {report['total_time']:.2f}s")
+
+    def row(label, summary):
+        values = "  ".join(f"{key}={summary[key]}" for key in [f"p{p:g}" for p in PERCENTILES] + ["max"])
+        print(f"  {label:<22}{values}")
+
+    print("\nLatency ms (from scheduled send):")
+    row("all", report["latency_ms"])
+    for name, summary in report["scenarios"].items():
+        row(name, summary)
+    print("\nService time ms (from actual send):")
+    row("all", report["service_ms"])
+
+    if report["errors"]:
+        print("\nErrors:")
+        for reason, count in sorted(report["errors"].items(), key=lambda item: -item[1]):
+            print(f"  {reason:<30}{count}")
+
+
+def compare_reports(args):
+    """Compare deux rapports open-loop; code retour 1 si regression."""
+    with open(args.baseline) as f:
+        base = json.load(f)
+    with open(args.candidate) as f:
+        new = json.load(f)
+
+    if base.get("config", {}).get("rate") != new.get("config", {}).get("rate") or \
+            base.get("config", {}).get("mix") != new.get("config", {}).get("mix"):
+        print("[!] Warning: runs use a different load shape (rate or mix)")
+
+    threshold = args.threshold / 100
+    regressions = []
+
+    print(f"\n{'metric':<26}{'baseline':>12}{'candidate':>12}{'delta':>10}")
+    print("-" * 60)
+
+    def check(label, old, current, higher_is_worse=True):
+        if old is None or current is None:
+            return
+        delta = (current - old) / old if old else 0.0
+        worse = delta > threshold if higher_is_worse else delta < -threshold
+        flag = "  REGRESSION" if worse else ""
+        print(f"{label:<26}{old:>12}{current:>12}{delta*100:>9.1f}%{flag}")
+        if worse:
+            regressions.append(label)
+
+    for key in [f"p{p:g}" for p in PERCENTILES] + ["max"]:
+        check(f"latency {key}", base["latency_ms"].get(key), new["latency_ms"].get(key))
+    check("throughput", base.get("throughput"), new.get("throughput"), higher_is_worse=False)
+
+    base_errors, new_errors = base.get("error_rate", 0), new.get("error_rate", 0)
+    print(f"{'error rate':<26}{base_errors:>12}{new_errors:>12}")
+    if new_errors > base_errors + args.error_margin / 100:
+        print(f"{'':<26}REGRESSION (error rate +{(new_errors - base_errors)*100:.1f} pts)")
+        regressions.append("error rate")
+
+    for name in sorted(set(base.get("scenarios", {})) & set(new.get("scenarios", {}))):
+        check(f"{name} p95", base["scenarios"][name].get("p95"), new["scenarios"][name].get("p95"))
+
+    if regressions:
+        print(f"\n[-] {len(regressions)} regression(s): {', '.join(regressions)}")
+        return 1
+    print("\n[+] No regression")
+    return 0
+
+
 async def check_health():
     """Verifie que le service est disponible"""
     try:
@@ -172,16 +481,54 @@ async def check_health():
         return False
 
 
+def parse_args(argv):
+    # Compatibilite: "load_test.py [N]" et "load_test.py --url ... --requests N"
+    if not argv or argv[0].isdigit():
+        argv = ["burst"] + (["--requests", argv[0]] + argv[1:] if argv else [])
+    elif argv[0].startswith("-") and argv[0] not in ("-h", "--help"):
+        argv = ["burst"] + argv
+
+    parser = argparse.ArgumentParser(description="Test de charge ShotURL")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    burst = commands.add_parser("burst", help="N requetes simultanees")
+    burst.add_argument("--requests", type=int, default=10)
+    burst.add_argument("--url", help=f"URL de l'API (defaut: {BASE_URL})")
+    burst.add_argument("--target", action="append", help="URL a capturer (repetable)")
+
+    open_loop = commands.add_parser("open", help="Charge en boucle ouverte")
+    open_loop.add_argument("--url", help=f"URL de l'API (defaut: {BASE_URL})")
+    open_loop.add_argument("--target", action="append", help="URL a capturer (repetable)")
+    open_loop.add_argument("--rate", type=float, default=1.0, help="Arrivees par seconde")
+    open_loop.add_argument("--duration", type=float, default=60, help="Duree de generation (s)")
+    open_loop.add_argument("--arrival", choices=["constant", "poisson"], default="poisson")
+    open_loop.add_argument("--mix", choices=sorted(SCENARIO_MIXES), default="desktop")
+    open_loop.add_argument("--mix-file", help="JSON: [{\"weight\": 3, \"options\": {...}}, ...]")
+    open_loop.add_argument("--seed", type=int, default=42, help="Graine (meme plan d'arrivees entre runs)")
+    open_loop.add_argument("--timeout", type=float, default=120)
+    open_loop.add_argument("--max-inflight", type=int, default=0, help="Plafond client (0 = illimite)")
+    open_loop.add_argument("--output", help="Fichier JSON du rapport")
+
+    compare = commands.add_parser("compare", help="Compare deux rapports open-loop")
+    compare.add_argument("baseline")
+    compare.add_argument("candidate")
+    compare.add_argument("--threshold", type=float, default=10, help="Regression si degradation > N%%")
+    compare.add_argument("--error-margin", type=float, default=1, help="Regression si taux d'erreur + N points")
+
+    return parser.parse_args(argv)
+
+
 async def main():
     """Point d'entree principal"""
-    # Verifier le nombre de requetes
-    num_requests = 10
-    if len(sys.argv) > 1:
-        try:
-            num_requests = int(sys.argv[1])
-        except ValueError:
-            print(f"Usage: {sys.argv[0]} [num_requests]")
-            sys.exit(1)
+    global BASE_URL
+
+    args = parse_args(sys.argv[1:])
+
+    if args.command == "compare":
+        sys.exit(compare_reports(args))
+
+    if args.url:
+        BASE_URL = args.url.rstrip("/")
 
     # Verifier la sante du service
     print(f"Checking service at {BASE_URL}...\n")
@@ -189,11 +536,15 @@ async def main():
         print("\n Service is not available. Please check if Docker is running.")
         sys.exit(1)
 
+    if args.command == "open":
+        await run_open_loop(args)
+        return
+
     print("\nStarting load test in 3 seconds...")
     await asyncio.sleep(3)
 
     # Lancer le test
-    await run_concurrent_test(num_requests)
+    await run_concurrent_test(args.requests, args.target)
 
 
 if __name__ == "__main__":